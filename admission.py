@@ -0,0 +1,359 @@
+"""
+Admission control and load shedding for the read routes.
+
+Bursts of agent queries used to go straight to Azure AI Search. Once it
+started answering 429, client retries added to the load, and every query
+queued behind the throttled ones. Now:
+
+* every route has a token bucket, refilled at ``ADMISSION_RATE_<ROUTE>``
+  requests per second up to ``ADMISSION_BURST_<ROUTE>``. Read routes only
+  spend a token when they miss the result cache, so cached answers are never
+  refused;
+* every backend has an ``AdaptiveConcurrencyLimit``. It grows by one slot per
+  window of calls that finish within ``ADMISSION_LATENCY_TARGET_MS``, shrinks
+  by a tenth when calls get slower and halves when the service throttles.
+  Calls beyond the limit wait in a bounded queue for at most
+  ``ADMISSION_MAX_WAIT_MS``;
+* a call that is not admitted, or that the service throttles, raises
+  ``Overloaded``. The read routes answer it from the local index (in
+  LOCAL_SEARCH_MODE=fallback), then from a result cache entry that expired
+  less than ``ADMISSION_MAX_STALE_SECONDS`` ago, and otherwise with 503 and
+  Retry-After;
+* low-priority routes (``debug-upload``, ``test-blob``, ``check-index``) are
+  shed on arrival while a backend is saturated or was throttled within
+  ``ADMISSION_COOLDOWN_SECONDS``, so they give way to agent queries first.
+
+Set ``ADMISSION_CONTROL=false`` to turn it off.
+"""
+
+import os
+import json
+import math
+import time
+import asyncio
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+
+from metrics import metrics
+from batch_uploader import THROTTLED_STATUS_CODES, retry_after_seconds
+
+INTERACTIVE = "interactive"
+LOW = "low"
+
+# Routes shed first under load; every other route is interactive
+LOW_PRIORITY_ROUTES = ("debug-upload", "test-blob", "check-index")
+DEFAULT_RATES = {INTERACTIVE: (50.0, 100), LOW: (1.0, 2)}
+
+# Route whose backend calls are being admitted, set by ``admitted``
+_route = ContextVar("admission_route", default=None)
+
+
+class Overloaded(Exception):
+    """A request or backend call was not admitted; ``retry_after`` is a hint in seconds."""
+
+    # Looks like a throttled response to code that falls back on 429/503
+    status_code = 503
+
+    def __init__(self, reason, retry_after=1.0):
+        super().__init__(f"Service overloaded ({reason}); retry after {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Thread-safe token bucket of ``burst`` tokens refilled at ``rate`` per second."""
+
+    def __init__(self, rate, burst):
+        self.rate = max(rate, 0.001)
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Take a token; returns 0.0, or the seconds until one is available if there is none."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class AdaptiveConcurrencyLimit:
+    """Event loop concurrency limit for one backend, driven by call latency and throttling.
+
+    Additive increase (one slot per ``limit`` fast calls), multiplicative
+    decrease (x0.9 on slow calls, x0.5 on throttling), at most one decrease
+    per ``latency_target`` so a wave of slow calls counts once.
+    """
+
+    def __init__(self, name, maximum=32, minimum=1, latency_target=1.0, max_wait=1.0, max_queue=64, cooldown=10.0):
+        self.name = name
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.latency_target = latency_target
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.cooldown = cooldown
+        self.limit = float(self.maximum)
+        self._active = 0
+        self._waiters = deque()
+        self._last_decrease = 0.0
+        self._last_throttled = None
+        self._stats = {"admitted": 0, "queued": 0, "rejected": 0, "throttled": 0, "slow": 0}
+
+    async def acquire(self):
+        """Take a slot, waiting up to ``max_wait``; raises ``Overloaded`` if none frees up."""
+        if self._active < int(self.limit) and not self._waiters:
+            self._active += 1
+            self._stats["admitted"] += 1
+            return
+        if len(self._waiters) >= self.max_queue or not self.max_wait:
+            self._reject("queue full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._stats["queued"] += 1
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            self._reject("queue timeout")
+        except BaseException:
+            # Cancelled after the slot was handed over: give it to the next caller
+            if waiter.done() and not waiter.cancelled():
+                self._active -= 1
+                self._wake()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self._stats["admitted"] += 1
+
+    def release(self, seconds, throttled=False):
+        """Free a slot and adapt the limit to how the call went."""
+        self._active -= 1
+        now = time.monotonic()
+        if throttled:
+            self._stats["throttled"] += 1
+            self._last_throttled = now
+            self._decrease(now, 0.5)
+        elif seconds > self.latency_target:
+            self._stats["slow"] += 1
+            self._decrease(now, 0.9)
+        elif self.limit < self.maximum:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        self._wake()
+
+    def saturated(self):
+        """Whether callers are queueing or the backend throttled recently."""
+        if self._waiters or self._active >= int(self.limit):
+            return True
+        return self._last_throttled is not None and time.monotonic() - self._last_throttled < self.cooldown
+
+    def stats(self):
+        return dict(
+            self._stats,
+            limit=round(self.limit, 2),
+            in_flight=self._active,
+            queued_now=len(self._waiters),
+            saturated=self.saturated()
+        )
+
+    def _decrease(self, now, factor):
+        if now - self._last_decrease >= self.latency_target:
+            self.limit = max(self.minimum, self.limit * factor)
+            self._last_decrease = now
+
+    def _wake(self):
+        while self._waiters and self._active < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._active += 1
+                waiter.set_result(None)
+
+    def _reject(self, reason):
+        self._stats["rejected"] += 1
+        # Roughly when a slot should free up again
+        raise Overloaded(f"{self.name} {reason}", retry_after=max(1.0, self.latency_target))
+
+
+class AdmissionController:
+    """Token buckets per route and adaptive concurrency limits per backend."""
+
+    def __init__(self, enabled=True, limit_settings=None, route_rates=None, max_stale=3600.0):
+        self.enabled = enabled
+        self.max_stale = max_stale
+        self.limit_settings = dict(limit_settings or {})
+        self.route_rates = dict(route_rates or {})
+        self._buckets = {}
+        self._limits = {}
+        self._shed = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.getenv("ADMISSION_CONTROL", "true").lower() != "false",
+            limit_settings={
+                "maximum": int(os.getenv("ADMISSION_MAX_CONCURRENCY", 32)),
+                "minimum": int(os.getenv("ADMISSION_MIN_CONCURRENCY", 2)),
+                "latency_target": float(os.getenv("ADMISSION_LATENCY_TARGET_MS", 1000)) / 1000,
+                "max_wait": float(os.getenv("ADMISSION_MAX_WAIT_MS", 1000)) / 1000,
+                "max_queue": int(os.getenv("ADMISSION_MAX_QUEUE", 64)),
+                "cooldown": float(os.getenv("ADMISSION_COOLDOWN_SECONDS", 10))
+            },
+            max_stale=float(os.getenv("ADMISSION_MAX_STALE_SECONDS", 3600))
+        )
+
+    @staticmethod
+    def priority(route):
+        return LOW if route in LOW_PRIORITY_ROUTES else INTERACTIVE
+
+    def bucket(self, route):
+        bucket = self._buckets.get(route)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(route)
+                if bucket is None:
+                    rate, burst = self.route_rates.get(route) or _route_rate_from_env(route, self.priority(route))
+                    bucket = self._buckets[route] = TokenBucket(rate, burst)
+        return bucket
+
+    def limit(self, backend):
+        limit = self._limits.get(backend)
+        if limit is None:
+            with self._lock:
+                limit = self._limits.get(backend)
+                if limit is None:
+                    limit = self._limits[backend] = AdaptiveConcurrencyLimit(backend, **self.limit_settings)
+        return limit
+
+    def overloaded(self):
+        return any(limit.saturated() for limit in list(self._limits.values()))
+
+    def admit(self, route):
+        """Spend one of ``route``'s tokens; raises ``Overloaded`` when the route is over its rate,
+        or is low priority while a backend is overloaded."""
+        if not self.enabled or route is None:
+            return
+        if self.priority(route) == LOW and self.overloaded():
+            self._count_shed(route, "priority")
+            raise Overloaded("backends saturated, low-priority request shed", retry_after=5.0)
+        wait = self.bucket(route).take()
+        if wait:
+            self._count_shed(route, "rate")
+            raise Overloaded(f"{route} over its rate limit", retry_after=wait)
+
+    @asynccontextmanager
+    async def call(self, backend):
+        """Admit one call to ``backend`` for the current route and feed its outcome back to the backend's limit."""
+        if not self.enabled:
+            yield
+            return
+        route = _route.get()
+        self.admit(route)
+        limit = self.limit(backend)
+        try:
+            await limit.acquire()
+        except Overloaded:
+            self._count_shed(route, "concurrency")
+            raise
+        start = time.perf_counter()
+        throttled = False
+        try:
+            yield
+        except Overloaded:
+            raise
+        except Exception as e:
+            throttled = getattr(e, "status_code", None) in THROTTLED_STATUS_CODES
+            if not throttled:
+                raise
+            # Answered like a call that was not admitted, instead of failing the request
+            self._count_shed(route, "throttled")
+            raise Overloaded(f"{backend} throttled", retry_after=retry_after_seconds(e) or 1.0) from e
+        finally:
+            limit.release(time.perf_counter() - start, throttled)
+
+    def stats(self):
+        with self._lock:
+            shed = {route: dict(reasons) for route, reasons in self._shed.items()}
+        return {
+            "enabled": self.enabled,
+            "overloaded": self.overloaded(),
+            "backends": {name: limit.stats() for name, limit in list(self._limits.items())},
+            "shed": shed
+        }
+
+    def _count_shed(self, route, reason):
+        with self._lock:
+            reasons = self._shed.setdefault(route, {})
+            reasons[reason] = reasons.get(reason, 0) + 1
+        metrics.inc("admission_shed_total", route=route, reason=reason)
+
+
+def _route_rate_from_env(route, priority):
+    rate, burst = DEFAULT_RATES[priority]
+    setting = route.upper().replace("-", "_")
+    return float(os.getenv(f"ADMISSION_RATE_{setting}", rate)), int(os.getenv(f"ADMISSION_BURST_{setting}", burst))
+
+
+@contextmanager
+def admission_route(route):
+    """Charge backend calls made inside the block to ``route``."""
+    token = _route.set(route)
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+
+def overloaded_response(error):
+    """503 with a Retry-After header for a request that was not admitted."""
+    from azure.functions import HttpResponse
+    return HttpResponse(
+        json.dumps({"error": str(error)}),
+        status_code=503,
+        mimetype="application/json",
+        headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))}
+    )
+
+
+def admitted(route):
+    """Run a route handler under admission control.
+
+    Backend calls it makes are charged to ``route``. Low-priority routes are
+    also admitted on arrival and answered with 503 when they are shed.
+    """
+    def decorate(handler):
+        def gate():
+            if admission.priority(route) == LOW:
+                admission.admit(route)
+
+        if asyncio.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def wrapper(*args, **kwargs):
+                try:
+                    gate()
+                except Overloaded as e:
+                    return overloaded_response(e)
+                with admission_route(route):
+                    return await handler(*args, **kwargs)
+        else:
+            @functools.wraps(handler)
+            def wrapper(*args, **kwargs):
+                try:
+                    gate()
+                except Overloaded as e:
+                    return overloaded_response(e)
+                with admission_route(route):
+                    return handler(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+admission = AdmissionController.from_env()
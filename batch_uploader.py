@@ -0,0 +1,355 @@
+"""
+Size-aware, concurrent document uploader for Azure AI Search.
+
+Documents are packed into batches by count and by serialized payload size up
+to the service's per-request limits, and several batches are kept in flight
+at once. Throttled documents (per-item 429/503 or a throttled request) are
+retried on their own with exponential backoff while the number of in-flight
+batches backs off, so every document ends up counted exactly once as either
+uploaded or failed.
+
+``BatchUploader`` drives a synchronous ``SearchClient`` from a thread pool;
+``AsyncBatchUploader`` does the same with an ``azure.search.documents.aio``
+client on the event loop.
+"""
+
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+# Azure AI Search accepts at most 1000 documents and 16 MB per indexing request
+MAX_BATCH_DOCUMENTS = 1000
+MAX_BATCH_BYTES = 15 * 1024 * 1024
+RETRYABLE_STATUS_CODES = {409, 422, 429, 503}
+THROTTLED_STATUS_CODES = {429, 503}
+
+
+class AdaptiveLimit:
+    """Concurrency limit that halves on throttling and grows back by one on success."""
+
+    def __init__(self, maximum):
+        self.maximum = max(1, maximum)
+        self.limit = self.maximum
+        self._active = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._active += 1
+
+    def release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def on_throttled(self):
+        with self._condition:
+            self.limit = max(1, self.limit // 2)
+
+    def on_success(self):
+        with self._condition:
+            if self.limit < self.maximum:
+                self.limit += 1
+                self._condition.notify_all()
+
+
+class AsyncAdaptiveLimit:
+    """Event loop counterpart of ``AdaptiveLimit``."""
+
+    def __init__(self, maximum):
+        self.maximum = max(1, maximum)
+        self.limit = self.maximum
+        self._active = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+    async def release(self):
+        async with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def on_throttled(self):
+        self.limit = max(1, self.limit // 2)
+
+    async def on_success(self):
+        if self.limit < self.maximum:
+            async with self._condition:
+                self.limit += 1
+                self._condition.notify_all()
+
+
+class _BatchPacker:
+    """Batch packing and per-document bookkeeping shared by both uploaders."""
+
+    def __init__(self, max_batch_documents, max_batch_bytes, max_retries, base_delay, max_delay, timings):
+        self.max_batch_documents = max(1, min(max_batch_documents, MAX_BATCH_DOCUMENTS))
+        self.max_batch_bytes = max(1, min(max_batch_bytes, MAX_BATCH_BYTES))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timings = timings
+
+        self._lock = threading.Lock()
+        self._batch = []
+        self._batch_bytes = 0
+
+        self.succeeded = 0
+        self.failed_keys = set()
+        self.retries = 0
+        self.batches = 0
+
+    def _pack(self, document):
+        """Add a document and return the batch it closed, if it pushed one over a limit."""
+        size = len(json.dumps(document, default=str).encode("utf-8"))
+        full = None
+        if self._batch and (len(self._batch) >= self.max_batch_documents
+                            or self._batch_bytes + size > self.max_batch_bytes):
+            full = self._take()
+        self._batch.append(document)
+        self._batch_bytes += size
+        return full
+
+    def _take(self):
+        metrics.inc("search_upload_bytes_total", self._batch_bytes)
+        batch = self._batch
+        self._batch = []
+        self._batch_bytes = 0
+        with self._lock:
+            self.batches += 1
+        return batch
+
+    def _totals(self):
+        return {
+            "succeeded": self.succeeded,
+            "failed": len(self.failed_keys),
+            "failed_keys": self.failed_keys,
+            "retries": self.retries,
+            "batches": self.batches
+        }
+
+    def _record_results(self, pending, results):
+        """Count per-document outcomes and return (documents to retry, throttled?)."""
+        by_key = {doc["id"]: doc for doc in pending}
+        results = list(results)
+        retry = []
+        throttled = False
+        succeeded = 0
+        failed = []
+        for r in results:
+            if r.succeeded:
+                succeeded += 1
+            elif r.status_code in RETRYABLE_STATUS_CODES and r.key in by_key:
+                retry.append(by_key[r.key])
+                throttled = throttled or r.status_code in THROTTLED_STATUS_CODES
+            else:
+                failed.append(r.key)
+                logging.error(f"Failed to upload document {r.key}: {r.error_message}")
+        # A document the service sent no result for was not indexed as far as we know
+        missing = set(by_key).difference(r.key for r in results)
+        if missing:
+            logging.error(f"No upload result for {len(missing)} documents; counting them as failed")
+            failed.extend(sorted(missing))
+        with self._lock:
+            self.succeeded += succeeded
+            self.failed_keys.update(failed)
+        metrics.inc("search_upload_documents_total", succeeded, outcome="succeeded")
+        if failed:
+            metrics.inc("search_upload_documents_total", len(failed), outcome="failed")
+        return retry, throttled
+
+    def _mark_failed(self, documents):
+        with self._lock:
+            self.failed_keys.update(doc["id"] for doc in documents)
+        metrics.inc("search_upload_documents_total", len(documents), outcome="failed")
+
+    def _next_retry_delay(self, attempt, retry_after):
+        with self._lock:
+            self.retries += 1
+        metrics.inc("search_upload_retries_total")
+        if retry_after is not None:
+            return retry_after
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(delay / 2, delay)
+
+    def _record_time(self, start):
+        if self.timings:
+            self.timings.add("upload", time.perf_counter() - start)
+
+
+class BatchUploader(_BatchPacker):
+    """Pack documents into batches and upload them with bounded, adaptive concurrency."""
+
+    def __init__(self, search_client, max_batch_documents=MAX_BATCH_DOCUMENTS, max_batch_bytes=MAX_BATCH_BYTES,
+                 max_in_flight=4, max_retries=5, base_delay=0.5, max_delay=30.0, timings=None):
+        super().__init__(max_batch_documents, max_batch_bytes, max_retries, base_delay, max_delay, timings)
+        self.search_client = search_client
+        self._limit = AdaptiveLimit(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_in_flight))
+        self._futures = []
+
+    def add(self, document):
+        """Queue a document, submitting the current batch once it reaches a limit."""
+        full = self._pack(document)
+        if full:
+            self._submit(full)
+
+    def flush(self):
+        """Submit the pending batch, blocking while the in-flight limit is reached."""
+        if self._batch:
+            self._submit(self._take())
+
+    def close(self):
+        """Flush, wait for all in-flight batches and return per-document totals."""
+        self.flush()
+        for future in self._futures:
+            future.result()
+        self._executor.shutdown()
+        return self._totals()
+
+    def _submit(self, batch):
+        self._limit.acquire()
+        self._futures.append(self._executor.submit(self._upload_batch, batch, self.batches))
+
+    def _upload_batch(self, batch, number):
+        try:
+            self._send(batch, number)
+        finally:
+            self._limit.release()
+
+    def _send(self, pending, number):
+        """Upload documents, retrying only the ones that failed with a retryable status."""
+        attempt = 0
+        while pending:
+            retry_after = None
+            start = time.perf_counter()
+            try:
+                results = self.search_client.upload_documents(pending)
+                pending, throttled = self._record_results(pending, results)
+            except Exception as e:
+                status_code = getattr(e, "status_code", None)
+                if status_code == 413 and len(pending) > 1:
+                    # Payload estimate was too optimistic: split and send both halves
+                    middle = len(pending) // 2
+                    self._send(pending[:middle], number)
+                    self._send(pending[middle:], number)
+                    return
+                if status_code not in RETRYABLE_STATUS_CODES:
+                    logging.error(f"Error uploading batch {number}: {str(e)}")
+                    self._mark_failed(pending)
+                    return
+                throttled = status_code in THROTTLED_STATUS_CODES
+                retry_after = retry_after_seconds(e)
+            finally:
+                self._record_time(start)
+
+            if not pending:
+                self._limit.on_success()
+                return
+            if throttled:
+                self._limit.on_throttled()
+            if attempt >= self.max_retries:
+                logging.error(f"Giving up on {len(pending)} documents in batch {number} after {attempt} retries")
+                self._mark_failed(pending)
+                return
+
+            attempt += 1
+            time.sleep(self._next_retry_delay(attempt, retry_after))
+
+
+class AsyncBatchUploader(_BatchPacker):
+    """``BatchUploader`` for ``azure.search.documents.aio.SearchClient`` on the event loop."""
+
+    def __init__(self, search_client, max_batch_documents=MAX_BATCH_DOCUMENTS, max_batch_bytes=MAX_BATCH_BYTES,
+                 max_in_flight=4, max_retries=5, base_delay=0.5, max_delay=30.0, timings=None):
+        super().__init__(max_batch_documents, max_batch_bytes, max_retries, base_delay, max_delay, timings)
+        self.search_client = search_client
+        self._limit = AsyncAdaptiveLimit(max_in_flight)
+        self._tasks = []
+
+    async def add(self, document):
+        """Queue a document, starting an upload task once the batch reaches a limit."""
+        full = self._pack(document)
+        if full:
+            await self._submit(full)
+
+    async def flush(self):
+        """Start the pending batch, waiting while the in-flight limit is reached."""
+        if self._batch:
+            await self._submit(self._take())
+
+    async def close(self):
+        """Flush, wait for all in-flight batches and return per-document totals."""
+        await self.flush()
+        await asyncio.gather(*self._tasks)
+        return self._totals()
+
+    async def _submit(self, batch):
+        await self._limit.acquire()
+        self._tasks.append(asyncio.ensure_future(self._upload_batch(batch, self.batches)))
+
+    async def _upload_batch(self, batch, number):
+        try:
+            await self._send(batch, number)
+        finally:
+            await self._limit.release()
+
+    async def _send(self, pending, number):
+        """Upload documents, retrying only the ones that failed with a retryable status."""
+        attempt = 0
+        while pending:
+            retry_after = None
+            start = time.perf_counter()
+            try:
+                results = await self.search_client.upload_documents(pending)
+                pending, throttled = self._record_results(pending, results)
+            except Exception as e:
+                status_code = getattr(e, "status_code", None)
+                if status_code == 413 and len(pending) > 1:
+                    middle = len(pending) // 2
+                    await self._send(pending[:middle], number)
+                    await self._send(pending[middle:], number)
+                    return
+                if status_code not in RETRYABLE_STATUS_CODES:
+                    logging.error(f"Error uploading batch {number}: {str(e)}")
+                    self._mark_failed(pending)
+                    return
+                throttled = status_code in THROTTLED_STATUS_CODES
+                retry_after = retry_after_seconds(e)
+            finally:
+                self._record_time(start)
+
+            if not pending:
+                await self._limit.on_success()
+                return
+            if throttled:
+                self._limit.on_throttled()
+            if attempt >= self.max_retries:
+                logging.error(f"Giving up on {len(pending)} documents in batch {number} after {attempt} retries")
+                self._mark_failed(pending)
+                return
+
+            attempt += 1
+            await asyncio.sleep(self._next_retry_delay(attempt, retry_after))
+
+
+def retry_after_seconds(error):
+    """Honor a Retry-After header on a throttled response if the service sent one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,1199 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the XML ingestion path, run against local stand-ins.
+
+Usage:
+    python benchmarks.py pipeline --files 64 --workflows 200
+    python benchmarks.py extract --sizes 100 1000 5000
+    python benchmarks.py load --requests 2000 --latency 0.02
+    python benchmarks.py burst --agents 50 --queries 8
+    python benchmarks.py overload --rate 400 --seconds 2
+    python benchmarks.py local-search --workflows 20000 --queries 500
+    python benchmarks.py memory --workflows 20000
+    python benchmarks.py parse-scaling --files 16 --workflows 2000
+    python benchmarks.py startup --modules function_app ingestion
+    python benchmarks.py snapshot --files 16 --workflows 2000
+    python benchmarks.py cutover --files 8 --workflows 500
+    python benchmarks.py prefilter --files 16 --definitions 48
+    python benchmarks.py suite --scale medium --output results.json
+    python benchmarks.py suite --scale medium --baseline results.json
+
+Every command prints its results as JSON; ``--output`` also writes them to a
+file. ``suite`` runs a fixed, seeded scenario and reports flat metrics that
+can be compared against an earlier run with ``--baseline``.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+import tempfile
+import threading
+import tracemalloc
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+from xml_extractor import extract_workflows_from_xml, iter_workflow_buckets_from_chunks, get_parser_backend, PARSER_BACKENDS
+from ingestion import (
+    get_pipeline_config, run_ingestion_pipeline, run_ingestion_pipeline_async, parse_blob_bytes, StageTimings
+)
+from local_backends import (
+    LocalContainerClient, LocalSearchClient, LocalAsyncContainerClient, LocalAsyncSearchClient, LocalIndexingResult,
+    LocalSearchIndexClient, LocalIndexDefinition, LocalAlias
+)
+from search_paging import PageRequest, table_filter
+from parse_pool import ParsePool, HANDOFFS
+from local_index import LocalSearchIndex
+from coalescing import RequestCoalescer, coalesce_key
+from admission import AdmissionController, Overloaded, admission_route
+from catalog_snapshot import CatalogSnapshot, merge_snapshot, bulk_load_snapshot
+from index_versions import IndexVersions, get_rebuild_settings, blue_green_rebuild
+from workflow_model import WorkflowTable
+from blob_prefilter import load_prefilter
+
+
+def generate_export(workflows=100, sources=4, targets=2, transformations=8, folder="FOLDER_1", seed=0, nesting=1,
+                    folders=1, fields=1):
+    """Build a synthetic PowerCenter repository export as a string.
+
+    ``workflows`` are spread over ``folders`` FOLDER elements. ``nesting`` > 1
+    nests runs of that many WORKFLOW elements inside each other, the worst case
+    for per-workflow descendant scans. ``fields`` is the number of ports per
+    transformation; real exports have dozens, which the extractor skips. Output
+    is fully determined by the arguments.
+    """
+    rng = random.Random(seed)
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<POWERMART CREATION_DATE="01/01/2024 00:00:00" REPOSITORY_VERSION="186.95">',
+        '<REPOSITORY NAME="REP_DEV" VERSION="186" CODEPAGE="UTF-8" DATABASETYPE="Oracle">'
+    ]
+    per_folder = -(-workflows // max(1, folders))
+    for start in range(0, workflows, per_folder):
+        name = folder if folders <= 1 else f"{folder}_{start // per_folder}"
+        lines.append(f'<FOLDER NAME="{name}" SHARED="NOTSHARED">')
+        _append_workflows(lines, rng, name, range(start, min(workflows, start + per_folder)), workflows,
+                          sources, targets, transformations, nesting, fields)
+        lines.append('</FOLDER>')
+    lines.extend(['</REPOSITORY>', '</POWERMART>'])
+    return "\n".join(lines)
+
+
+def _append_workflows(lines, rng, folder, numbers, workflows, sources, targets, transformations, nesting, fields=1):
+    for w in numbers:
+        lines.append(f'<WORKFLOW NAME="wf_{folder}_{w}" MAPPINGNAME="m_{folder}_{w}" SESSIONNAME="s_{folder}_{w}">')
+        for s in range(sources):
+            lines.append(f'<SOURCE NAME="SRC_{rng.randrange(workflows * 2)}_{s}" DATABASETYPE="Oracle"/>')
+        for t in range(targets):
+            lines.append(f'<TARGET NAME="TGT_{rng.randrange(workflows * 2)}_{t}" DATABASETYPE="Oracle"/>')
+        for x in range(transformations):
+            kind = rng.choice(["Expression", "Filter", "Lookup Procedure", "Aggregator", "Joiner"])
+            lines.append(f'<TRANSFORMATION NAME="EXP_{w}_{x}" TYPE="{kind}">')
+            lines.append(f'<TRANSFORMFIELD NAME="PORT_{x}" DATATYPE="string" PORTTYPE="INPUT/OUTPUT"/>')
+            lines.extend(
+                f'<TRANSFORMFIELD NAME="PORT_{x}_{f}" DATATYPE="string" PORTTYPE="INPUT/OUTPUT"/>' for f in range(1, fields)
+            )
+            lines.append('</TRANSFORMATION>')
+        lines.append(f'<TASKINSTANCE NAME="s_{folder}_{w}" TASKNAME="s_{folder}_{w}" TASKTYPE="Session"/>')
+        if (w - numbers.start + 1) % nesting == 0:
+            lines.extend(['</WORKFLOW>'] * nesting)
+    lines.extend(['</WORKFLOW>'] * (len(numbers) % nesting))
+
+
+def write_exports(root, files, workflows, **shape):
+    """Write ``files`` synthetic exports into ``root`` and return total bytes.
+
+    ``shape`` is passed to ``generate_export`` (folders, sources, targets, ...).
+    """
+    total = 0
+    for i in range(files):
+        content = generate_export(workflows=workflows, folder=f"FOLDER_{i}", seed=i, **shape).encode("utf-8")
+        with open(os.path.join(root, f"export_{i:04d}.xml"), "wb") as f:
+            f.write(content)
+        total += len(content)
+    return total
+
+
+def generate_definitions_export(mapplets=100, sources=4, transformations=8, folder="FOLDER_1", seed=0):
+    """Build a synthetic export of source definitions and mapplets, with no workflows."""
+    rng = random.Random(seed)
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<POWERMART CREATION_DATE="01/01/2024 00:00:00" REPOSITORY_VERSION="186.95">',
+        '<REPOSITORY NAME="REP_DEV" VERSION="186" CODEPAGE="UTF-8" DATABASETYPE="Oracle">',
+        f'<FOLDER NAME="{folder}" SHARED="SHARED">'
+    ]
+    for m in range(mapplets):
+        for s in range(sources):
+            lines.append(f'<SOURCE NAME="SRC_{rng.randrange(mapplets * 2)}_{s}" DATABASETYPE="Oracle"/>')
+        lines.append(f'<MAPPLET NAME="mplt_{folder}_{m}" ISVALID="YES">')
+        for x in range(transformations):
+            lines.append(f'<TRANSFORMATION NAME="EXP_{m}_{x}" TYPE="Expression">')
+            lines.append(f'<TRANSFORMFIELD NAME="PORT_{x}" DATATYPE="string" PORTTYPE="INPUT/OUTPUT"/>')
+            lines.append('</TRANSFORMATION>')
+        lines.append('</MAPPLET>')
+    lines.extend(['</FOLDER>', '</REPOSITORY>', '</POWERMART>'])
+    return "\n".join(lines)
+
+
+def legacy_extract_workflows_from_xml(xml_content, xml_filename):
+    """Reference copy of the original tree-based extractor with per-workflow ``.//`` scans."""
+    root = ET.fromstring(xml_content)
+    workflows = []
+    for workflow in root.findall('.//WORKFLOW'):
+        workflow_name = workflow.get('NAME', 'Unknown')
+        mapping_name = workflow.get('MAPPINGNAME', 'Unknown')
+        session_name = workflow.get('SESSIONNAME', 'Unknown')
+        source_tables = [s.get('NAME', '') for s in workflow.findall('.//SOURCE') if s.get('NAME', '')]
+        target_tables = [t.get('NAME', '') for t in workflow.findall('.//TARGET') if t.get('NAME', '')]
+        transformations = [
+            f"{t.get('NAME', '')} ({t.get('TYPE', '')})"
+            for t in workflow.findall('.//TRANSFORMATION')
+            if t.get('NAME', '') and t.get('TYPE', '')
+        ]
+        workflows.append({
+            "id": f"{xml_filename}_{workflow_name}_{mapping_name}".replace(" ", "_").replace(".", "_")[:100],
+            "name": workflow_name[:100] if workflow_name else "Unknown",
+            "type": "workflow",
+            "description": f"Mapping: {mapping_name}, Session: {session_name}, XML: {xml_filename}, Sources: {len(source_tables)}, Targets: {len(target_tables)}, Transformations: {len(transformations)}"
+        })
+    return workflows
+
+
+def best_of(repeat, func, *args):
+    """Return (best seconds, last result) over ``repeat`` calls."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def percentiles(samples):
+    """p50/p95/p99 of latency samples in seconds, reported in milliseconds."""
+    ordered = sorted(samples)
+
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+def bench_extract(args):
+    """Compare the single-pass extractor on each parser backend with the original per-workflow descendant scans."""
+    backends = [backend for backend in args.backends if get_parser_backend(backend) == backend]
+    runs = []
+    for workflows in args.sizes:
+        content = generate_export(
+            workflows=workflows, transformations=args.transformations, nesting=args.nesting, fields=args.fields
+        ).encode("utf-8")
+        legacy_seconds, legacy = best_of(args.repeat, legacy_extract_workflows_from_xml, content, "bench.xml")
+        # Nested workflows close inner-first, so compare independent of order
+        legacy = sorted(legacy, key=lambda d: d["id"])
+        run = {"workflows": workflows, "mb": round(len(content) / 1e6, 2), "legacy_seconds": round(legacy_seconds, 4)}
+        for backend in backends:
+            seconds, single = best_of(args.repeat, extract_workflows_from_xml, content, "bench.xml", backend)
+            summary = sorted(({key: doc[key] for key in legacy[0]} for doc in single), key=lambda d: d["id"]) if legacy else single
+            run[backend] = {
+                "seconds": round(seconds, 4),
+                "mb_per_second": round(len(content) / seconds / 1e6, 2),
+                "speedup_vs_legacy": round(legacy_seconds / seconds, 2),
+                "identical_output": summary == legacy
+            }
+        runs.append(run)
+    return {
+        "benchmark": "extract",
+        "repeat": args.repeat,
+        "nesting": args.nesting,
+        "fields_per_transformation": args.fields,
+        "backends": backends,
+        "runs": runs
+    }
+
+
+def bench_pipeline(args):
+    """Measure process-xml pipeline throughput as parse workers increase."""
+    cpu_count = os.cpu_count() or 1
+    worker_counts = sorted({0, 1, 2, 4, 8, cpu_count})
+    worker_counts = [w for w in worker_counts if w <= max(cpu_count, 1)] or [0]
+
+    with tempfile.TemporaryDirectory() as root:
+        total_bytes = write_exports(root, args.files, args.workflows)
+        container = LocalContainerClient(root, latency=args.latency)
+        blob_names = [blob.name for blob in container.list_blobs()]
+
+        runs = []
+        baseline = None
+        for workers in worker_counts:
+            config = get_pipeline_config({
+                "parse_workers": workers,
+                "download_workers": max(args.download_workers, workers)
+            })
+            search_client = LocalSearchClient()
+            start = time.perf_counter()
+            stats = run_ingestion_pipeline(container, blob_names, search_client, config=config)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            runs.append({
+                "parse_workers": workers,
+                "seconds": round(elapsed, 3),
+                "mb_per_second": round(total_bytes / elapsed / 1e6, 2),
+                "speedup": round(baseline / elapsed, 2),
+                "workflows_uploaded": stats["workflows_uploaded"],
+                "stage_timings": stats["stage_timings"]
+            })
+
+    return {
+        "benchmark": "pipeline",
+        "cpu_count": cpu_count,
+        "files": args.files,
+        "workflows_per_file": args.workflows,
+        "total_mb": round(total_bytes / 1e6, 2),
+        "runs": runs
+    }
+
+
+def bench_snapshot(args):
+    """Index rebuild from the XML exports versus bulk load from a catalog snapshot."""
+    with tempfile.TemporaryDirectory() as root:
+        total_bytes = write_exports(root, args.files, args.workflows)
+        container = LocalAsyncContainerClient(root, latency=args.latency)
+        blob_names = [blob.name for blob in LocalContainerClient(root).list_blobs()]
+        config = get_pipeline_config({"parse_workers": args.parse_workers, "upload_concurrency": args.upload_concurrency})
+
+        rebuilt = LocalSearchClient()
+        start = time.perf_counter()
+        stats = asyncio.run(run_ingestion_pipeline_async(
+            container, blob_names, LocalAsyncSearchClient(rebuilt, latency=args.upload_latency), config=config
+        ))
+        parse_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        snapshot = merge_snapshot(None, stats["workflows_by_blob"], {}, incremental=False)
+        write_seconds = time.perf_counter() - start
+        path = os.path.join(root, "catalog.wcs")
+        with open(path, "wb") as f:
+            f.write(snapshot.buffer)
+
+        loaded = LocalSearchClient()
+        with CatalogSnapshot.open(path) as mapped:
+            start = time.perf_counter()
+            load_stats = asyncio.run(bulk_load_snapshot(
+                mapped, LocalAsyncSearchClient(loaded, latency=args.upload_latency), config, StageTimings()
+            ))
+            load_seconds = time.perf_counter() - start
+
+    return {
+        "benchmark": "snapshot",
+        "files": args.files,
+        "workflows": len(snapshot),
+        "xml_mb": round(total_bytes / 1e6, 2),
+        "snapshot_mb": round(len(snapshot.buffer) / 1e6, 3),
+        "compression_ratio": round(total_bytes / len(snapshot.buffer), 1),
+        "snapshot_write_seconds": round(write_seconds, 3),
+        "rebuild_from_xml": {"seconds": round(parse_seconds, 3), "workflows_uploaded": stats["workflows_uploaded"]},
+        "bulk_load": {"seconds": round(load_seconds, 3), "workflows_uploaded": load_stats["workflows_uploaded"]},
+        "speedup": round(parse_seconds / load_seconds, 2),
+        "identical_index": loaded.documents == rebuilt.documents
+    }
+
+
+class CountingAsyncContainerClient(LocalAsyncContainerClient):
+    """``LocalAsyncContainerClient`` that counts the bytes of every download, ranged or not."""
+
+    def __init__(self, root, latency=0.0):
+        super().__init__(root, latency=latency)
+        self.bytes = 0
+
+    def get_blob_client(self, blob):
+        blob_client = super().get_blob_client(blob)
+        download_blob = blob_client.download_blob
+
+        async def counted(*args, **kwargs):
+            downloader = await download_blob(*args, **kwargs)
+            self.bytes += downloader.size
+            return downloader
+
+        blob_client.download_blob = counted
+        return blob_client
+
+
+def bench_prefilter(args):
+    """Full ingestion of mixed exports without the prefilter, and with a cold and a warm classification cache."""
+    with tempfile.TemporaryDirectory() as root:
+        total_bytes = write_exports(root, args.files, args.workflows)
+        for i in range(args.definitions):
+            content = generate_definitions_export(args.mapplets, folder=f"SHARED_{i}", seed=i)
+            if i % 4 == 3:
+                # Small enough for the sniff window to hold all of it
+                content = generate_definitions_export(10, folder=f"SHARED_{i}", seed=i)
+            with open(os.path.join(root, f"definitions_{i:04d}.xml"), "wb") as f:
+                f.write(content.encode("utf-8"))
+        for i in range(args.other):
+            with open(os.path.join(root, f"settings_{i:04d}.xml"), "wb") as f:
+                f.write(("<?xml version=\"1.0\"?><settings>" + "<entry/>" * 200000 + "</settings>").encode("utf-8"))
+
+        listing = LocalContainerClient(root)
+        blobs = [blob for blob in listing.list_blobs() if blob.name.endswith(".xml")]
+        sizes = {blob.name: blob.size for blob in blobs}
+        blob_names = sorted(sizes)
+        config = get_pipeline_config({"parse_workers": 0})
+
+        def run(prefilter):
+            search_client = LocalSearchClient()
+            container = CountingAsyncContainerClient(root, latency=args.latency)
+            start = time.perf_counter()
+            stats = asyncio.run(run_ingestion_pipeline_async(
+                container, blob_names, LocalAsyncSearchClient(search_client), config=config, prefilter=prefilter
+            ))
+            seconds = time.perf_counter() - start
+            return search_client, stats, {"seconds": round(seconds, 3), "mb_downloaded": round(container.bytes / 1e6, 2)}
+
+        baseline, baseline_stats, results = run(None)
+        results = {"no_prefilter": results}
+        for label in ("cold", "warm"):
+            prefilter = load_prefilter(listing, blobs)
+            search_client, stats, results[label] = run(prefilter)
+            prefilter.save(listing)
+            results[label].update({
+                "files_skipped": stats["files_skipped"],
+                "files_sniffed": prefilter.stats()["sniffed"],
+                "speedup": round(results["no_prefilter"]["seconds"] / results[label]["seconds"], 2),
+                "identical_index": search_client.documents == baseline.documents
+            })
+
+    return {
+        "benchmark": "prefilter",
+        "exports": len(blob_names),
+        "workflow_exports": args.files,
+        "workflows": baseline_stats["workflows_extracted"],
+        "mb": round(sum(sizes.values()) / 1e6, 2),
+        "workflow_mb": round(total_bytes / 1e6, 2),
+        **results
+    }
+
+
+def bench_cutover(args):
+    """What readers see while the index is rebuilt in place versus blue/green behind an alias."""
+    with tempfile.TemporaryDirectory() as old_root, tempfile.TemporaryDirectory() as new_root:
+        write_exports(old_root, args.files, args.workflows)
+        # The rebuilt catalog has more workflows per export, so a partial load is visible in the count
+        write_exports(new_root, args.files, args.workflows + args.added)
+        blob_names = [blob.name for blob in LocalContainerClient(old_root).list_blobs()]
+        old_count, new_count = args.files * args.workflows, args.files * (args.workflows + args.added)
+        config = get_pipeline_config({"parse_workers": 0, "batch_size": args.batch_size})
+
+        async def ingest(root, search_client):
+            stats = await run_ingestion_pipeline_async(
+                LocalAsyncContainerClient(root), blob_names,
+                LocalAsyncSearchClient(search_client, latency=args.upload_latency), config=config
+            )
+            return {"documents": stats["workflows_uploaded"], "failed_documents": stats["workflows_failed"],
+                    "failed_files": stats["files_failed"]}
+
+        def run(mode):
+            service = LocalSearchIndexClient()
+            versions = IndexVersions(service, "bench", LocalIndexDefinition, LocalAlias)
+            first = versions.create_next()
+            asyncio.run(ingest(old_root, service.get_search_client(first)))
+            versions.activate(first)
+
+            # A reader polls the alias the whole time, like agents querying during the rebuild
+            reader = service.get_search_client("bench")
+            seen = []
+            stop = threading.Event()
+
+            def observe():
+                while not stop.is_set():
+                    seen.append(reader.get_document_count())
+                    time.sleep(0.001)
+
+            thread = threading.Thread(target=observe)
+            thread.start()
+            start = time.perf_counter()
+            if mode == "in_place":
+                asyncio.run(ingest(new_root, reader))
+            else:
+                asyncio.run(blue_green_rebuild(
+                    versions, lambda version: ingest(new_root, service.get_search_client(version)),
+                    service.get_search_client, get_rebuild_settings({"count_timeout": 5})
+                ))
+            seconds = time.perf_counter() - start
+            time.sleep(0.01)
+            stop.set()
+            thread.join()
+            partial = [count for count in seen if count not in (old_count, new_count)]
+            return {
+                "seconds": round(seconds, 3),
+                "reads": len(seen),
+                "partial_reads": len(partial),
+                "final_documents": reader.get_document_count()
+            }
+
+        return {
+            "benchmark": "cutover",
+            "old_documents": old_count,
+            "new_documents": new_count,
+            "in_place": run("in_place"),
+            "blue_green": run("blue_green")
+        }
+
+
+def bench_load(args):
+    """Requests per second for sync handlers on a thread pool versus async handlers on one loop."""
+    documents = extract_workflows_from_xml(generate_export(workflows=args.workflows), "bench.xml")
+    backend = LocalSearchClient()
+    backend.upload_documents(documents)
+    queries = [documents[i % len(documents)]["name"] for i in range(args.requests)]
+
+    # Sync handlers: each request holds one of the worker's threads for the whole backend call
+    sync_client = LocalSearchClient(latency=args.latency)
+    sync_client.documents = backend.documents
+
+    def sync_lookup(query):
+        return [doc for doc in sync_client.search(search_text=query)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(sync_lookup, queries))
+    sync_seconds = time.perf_counter() - start
+
+    # Async handlers: one loop keeps up to --concurrency backend calls outstanding
+    async_client = LocalAsyncSearchClient(backend, latency=args.latency)
+
+    async def run_async():
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def async_lookup(query):
+            async with semaphore:
+                results = await async_client.search(search_text=query)
+                return [doc async for doc in results]
+
+        await asyncio.gather(*(async_lookup(query) for query in queries))
+
+    start = time.perf_counter()
+    asyncio.run(run_async())
+    async_seconds = time.perf_counter() - start
+
+    return {
+        "benchmark": "load",
+        "requests": args.requests,
+        "backend_latency_seconds": args.latency,
+        "sync": {"threads": args.threads, "seconds": round(sync_seconds, 3),
+                 "requests_per_second": round(args.requests / sync_seconds, 1)},
+        "async": {"concurrency": args.concurrency, "seconds": round(async_seconds, 3),
+                  "requests_per_second": round(args.requests / async_seconds, 1)},
+        "speedup": round(sync_seconds / async_seconds, 2)
+    }
+
+
+def bench_burst(args):
+    """Backend calls and wall time when many agents ask overlapping questions at once, with and without coalescing."""
+    documents = extract_workflows_from_xml(generate_export(workflows=args.workflows), "bench.xml")
+    backend = LocalSearchClient()
+    backend.upload_documents(documents)
+    client = LocalAsyncSearchClient(backend, latency=args.latency)
+    # Each agent turn fans out --queries lookups drawn from a small set of popular names
+    rng = random.Random(args.seed)
+    popular = [documents[i]["name"] for i in range(min(args.distinct, len(documents)))]
+    turns = [[rng.choice(popular) for _ in range(args.queries)] for _ in range(args.agents)]
+
+    def run(enabled):
+        coalescer = RequestCoalescer(enabled=enabled)
+        backend_calls = 0
+
+        async def search(query):
+            nonlocal backend_calls
+            backend_calls += 1
+            results = await client.search(search_text=query)
+            return [doc async for doc in results]
+
+        async def run_all():
+            await asyncio.gather(*(
+                coalescer.run("search", coalesce_key(query), lambda query=query: search(query))
+                for turn in turns for query in turn
+            ))
+
+        start = time.perf_counter()
+        asyncio.run(run_all())
+        return {"seconds": round(time.perf_counter() - start, 3), "backend_calls": backend_calls}
+
+    separate, coalesced = run(False), run(True)
+    return {
+        "benchmark": "burst",
+        "agents": args.agents,
+        "queries_per_agent": args.queries,
+        "distinct_queries": len(popular),
+        "backend_latency_seconds": args.latency,
+        "separate": separate,
+        "coalesced": coalesced,
+        "backend_calls_saved": separate["backend_calls"] - coalesced["backend_calls"]
+    }
+
+
+class ThrottledError(Exception):
+    status_code = 429
+
+
+class SaturatingSearchClient:
+    """Search service stand-in that slows down past ``capacity`` concurrent queries and throttles past ``throttle_at``."""
+
+    def __init__(self, capacity, latency, throttle_at):
+        self.capacity = capacity
+        self.latency = latency
+        self.throttle_at = throttle_at
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+
+    async def search(self, search_text):
+        self.in_flight += 1
+        self.requests += 1
+        try:
+            if self.in_flight > self.throttle_at:
+                await asyncio.sleep(self.latency / 4)
+                self.throttled += 1
+                raise ThrottledError("429 Too Many Requests")
+            await asyncio.sleep(self.latency * max(1.0, self.in_flight / self.capacity))
+            return [{"id": search_text}]
+        finally:
+            self.in_flight -= 1
+
+
+def bench_overload(args):
+    """Latency of agent queries offered faster than the search service can answer, with and without admission control.
+
+    Without it, throttled queries are retried after a fixed delay, like the
+    SDK and host retries did. With it, queries go through the adaptive limit
+    and those turned away get an expired cached answer (popular queries) or a
+    fast 503.
+    """
+    rng = random.Random(args.seed)
+    count = int(args.rate * args.seconds)
+    arrivals = sorted(rng.uniform(0, args.seconds) for _ in range(count))
+    # Popular queries have an expired entry in the result cache, the rest are new
+    hot = {i for i in range(count) if rng.random() < args.hot}
+
+    def run(admitted):
+        service = SaturatingSearchClient(args.capacity, args.latency, args.capacity * 3)
+        controller = AdmissionController(
+            limit_settings={"maximum": args.capacity * 2, "minimum": 1, "latency_target": args.latency * 2,
+                            "max_wait": args.latency * 4, "max_queue": args.capacity * 4},
+            route_rates={"search-workflow": (args.rate, args.capacity * 4)}
+        )
+        outcomes = {"answered": 0, "stale": 0, "rejected": 0, "failed": 0}
+        latencies = {"answered": [], "all": []}
+
+        async def query(i, delay):
+            await asyncio.sleep(delay)
+            start = time.perf_counter()
+            try:
+                if admitted:
+                    with admission_route("search-workflow"):
+                        async with controller.call("search"):
+                            await service.search(f"q{i}")
+                else:
+                    for attempt in range(args.retries + 1):
+                        try:
+                            await service.search(f"q{i}")
+                            break
+                        except ThrottledError:
+                            if attempt == args.retries:
+                                raise
+                            await asyncio.sleep(args.retry_delay)
+                outcomes["answered"] += 1
+                latencies["answered"].append(time.perf_counter() - start)
+            except Overloaded:
+                outcomes["stale" if i in hot else "rejected"] += 1
+            except ThrottledError:
+                outcomes["failed"] += 1
+            latencies["all"].append(time.perf_counter() - start)
+
+        async def run_all():
+            await asyncio.gather(*(query(i, delay) for i, delay in enumerate(arrivals)))
+
+        start = time.perf_counter()
+        asyncio.run(run_all())
+        result = dict(
+            outcomes,
+            seconds=round(time.perf_counter() - start, 3),
+            answered_latency=percentiles(latencies["answered"]),
+            all_latency=percentiles(latencies["all"]),
+            backend_requests=service.requests,
+            backend_throttled=service.throttled
+        )
+        if admitted:
+            result["final_limit"] = round(controller.limit("search").limit, 2)
+        return result
+
+    return {
+        "benchmark": "overload",
+        "queries": count,
+        "offered_per_second": args.rate,
+        "service_capacity_per_second": round(args.capacity / args.latency),
+        "hot_fraction": args.hot,
+        "without_admission": run(False),
+        "with_admission": run(True)
+    }
+
+
+def bench_local_search(args):
+    """Query latency of the embedded BM25 index versus the remote search path."""
+    content = generate_export(workflows=args.workflows, sources=4, targets=2)
+    table = WorkflowTable("bench.xml")
+    for bucket in iter_workflow_buckets_from_chunks([content], "bench.xml"):
+        table.append(bucket)
+    workflows = list(table.documents())
+    lineage = list(table.lineage_records())
+
+    start = time.perf_counter()
+    index = LocalSearchIndex.build({"bench.xml": table.index_entries()})
+    build_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "bench.lix")
+        with open(path, "wb") as f:
+            f.write(index.buffer)
+        mapped = LocalSearchIndex.open(path)
+
+        remote = LocalSearchClient(latency=args.remote_latency)
+        remote.upload_documents(workflows)
+
+        rng = random.Random(0)
+        names = [rng.choice(workflows)["name"] for _ in range(args.queries)]
+        tables = [rng.choice(lineage)[2][0] for _ in range(args.queries)]
+
+        def measure(search, queries, **kwargs):
+            samples = []
+            for query in queries:
+                start = time.perf_counter()
+                list(search(search_text=query, top=50, **kwargs))
+                samples.append(time.perf_counter() - start)
+            return percentiles(samples)
+
+        def measure_filters(search, filters):
+            samples = []
+            for search_filter in filters:
+                start = time.perf_counter()
+                list(search(search_text="*", filter=search_filter, top=50))
+                samples.append(time.perf_counter() - start)
+            return percentiles(samples)
+
+        table_filters = [table_filter(name) for name in tables]
+
+        result = {
+            "benchmark": "local-search",
+            "documents": len(workflows),
+            "terms": len(index.terms),
+            "index_bytes": len(index.buffer),
+            "build_seconds": round(build_seconds, 3),
+            "remote_latency_seconds": args.remote_latency,
+            "local": {
+                "workflow_name": measure(mapped.search, names),
+                "table_name": measure(mapped.search, tables),
+                "table_filter": measure_filters(mapped.search, table_filters),
+                "id_filter": measure(mapped.search, ["*"] * len(names),
+                                     filter=f"id eq '{workflows[len(workflows) // 2]['id']}'")
+            },
+            "remote": {
+                "workflow_name": measure(remote.search, names[:args.remote_queries])
+            }
+        }
+        del mapped
+    return result
+
+
+class DiscardingSearchClient:
+    """Search client stand-in that accepts uploads without keeping them, for memory measurements."""
+
+    def upload_documents(self, documents):
+        return [LocalIndexingResult(document["id"]) for document in documents]
+
+
+def retained_bytes(build):
+    """Bytes still allocated after ``build()`` returns, while its result is alive."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def bench_memory(args):
+    """Memory held per representation of the extracted workflows, and peak during ingestion."""
+    content = generate_export(workflows=args.workflows, sources=args.sources, targets=args.targets)
+    buckets = list(iter_workflow_buckets_from_chunks([content], "bench.xml"))
+    del content
+
+    def bucket_dicts():
+        # Fresh copies so the measurement does not share strings with ``buckets``
+        return [{key: (list(map(str.upper, map(str.lower, value))) if isinstance(value, list) else value.upper().lower())
+                 for key, value in bucket.items()} for bucket in buckets]
+
+    def documents_and_lineage():
+        table = build_table()
+        documents = list(table.documents())
+        lineage = list(table.lineage_records())
+        entries = [(document, tables) for document, (_, tables) in zip(documents, table.index_entries())]
+        del table
+        return documents, lineage, entries
+
+    def build_table():
+        table = WorkflowTable("bench.xml")
+        for bucket in bucket_dicts():
+            table.append(bucket)
+        return table.freeze()
+
+    representations = {
+        "bucket_dicts": retained_bytes(bucket_dicts),
+        "documents_and_lineage": retained_bytes(documents_and_lineage),
+        "workflow_table": retained_bytes(build_table)
+    }
+    del buckets
+
+    with tempfile.TemporaryDirectory() as root:
+        total_bytes = write_exports(root, args.files, args.workflows // args.files)
+        container = LocalContainerClient(root)
+        blob_names = [blob.name for blob in container.list_blobs()]
+        config = get_pipeline_config({"parse_workers": 0, "download_workers": 2})
+        tracemalloc.start()
+        stats = run_ingestion_pipeline(container, blob_names, DiscardingSearchClient(), config=config)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        "benchmark": "memory",
+        "workflows": args.workflows,
+        "retained_mb": {name: round(size / 1e6, 2) for name, size in representations.items()},
+        "workflow_table_reduction": {
+            name: round(size / representations["workflow_table"], 2) for name, size in representations.items()
+        },
+        "bytes_per_workflow": {name: round(size / args.workflows) for name, size in representations.items()},
+        "ingest": {
+            "files": args.files,
+            "input_mb": round(total_bytes / 1e6, 2),
+            "workflows": stats["workflows_extracted"],
+            "peak_traced_mb": round(peak / 1e6, 2)
+        }
+    }
+
+
+def bench_parse_scaling(args):
+    """Parse throughput as worker processes increase, for each way of handing bytes to the workers."""
+    exports = [
+        (generate_export(workflows=args.workflows, folder=f"FOLDER_{i}", seed=i).encode("utf-8"), f"export_{i:04d}.xml")
+        for i in range(args.files)
+    ]
+    total_bytes = sum(len(data) for data, _ in exports)
+    in_process, _ = best_of(args.repeat, lambda: [parse_blob_bytes(data, name) for data, name in exports])
+
+    def parse_all(pool):
+        buffers = []
+        for data, name in exports:
+            buffer = pool.buffer(len(data))
+            buffer.write(data)
+            buffers.append((buffer, name))
+        try:
+            futures = [pool.submit(buffer, name) for buffer, name in buffers]
+            return sum(len(future.result()[0]) for future in futures)
+        finally:
+            for buffer, _ in buffers:
+                buffer.close()
+
+    cpu_count = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, cpu_count} & set(range(1, max(cpu_count, args.max_workers) + 1)))
+    curves = {}
+    for handoff in args.handoffs:
+        runs = []
+        for workers in worker_counts:
+            pool = ParsePool(workers, handoff)
+            try:
+                parse_all(pool)  # start the workers outside the timed runs
+                seconds, workflows = best_of(args.repeat, parse_all, pool)
+            finally:
+                pool.shutdown()
+            runs.append({
+                "workers": workers,
+                "seconds": round(seconds, 3),
+                "mb_per_second": round(total_bytes / seconds / 1e6, 2),
+                "workflows_per_second": round(workflows / seconds),
+                "speedup_vs_in_process": round(in_process / seconds, 2)
+            })
+        curves[handoff] = runs
+
+    return {
+        "benchmark": "parse-scaling",
+        "cpu_count": cpu_count,
+        "files": args.files,
+        "workflows_per_file": args.workflows,
+        "total_mb": round(total_bytes / 1e6, 2),
+        "in_process": {"seconds": round(in_process, 3), "mb_per_second": round(total_bytes / in_process / 1e6, 2)},
+        "handoffs": curves
+    }
+
+
+STARTUP_MODULES = (
+    "function_app", "clients", "startup", "local_index", "lineage_graph", "xml_extractor", "ingestion",
+    "ingestion_jobs", "document_lookup", "azure.search.documents", "azure.search.documents.indexes.models",
+    "azure.storage.blob", "azure.storage.blob.aio", "aiohttp"
+)
+
+
+def import_profile(statement):
+    """Run ``statement`` in a fresh interpreter under ``-X importtime``; returns [(module, depth, self us, cumulative us)]."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True, timeout=300,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if process.returncode:
+        raise ImportError(process.stderr.strip().splitlines()[-1])
+    entries = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue  # column header
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return entries
+
+
+def bench_startup(args):
+    """Import cost of each module in a fresh interpreter, beyond what interpreter start-up already loads."""
+    from startup import DEFERRED_MODULES
+
+    baseline = {name for name, _, _, _ in import_profile("pass")}
+    interpreter, _ = best_of(args.repeat, subprocess.run, [sys.executable, "-c", "pass"])
+    results = {}
+    for module in args.modules:
+        best = None
+        try:
+            for _ in range(args.repeat):
+                entries = [entry for entry in import_profile(f"import {module}") if entry[0] not in baseline]
+                total = sum(cumulative for _, depth, _, cumulative in entries if depth == 0)
+                if best is None or total < best[0]:
+                    best = (total, entries)
+        except (ImportError, subprocess.SubprocessError) as e:
+            results[module] = {"error": str(e)}
+            continue
+        total, entries = best
+        loaded = {name for name, _, _, _ in entries}
+        heaviest = sorted(entries, key=lambda entry: entry[2], reverse=True)[:args.top]
+        results[module] = {
+            "import_ms": round(total / 1000, 2),
+            "modules_loaded": len(entries),
+            # Modules the app is meant to import only on first use
+            "deferred_loaded": [name for name in DEFERRED_MODULES if name in loaded and name != module],
+            "heaviest_self_ms": {name: round(self_us / 1000, 2) for name, _, self_us, _ in heaviest}
+        }
+    return {
+        "benchmark": "startup",
+        "python": platform.python_version(),
+        "interpreter_ms": round(interpreter * 1000, 2),
+        "modules": results
+    }
+
+
+# Scenario presets for ``suite``; every input is derived from these and a fixed seed
+SUITE_SCALES = {
+    "small": {"files": 4, "workflows": 250, "folders": 2, "sources": 4, "targets": 2, "transformations": 8,
+              "queries": 200},
+    "medium": {"files": 16, "workflows": 1000, "folders": 4, "sources": 4, "targets": 2, "transformations": 8,
+               "queries": 500},
+    "large": {"files": 64, "workflows": 2500, "folders": 8, "sources": 6, "targets": 3, "transformations": 12,
+              "queries": 1000}
+}
+
+
+# Absolute differences below these are noise regardless of the relative change
+NOISE_FLOORS = {"ms": 0.05, "s": 0.05, "MB": 1.0}
+
+
+def metric(value, unit, better):
+    return {"value": value, "unit": unit, "better": better}
+
+
+def environment():
+    """Interpreter, machine and revision the results were produced on."""
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parser_backend": get_parser_backend(),
+        "revision": revision
+    }
+
+
+def bench_suite(args):
+    """Parse throughput, peak memory, end-to-end ingest and search latency for one seeded scenario."""
+    scenario = dict(SUITE_SCALES[args.scale], scale=args.scale, parse_workers=args.parse_workers, repeat=args.repeat)
+    shape = {key: scenario[key] for key in ("folders", "sources", "targets", "transformations")}
+    metrics = {}
+
+    with tempfile.TemporaryDirectory() as root:
+        total_bytes = write_exports(root, scenario["files"], scenario["workflows"], **shape)
+        blob_names = sorted(name for name in os.listdir(root) if name.endswith(".xml"))
+        exports = []
+        for name in blob_names:
+            with open(os.path.join(root, name), "rb") as f:
+                exports.append((f.read(), name))
+
+        # Parse throughput: bytes to WorkflowTables in this process
+        parse_seconds, tables = best_of(args.repeat, lambda: [parse_blob_bytes(data, name)[0] for data, name in exports])
+        workflow_count = sum(len(table) for table in tables)
+        metrics["parse_mb_per_second"] = metric(round(total_bytes / parse_seconds / 1e6, 2), "MB/s", "higher")
+        metrics["parse_workflows_per_second"] = metric(round(workflow_count / parse_seconds), "workflows/s", "higher")
+
+        # End-to-end ingest against the local blob and search stand-ins
+        config = get_pipeline_config({"parse_workers": args.parse_workers, "download_workers": 4})
+        for engine in ("async", "threads"):
+            def ingest():
+                if engine == "async":
+                    return asyncio.run(run_ingestion_pipeline_async(
+                        LocalAsyncContainerClient(root), blob_names, LocalAsyncSearchClient(), config=config
+                    ))
+                return run_ingestion_pipeline(LocalContainerClient(root), blob_names, LocalSearchClient(), config=config)
+            seconds, stats = best_of(args.repeat, ingest)
+            metrics[f"ingest_{engine}_seconds"] = metric(round(seconds, 3), "s", "lower")
+            metrics[f"ingest_{engine}_workflows_per_second"] = metric(
+                round(stats["workflows_uploaded"] / seconds), "workflows/s", "higher"
+            )
+
+        # Peak traced memory of one ingest run, measured separately because tracing slows it down
+        tracemalloc.start()
+        run_ingestion_pipeline(LocalContainerClient(root), blob_names, DiscardingSearchClient(), config=config)
+        metrics["ingest_peak_memory_mb"] = metric(round(tracemalloc.get_traced_memory()[1] / 1e6, 2), "MB", "lower")
+        tracemalloc.stop()
+
+    # Search route path: paging options, a search call and response rendering
+    documents = [document for table in tables for document in table.documents()]
+    backend = LocalSearchClient()
+    backend.upload_documents(documents)
+    search_client = LocalAsyncSearchClient(backend)
+    rng = random.Random(0)
+    lineage = [record for table in tables for record in table.lineage_records()]
+    workflow_queries = [rng.choice(documents)["name"] for _ in range(scenario["queries"])]
+    table_queries = [rng.choice(record[2] or ("UNKNOWN",)) for record in
+                     (rng.choice(lineage) for _ in range(scenario["queries"]))]
+
+    async def route_latencies(queries, key, exact_tables=False):
+        samples = []
+        for query in queries:
+            start = time.perf_counter()
+            # debug-table looks tables up with an exact filter by default
+            search_filter = table_filter(query) if exact_tables else None
+            page = PageRequest.from_body({}, query, search_filter)
+            kwargs = page.search_kwargs()
+            if search_filter:
+                kwargs["filter"] = search_filter
+            results = await search_client.search(search_text="*" if exact_tables else query, **kwargs)
+            page.render(key, [document async for document in results])
+            samples.append(time.perf_counter() - start)
+        return percentiles(samples)
+
+    for route, latency in (
+        ("search_workflow", asyncio.run(route_latencies(workflow_queries, "workflows"))),
+        ("debug_table", asyncio.run(route_latencies(table_queries, "tables", exact_tables=True)))
+    ):
+        for name, value in latency.items():
+            metrics[f"{route}_{name}"] = metric(value, "ms", "lower")
+
+    local_index = LocalSearchIndex.build({table.xml_file: table.index_entries() for table in tables})
+    samples = []
+    for query in workflow_queries:
+        start = time.perf_counter()
+        local_index.search(search_text=query, top=50)
+        samples.append(time.perf_counter() - start)
+    for name, value in percentiles(samples).items():
+        metrics[f"local_search_{name}"] = metric(value, "ms", "lower")
+
+    result = {
+        "benchmark": "suite",
+        "scenario": scenario,
+        "environment": environment(),
+        "input": {"mb": round(total_bytes / 1e6, 2), "workflows": workflow_count},
+        "metrics": metrics
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            result.update(compare_to_baseline(result, json.load(f), args.tolerance))
+    return result
+
+
+def compare_to_baseline(current, baseline, tolerance):
+    """Per-metric change against a baseline run; changes beyond ``tolerance`` in the bad direction are regressions."""
+    comparison = {}
+    regressions = []
+    for name, entry in current["metrics"].items():
+        previous = baseline.get("metrics", {}).get(name)
+        if previous is None or not previous["value"]:
+            continue
+        change = (entry["value"] - previous["value"]) / previous["value"]
+        worse = -change if entry["better"] == "higher" else change
+        if abs(entry["value"] - previous["value"]) < NOISE_FLOORS.get(entry["unit"], 0):
+            worse = 0.0
+        status = "regressed" if worse > tolerance else "improved" if worse < -tolerance else "unchanged"
+        if status == "regressed":
+            regressions.append(name)
+        comparison[name] = {
+            "baseline": previous["value"],
+            "current": entry["value"],
+            "change_pct": round(change * 100, 1),
+            "status": status
+        }
+    return {
+        "baseline": {
+            "scenario_matches": baseline.get("scenario") == current["scenario"],
+            "environment": baseline.get("environment"),
+            "tolerance_pct": round(tolerance * 100, 1)
+        },
+        "comparison": comparison,
+        "regressions": regressions
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--output", help="Also write the JSON results to this file")
+
+    pipeline = subparsers.add_parser("pipeline", parents=[common], help="Ingestion pipeline scaling with parse workers")
+    pipeline.add_argument("--files", type=int, default=64)
+    pipeline.add_argument("--workflows", type=int, default=200)
+    pipeline.add_argument("--download-workers", type=int, default=8)
+    pipeline.add_argument("--latency", type=float, default=0.02, help="Simulated per-blob download latency (s)")
+    pipeline.set_defaults(func=bench_pipeline)
+
+    extract = subparsers.add_parser("extract", parents=[common], help="Single-pass extractor versus the original descendant scans")
+    extract.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    extract.add_argument("--transformations", type=int, default=8)
+    extract.add_argument("--nesting", type=int, default=1, help="Depth of nested WORKFLOW runs")
+    extract.add_argument("--fields", type=int, default=1, help="Ports per transformation")
+    extract.add_argument("--backends", nargs="+", choices=PARSER_BACKENDS[1:], default=list(PARSER_BACKENDS[1:]),
+                         help="Parser backends to time (lxml is skipped when not installed)")
+    extract.add_argument("--repeat", type=int, default=3)
+    extract.set_defaults(func=bench_extract)
+
+    snapshot = subparsers.add_parser("snapshot", parents=[common], help="Rebuild from XML versus bulk load from a snapshot")
+    snapshot.add_argument("--files", type=int, default=16)
+    snapshot.add_argument("--workflows", type=int, default=2000)
+    snapshot.add_argument("--parse-workers", type=int, default=0)
+    snapshot.add_argument("--upload-concurrency", type=int, default=16)
+    snapshot.add_argument("--latency", type=float, default=0.02, help="Simulated per-blob download latency (s)")
+    snapshot.add_argument("--upload-latency", type=float, default=0.0, help="Simulated indexing request latency (s)")
+    snapshot.set_defaults(func=bench_snapshot)
+
+    cutover = subparsers.add_parser("cutover", parents=[common], help="Reads during an in-place versus blue/green rebuild")
+    cutover.add_argument("--files", type=int, default=8)
+    cutover.add_argument("--workflows", type=int, default=500)
+    cutover.add_argument("--added", type=int, default=50, help="Workflows per export the rebuilt catalog adds")
+    cutover.add_argument("--batch-size", type=int, default=100)
+    cutover.add_argument("--upload-latency", type=float, default=0.01, help="Simulated indexing request latency (s)")
+    cutover.set_defaults(func=bench_cutover)
+
+    prefilter = subparsers.add_parser("prefilter", parents=[common], help="Ingestion of mixed exports with the download prefilter")
+    prefilter.add_argument("--files", type=int, default=16, help="Exports with workflows")
+    prefilter.add_argument("--workflows", type=int, default=500)
+    prefilter.add_argument("--definitions", type=int, default=48, help="Exports of mapplets and sources only")
+    prefilter.add_argument("--mapplets", type=int, default=300)
+    prefilter.add_argument("--other", type=int, default=8, help="XML blobs that are not PowerCenter exports")
+    prefilter.add_argument("--latency", type=float, default=0.02, help="Simulated per-request download latency (s)")
+    prefilter.set_defaults(func=bench_prefilter)
+
+    load = subparsers.add_parser("load", parents=[common], help="Sync versus async read route throughput")
+    load.add_argument("--requests", type=int, default=2000)
+    load.add_argument("--workflows", type=int, default=200)
+    load.add_argument("--latency", type=float, default=0.02, help="Simulated search latency (s)")
+    load.add_argument("--threads", type=int, default=8, help="Sync handler thread pool size")
+    load.add_argument("--concurrency", type=int, default=200, help="Outstanding async requests")
+    load.set_defaults(func=bench_load)
+
+    burst = subparsers.add_parser("burst", parents=[common], help="Concurrent overlapping queries with and without coalescing")
+    burst.add_argument("--agents", type=int, default=50, help="Concurrent agent turns")
+    burst.add_argument("--queries", type=int, default=8, help="Lookups fanned out per turn")
+    burst.add_argument("--distinct", type=int, default=20, help="Size of the popular query set")
+    burst.add_argument("--workflows", type=int, default=200)
+    burst.add_argument("--latency", type=float, default=0.02, help="Simulated search latency (s)")
+    burst.add_argument("--seed", type=int, default=0)
+    burst.set_defaults(func=bench_burst)
+
+    overload = subparsers.add_parser("overload", parents=[common], help="Agent query latency under overload with and without admission control")
+    overload.add_argument("--rate", type=float, default=400, help="Offered queries per second")
+    overload.add_argument("--seconds", type=float, default=2.0)
+    overload.add_argument("--capacity", type=int, default=8, help="Queries the service runs at full speed at once")
+    overload.add_argument("--latency", type=float, default=0.05, help="Service latency when not saturated (s)")
+    overload.add_argument("--hot", type=float, default=0.5, help="Share of queries with an expired cached answer")
+    overload.add_argument("--retries", type=int, default=3, help="Fixed-delay retries of throttled queries without admission control")
+    overload.add_argument("--retry-delay", type=float, default=0.2)
+    overload.add_argument("--seed", type=int, default=7)
+    overload.set_defaults(func=bench_overload)
+
+    local_search = subparsers.add_parser("local-search", parents=[common], help="Embedded BM25 index versus remote search latency")
+    local_search.add_argument("--workflows", type=int, default=20000)
+    local_search.add_argument("--queries", type=int, default=500)
+    local_search.add_argument("--remote-queries", type=int, default=50)
+    local_search.add_argument("--remote-latency", type=float, default=0.03, help="Simulated service round trip (s)")
+    local_search.set_defaults(func=bench_local_search)
+
+    memory = subparsers.add_parser("memory", parents=[common], help="Memory of the intermediate workflow representations")
+    memory.add_argument("--workflows", type=int, default=20000)
+    memory.add_argument("--sources", type=int, default=4)
+    memory.add_argument("--targets", type=int, default=2)
+    memory.add_argument("--files", type=int, default=8, help="Exports for the ingest peak measurement")
+    memory.set_defaults(func=bench_memory)
+
+    scaling = subparsers.add_parser("parse-scaling", parents=[common], help="Parse throughput versus worker processes")
+    scaling.add_argument("--files", type=int, default=16)
+    scaling.add_argument("--workflows", type=int, default=2000)
+    scaling.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    scaling.add_argument("--handoffs", nargs="+", choices=HANDOFFS, default=list(HANDOFFS))
+    scaling.add_argument("--repeat", type=int, default=3)
+    scaling.set_defaults(func=bench_parse_scaling)
+
+    startup = subparsers.add_parser("startup", parents=[common], help="Cold start import cost per module")
+    startup.add_argument("--modules", nargs="+", default=list(STARTUP_MODULES))
+    startup.add_argument("--repeat", type=int, default=3)
+    startup.add_argument("--top", type=int, default=5, help="Heaviest imports listed per module")
+    startup.set_defaults(func=bench_startup)
+
+    suite = subparsers.add_parser("suite", parents=[common], help="Seeded end-to-end suite, comparable across runs")
+    suite.add_argument("--scale", choices=sorted(SUITE_SCALES), default="small")
+    suite.add_argument("--parse-workers", type=int, default=0, help="Parse processes for the ingest runs")
+    suite.add_argument("--repeat", type=int, default=3, help="Timed runs per measurement; the best is kept")
+    suite.add_argument("--baseline", help="Results file of an earlier suite run to compare against")
+    suite.add_argument("--tolerance", type=float, default=0.10, help="Relative change treated as noise")
+    suite.set_defaults(func=bench_suite)
+
+    args = parser.parse_args(argv)
+    result = args.func(args)
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    # A non-zero exit lets CI fail on regressions against a baseline
+    return 1 if result.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Skipping exports without workflows before downloading them.
+
+Many ``.xml`` blobs in the container are mapplet-only or source-definition
+exports, or not PowerCenter exports at all. Ingesting one still costs a full
+download and parse to extract nothing. Before a blob is downloaded, the
+pipeline asks a ``BlobPrefilter``:
+
+* the classification cache (``_prefilter/classifications.json``) answers
+  for any blob version seen before. It is keyed by Content-MD5, or by name and
+  ETag, so it holds across full runs, jobs and index versions;
+* otherwise a ranged read of the first ``INGEST_SNIFF_BYTES`` is sniffed. A
+  ``WORKFLOW`` start tag means workflows. A blob that fits in the window is
+  classified completely: without a ``POWERMART`` root it is not an export.
+
+The sniff cannot rule workflows out of a larger export, since WORKFLOW
+elements come last in a folder, nor can it tell a non-export from an export
+in an encoding the byte patterns do not match (UTF-16, say). Such blobs are
+ingested normally, and the parse result is recorded, so the next run skips
+them without a download.
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+
+from parse_cache import listed_digest
+from metrics import metrics
+
+PREFILTER_BLOB_NAME = "_prefilter/classifications.json"
+SNIFF_BYTES = 64 * 1024
+MAX_ENTRIES = 100000
+
+WORKFLOWS = "workflows"
+NO_WORKFLOWS = "no_workflows"
+NOT_EXPORT = "not_export"
+SKIPPED = (NO_WORKFLOWS, NOT_EXPORT)
+
+_WORKFLOW_TAG = re.compile(rb"<WORKFLOW[\s>/]")
+_ROOT_TAG = re.compile(rb"<POWERMART[\s>/]")
+
+
+def get_sniff_bytes():
+    return max(1024, int(os.getenv("INGEST_SNIFF_BYTES", SNIFF_BYTES)))
+
+
+def sniff(head, complete):
+    """Classify an export from its first bytes; ``None`` when only the rest of it can tell."""
+    if _WORKFLOW_TAG.search(head):
+        return WORKFLOWS
+    # Tags are only matched as bytes in ASCII-compatible encodings; anything else is left to the parser
+    if not complete or not _ascii_compatible(head):
+        return None
+    return NO_WORKFLOWS if _ROOT_TAG.search(head) else NOT_EXPORT
+
+
+def _ascii_compatible(head):
+    """Whether ``head`` is in an encoding whose markup bytes are ASCII (not UTF-16/32, which have NULs)."""
+    return b"\x00" not in head and not head.startswith((b"\xfe\xff", b"\xff\xfe"))
+
+
+def classification_key(blob):
+    """Cache key of a listed blob version: its Content-MD5, or its name and ETag."""
+    return listed_digest(blob) or f"{blob.name}@{blob.etag}"
+
+
+class BlobPrefilter:
+    """Classifies the listed blobs of one run through the shared cache and header sniffing."""
+
+    def __init__(self, classes=None, sniff_bytes=None):
+        self.classes = dict(classes or {})
+        self.sniff_bytes = sniff_bytes or get_sniff_bytes()
+        self._listed = {}
+        self._changed = False
+        # The threaded pipeline classifies from several downloader threads
+        self._lock = threading.Lock()
+        self._stats = {"cached": 0, "sniffed": 0, "sniffed_bytes": 0, "skipped": 0, "learned": 0}
+
+    def track(self, blobs, digests=None):
+        """Remember the listed version (cache key and size) of each blob to be ingested.
+
+        ``digests`` maps names to Content-MD5 digests recorded at listing time,
+        for blobs re-created from a fingerprint.
+        """
+        for blob in blobs:
+            key = (digests or {}).get(blob.name) or classification_key(blob)
+            self._listed[blob.name] = (key, blob.size)
+        return self
+
+    def classify(self, blob_client, timings=None):
+        """Class of a blob from the cache or a ranged read of its head; ``None`` if it has to be parsed."""
+        verdict = self._cached(blob_client.blob_name)
+        if verdict is None and self._needs_sniff(blob_client.blob_name):
+            start = time.perf_counter()
+            head = blob_client.download_blob(offset=0, length=self.sniff_bytes).readall()
+            verdict = self._sniffed(blob_client.blob_name, head, start, timings)
+        return self._verdict(verdict)
+
+    async def classify_async(self, blob_client, timings=None):
+        """``classify`` for ``aio`` blob clients."""
+        verdict = self._cached(blob_client.blob_name)
+        if verdict is None and self._needs_sniff(blob_client.blob_name):
+            start = time.perf_counter()
+            downloader = await blob_client.download_blob(offset=0, length=self.sniff_bytes)
+            head = await downloader.readall()
+            verdict = self._sniffed(blob_client.blob_name, head, start, timings)
+        return self._verdict(verdict)
+
+    def learn(self, blob_name, table):
+        """Record what parsing a blob found, for the next run."""
+        if blob_name in self._listed:
+            self._record(blob_name, WORKFLOWS if len(table) else NO_WORKFLOWS)
+            self._count("learned")
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self.classes))
+
+    def _count(self, stat, amount=1):
+        with self._lock:
+            self._stats[stat] += amount
+
+    def _cached(self, blob_name):
+        listed = self._listed.get(blob_name)
+        if listed is None:
+            return None
+        key, size = listed
+        if not size:
+            return NOT_EXPORT
+        verdict = self.classes.get(key)
+        if verdict == NOT_EXPORT and size > self.sniff_bytes:
+            # Only a complete head may rule a blob out; earlier runs also cached verdicts from partial ones
+            with self._lock:
+                self.classes.pop(key, None)
+                self._changed = True
+            return None
+        if verdict is not None:
+            self._count("cached")
+        return verdict
+
+    def _needs_sniff(self, blob_name):
+        # Blobs this run did not list have no size to judge the window by
+        return blob_name in self._listed
+
+    def _sniffed(self, blob_name, head, start, timings):
+        if timings:
+            timings.add("sniff", time.perf_counter() - start)
+        self._count("sniffed")
+        self._count("sniffed_bytes", len(head))
+        metrics.inc("ingest_bytes_total", len(head))
+        verdict = sniff(head, len(head) >= self._listed[blob_name][1])
+        if verdict is not None:
+            self._record(blob_name, verdict)
+        return verdict
+
+    def _verdict(self, verdict):
+        metrics.inc("ingest_prefilter_total", outcome=verdict or "undecided")
+        if verdict in SKIPPED:
+            self._count("skipped")
+        return verdict
+
+    def _record(self, blob_name, verdict):
+        key = self._listed[blob_name][0]
+        with self._lock:
+            if self.classes.get(key) != verdict:
+                self.classes.pop(key, None)
+                self.classes[key] = verdict
+                self._changed = True
+
+    def save(self, container_client):
+        """Write the classification cache back if this run learned anything, keeping the newest entries."""
+        if not self._changed:
+            return
+        with self._lock:
+            entries = list(self.classes.items())[-MAX_ENTRIES:]
+        blob_client = container_client.get_blob_client(PREFILTER_BLOB_NAME)
+        blob_client.upload_blob(json.dumps(dict(entries), separators=(",", ":")).encode("utf-8"), overwrite=True)
+        self._changed = False
+
+
+def load_prefilter(container_client, blobs, digests=None):
+    """A ``BlobPrefilter`` for ``blobs`` with the container's classification cache."""
+    blob_client = container_client.get_blob_client(PREFILTER_BLOB_NAME)
+    classes = {}
+    if blob_client.exists():
+        try:
+            classes = json.loads(blob_client.download_blob().readall())
+        except ValueError as e:
+            logging.error(f"Ignoring unreadable blob classification cache: {str(e)}")
+    return BlobPrefilter(classes).track(blobs, digests)
@@ -0,0 +1,245 @@
+"""
+Versioned, compressed snapshots of the extracted catalog.
+
+``process-xml`` is otherwise the only way to fill an index, and it downloads
+and parses every export again. Rebuilding an index, filling a dev copy or a
+new region would repeat the whole pipeline. So ``finalize_ingestion`` also
+writes what it indexed to one blob per index (``_snapshots/<index>.wcs``).
+The ``bulk-load`` route pushes such a snapshot into an index without touching
+the XML.
+
+Layout: ``WCS1``, a little-endian u32 header length, a JSON header, and then
+one section per export. A section is the export's ``WorkflowTable`` in its
+columnar, zlib-compressed form: the string pool plus offset/reference
+columns. Those columns hold the workflows, their source and target tables,
+transformations, sessions and mappings, so the workflow/table lineage edges
+are part of the catalog. The lineage graph and local index are rebuilt from
+it. The header lists each section's offset, length and workflow count, and
+the export's blob fingerprint.
+
+A snapshot file is memory-mapped and only the section being read is
+decompressed. Incremental runs copy the sections of unchanged exports from
+the previous snapshot byte for byte.
+"""
+
+import os
+import json
+import mmap
+import time
+import struct
+import asyncio
+import logging
+import tempfile
+from datetime import datetime, timezone
+
+from workflow_model import WorkflowTable
+from batch_uploader import AsyncBatchUploader
+from ingestion import document_hash
+
+SNAPSHOT_PREFIX = "_snapshots/"
+SNAPSHOT_VERSION = 1
+FORMAT_MAGIC = b"WCS1"
+# Snapshots are written once per run and read many times, so they compress harder than checkpoints
+COMPRESSION_LEVEL = 6
+
+
+def get_snapshot_blob_name(index_name):
+    return f"{SNAPSHOT_PREFIX}{index_name}.wcs"
+
+
+def is_snapshot_blob_name(blob_name):
+    """Whether ``blob_name`` is a snapshot blob (and not, say, a manifest or an export)."""
+    name = str(blob_name)
+    return (
+        name.startswith(SNAPSHOT_PREFIX) and name.endswith(".wcs") and len(name) > len(SNAPSHOT_PREFIX) + 4
+        and ".." not in name.split("/")
+    )
+
+
+def snapshots_enabled():
+    return os.getenv("CATALOG_SNAPSHOT_ENABLED", "true").lower() != "false"
+
+
+class CatalogSnapshot:
+    """Read-only catalog snapshot over a serialized buffer (``bytes`` or an ``mmap``)."""
+
+    def __init__(self, buffer, path=None):
+        self.buffer = buffer
+        self._path = path
+        self._view = memoryview(buffer)
+        if bytes(self._view[:4]) != FORMAT_MAGIC:
+            raise ValueError("Not a catalog snapshot")
+        header_size = struct.unpack_from("<I", self._view, 4)[0]
+        self.header = json.loads(bytes(self._view[8:8 + header_size]))
+        if self.header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported catalog snapshot version {self.header.get('version')}")
+        self.exports = self.header["exports"]
+        self._data_start = 8 + header_size
+
+    @classmethod
+    def build(cls, sections):
+        """Snapshot of (xml file, workflow count, compressed table bytes, blob fingerprint) sections."""
+        exports = []
+        position = 0
+        for xml_file, workflows, data, fingerprint in sections:
+            exports.append({
+                "xml_file": xml_file,
+                "workflows": workflows,
+                "offset": position,
+                "length": len(data),
+                "fingerprint": fingerprint
+            })
+            position += len(data)
+        header = json.dumps({
+            "version": SNAPSHOT_VERSION,
+            "created": datetime.now(timezone.utc).isoformat(),
+            "workflows": sum(export["workflows"] for export in exports),
+            "exports": exports
+        }, separators=(",", ":")).encode("utf-8")
+        return cls(b"".join([FORMAT_MAGIC, struct.pack("<I", len(header)), header] + [data for _, _, data, _ in sections]))
+
+    @classmethod
+    def open(cls, path, remove_on_close=False):
+        """Memory-map a snapshot file; ``remove_on_close`` deletes it again on ``close``."""
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), path if remove_on_close else None)
+
+    def __len__(self):
+        return self.header["workflows"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._view.release()
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        if self._path:
+            os.remove(self._path)
+            self._path = None
+
+    def section(self, number):
+        """Compressed bytes of export ``number``, without copying."""
+        export = self.exports[number]
+        start = self._data_start + export["offset"]
+        return self._view[start:start + export["length"]]
+
+    def table(self, number):
+        return WorkflowTable.from_bytes(self.section(number))
+
+    def tables(self):
+        for number in range(len(self.exports)):
+            yield self.table(number)
+
+    def documents(self):
+        for table in self.tables():
+            yield from table.documents()
+
+    def describe(self):
+        """Header summary without the section offsets."""
+        return {
+            "version": self.header["version"],
+            "created": self.header["created"],
+            "workflows": len(self),
+            "bytes": len(self._view),
+            "exports": [
+                {"xml_file": export["xml_file"], "workflows": export["workflows"], "fingerprint": export["fingerprint"]}
+                for export in self.exports
+            ]
+        }
+
+
+def merge_snapshot(previous, tables_by_blob, fingerprints, removed=(), incremental=True):
+    """Snapshot of ``tables_by_blob``; incremental runs keep ``previous`` sections of exports that were not re-parsed."""
+    sections = []
+    if incremental and previous is not None:
+        replaced = set(tables_by_blob) | set(removed)
+        for number, export in enumerate(previous.exports):
+            if export["xml_file"] not in replaced:
+                sections.append((export["xml_file"], export["workflows"], previous.section(number), export["fingerprint"]))
+    for name, table in tables_by_blob.items():
+        sections.append((name, len(table), table.to_bytes(COMPRESSION_LEVEL), fingerprints.get(name)))
+    return CatalogSnapshot.build(sections)
+
+
+def load_snapshot(container_client, blob_name, directory=None):
+    """Download a snapshot blob to a temp file and map it, or ``None`` if there is no such blob."""
+    blob_client = container_client.get_blob_client(blob_name)
+    if not blob_client.exists():
+        return None
+    fd, path = tempfile.mkstemp(prefix="catalog-", suffix=".wcs", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in blob_client.download_blob().chunks():
+                f.write(chunk)
+        return CatalogSnapshot.open(path, remove_on_close=True)
+    except (ValueError, OSError):
+        os.remove(path)
+        raise
+
+
+def save_snapshot(container_client, index_name, snapshot):
+    blob_client = container_client.get_blob_client(get_snapshot_blob_name(index_name))
+    blob_client.upload_blob(bytes(snapshot.buffer), overwrite=True)
+
+
+async def bulk_load_snapshot(snapshot, search_client, config, timings):
+    """Upload every workflow in ``snapshot`` through ``AsyncBatchUploader``; returns pipeline-style stats.
+
+    The next export is decompressed in a worker thread while the current one
+    uploads, so the uploader is never waiting on decoding.
+    """
+    batch_uploader = AsyncBatchUploader(
+        search_client,
+        max_batch_documents=config["batch_size"],
+        max_batch_bytes=config["batch_bytes"],
+        max_in_flight=config["upload_concurrency"],
+        max_retries=config["upload_max_retries"],
+        timings=timings
+    )
+    result = {"documents_by_blob": {}, "workflows_by_blob": {}, "document_hashes": {}}
+    wall_start = time.perf_counter()
+
+    def decode(number):
+        start = time.perf_counter()
+        table = snapshot.table(number)
+        documents = list(table.documents())
+        timings.add("decode", time.perf_counter() - start)
+        return table, documents
+
+    count = len(snapshot.exports)
+    pending = asyncio.ensure_future(asyncio.to_thread(decode, 0)) if count else None
+    try:
+        for number in range(count):
+            table, documents = await pending
+            pending = asyncio.ensure_future(asyncio.to_thread(decode, number + 1)) if number + 1 < count else None
+            result["workflows_by_blob"][table.xml_file] = table
+            result["documents_by_blob"][table.xml_file] = [document["id"] for document in documents]
+            for document in documents:
+                result["document_hashes"][document["id"]] = document_hash(document)
+                await batch_uploader.add(document)
+    finally:
+        if pending is not None:
+            # A decode already running in its thread cannot be cancelled; let it finish
+            # so the caller does not close the mapped snapshot under it
+            try:
+                await pending
+            except Exception:
+                pass
+        totals = await batch_uploader.close()
+
+    logging.info(f"Bulk loaded {totals['succeeded']} of {len(snapshot)} workflows from {count} exports")
+    result.update({
+        "exports": count,
+        "workflows_extracted": len(snapshot),
+        "workflows_uploaded": totals["succeeded"],
+        "workflows_failed": totals["failed"],
+        "failed_keys": totals["failed_keys"],
+        "upload_batches": totals["batches"],
+        "upload_retries": totals["retries"],
+        "wall_seconds": round(time.perf_counter() - wall_start, 3)
+    })
+    return result
@@ -0,0 +1,202 @@
+"""
+Shared Azure SDK clients for all HTTP routes.
+
+Clients are created lazily on first use and then reused for the lifetime of
+the worker process. They all ride on one ``requests`` session whose connection
+pools are sized for the ingestion pipeline's concurrency, so warm invocations
+skip client construction and TLS handshakes. A cached client is rebuilt when
+the settings it was created from change, and ``invalidate_clients`` drops
+everything explicitly.
+
+The ``get_async_*`` variants return ``aio`` clients for the async routes.
+Those share one ``aiohttp`` session per event loop, since aiohttp sessions
+cannot be used across loops.
+
+The SDKs and HTTP stacks are imported by the first getter that needs them,
+not when this module is loaded, so routes that never touch a service (health,
+metrics, answers from the caches) do not pay for importing it on cold start.
+"""
+
+import os
+import asyncio
+import threading
+
+DEFAULT_INDEX_NAME = "informatica-workflows"
+DEFAULT_CONTAINER_NAME = "xml-metadata"
+
+_lock = threading.Lock()
+_session = None
+_async_sessions = {}
+_clients = {}
+
+
+def get_http_session():
+    """Process-wide ``requests`` session with tuned connection pools."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=int(os.getenv("HTTP_POOL_CONNECTIONS", 10)),
+                    pool_maxsize=int(os.getenv("HTTP_POOL_MAXSIZE", 32))
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _transport():
+    from azure.core.pipeline.transport import RequestsTransport
+    # The session outlives any one client, so clients must not close it
+    return RequestsTransport(session=get_http_session(), session_owner=False)
+
+
+def _async_transport():
+    """aiohttp transport sharing the running loop's session."""
+    import aiohttp
+    from azure.core.pipeline.transport import AioHttpTransport
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=int(os.getenv("HTTP_POOL_MAXSIZE", 32)) * int(os.getenv("HTTP_POOL_CONNECTIONS", 10)),
+            limit_per_host=int(os.getenv("HTTP_POOL_MAXSIZE", 32))
+        )
+        session = aiohttp.ClientSession(connector=connector)
+        _async_sessions[loop] = session
+    return AioHttpTransport(session=session, session_owner=False)
+
+
+def _cached(name, settings, factory):
+    """Return the cached client ``name``, rebuilding it if ``settings`` changed."""
+    entry = _clients.get(name)
+    if entry is not None and entry[0] == settings:
+        return entry[1]
+    with _lock:
+        entry = _clients.get(name)
+        if entry is None or entry[0] != settings:
+            entry = (settings, factory())
+            _clients[name] = entry
+        return entry[1]
+
+
+def get_search_client(index_name=None):
+    """Shared ``SearchClient`` for ``index_name`` (default: AZURE_SEARCH_INDEX_NAME)."""
+    endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
+    api_key = os.getenv("AZURE_SEARCH_API_KEY")
+    index_name = index_name or os.getenv("AZURE_SEARCH_INDEX_NAME")
+    if not (endpoint and api_key and index_name):
+        raise ValueError("Missing Azure Search environment variables.")
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents import SearchClient
+    return _cached(
+        ("search", index_name),
+        (endpoint, api_key),
+        lambda: SearchClient(
+            endpoint=endpoint,
+            index_name=index_name,
+            credential=AzureKeyCredential(api_key),
+            transport=_transport()
+        )
+    )
+
+
+def get_search_index_client():
+    """Shared ``SearchIndexClient`` for index management routes."""
+    endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
+    api_key = os.getenv("AZURE_SEARCH_API_KEY")
+    if not (endpoint and api_key):
+        raise ValueError("Azure Search credentials not configured")
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents.indexes import SearchIndexClient
+    return _cached(
+        ("search-index",),
+        (endpoint, api_key),
+        lambda: SearchIndexClient(
+            endpoint=endpoint,
+            credential=AzureKeyCredential(api_key),
+            transport=_transport()
+        )
+    )
+
+
+def get_blob_service_client():
+    """Shared ``BlobServiceClient`` for AZURE_STORAGE_CONNECTION_STRING."""
+    connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+    if not connection_string:
+        raise ValueError("AZURE_STORAGE_CONNECTION_STRING not configured")
+    from azure.storage.blob import BlobServiceClient
+    return _cached(
+        ("blob",),
+        (connection_string,),
+        lambda: BlobServiceClient.from_connection_string(connection_string, transport=_transport())
+    )
+
+
+def get_container_client(container_name=None):
+    """Shared ``ContainerClient`` for ``container_name`` (default: BLOB_CONTAINER_NAME)."""
+    container_name = container_name or os.getenv("BLOB_CONTAINER_NAME", DEFAULT_CONTAINER_NAME)
+    service_client = get_blob_service_client()
+    return _cached(
+        ("container", container_name),
+        (id(service_client),),
+        lambda: service_client.get_container_client(container_name)
+    )
+
+
+def get_async_search_client(index_name=None, max_retries=None):
+    """Shared ``aio`` ``SearchClient`` for the running event loop.
+
+    ``max_retries`` caps the SDK's own retries (the default policy retries
+    throttled requests several times); each cap gets its own client.
+    """
+    endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
+    api_key = os.getenv("AZURE_SEARCH_API_KEY")
+    index_name = index_name or os.getenv("AZURE_SEARCH_INDEX_NAME")
+    if not (endpoint and api_key and index_name):
+        raise ValueError("Missing Azure Search environment variables.")
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents.aio import SearchClient as AsyncSearchClient
+    loop = asyncio.get_running_loop()
+    options = {} if max_retries is None else {"retry_total": max_retries}
+    return _cached(
+        ("async-search", index_name, max_retries),
+        (endpoint, api_key, id(loop)),
+        lambda: AsyncSearchClient(
+            endpoint=endpoint,
+            index_name=index_name,
+            credential=AzureKeyCredential(api_key),
+            transport=_async_transport(),
+            **options
+        )
+    )
+
+
+def get_async_container_client(container_name=None):
+    """Shared ``aio`` ``ContainerClient`` for the running event loop."""
+    connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+    if not connection_string:
+        raise ValueError("AZURE_STORAGE_CONNECTION_STRING not configured")
+    container_name = container_name or os.getenv("BLOB_CONTAINER_NAME", DEFAULT_CONTAINER_NAME)
+    from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
+    loop = asyncio.get_running_loop()
+    service_client = _cached(
+        ("async-blob",),
+        (connection_string, id(loop)),
+        lambda: AsyncBlobServiceClient.from_connection_string(connection_string, transport=_async_transport())
+    )
+    return _cached(
+        ("async-container", container_name),
+        (id(service_client),),
+        lambda: service_client.get_container_client(container_name)
+    )
+
+
+def invalidate_clients():
+    """Drop all cached clients so the next call rebuilds them from current settings."""
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,55 @@
+"""
+Coalescing of identical in-flight backend calls.
+
+Agents fan out several lookups per turn, and concurrent conversations often
+ask the same question at the same moment. The result cache only helps once
+the first answer is back; until then every caller would send its own query.
+``RequestCoalescer.run`` lets the first caller of a key start the backend
+call and every caller arriving while it is in flight await the same result
+(or exception). The call runs as its own task, so a caller that goes away
+does not cancel it for the others. Set ``COALESCE_REQUESTS=false`` to turn it
+off.
+"""
+
+import os
+import json
+import asyncio
+
+from metrics import metrics
+
+
+class RequestCoalescer:
+    """Shares one in-flight call among concurrent callers with the same key, per event loop."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._pending = {}
+        self._stats = {"calls": 0, "coalesced": 0}
+
+    async def run(self, kind, key, call):
+        """Await ``call()``, or the in-flight call already started for (``kind``, ``key``)."""
+        if not self.enabled:
+            return await call()
+        # Tasks belong to one loop, so keys are scoped to the running loop
+        pending_key = (asyncio.get_running_loop(), kind, key)
+        task = self._pending.get(pending_key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._pending[pending_key] = task
+            task.add_done_callback(lambda _: self._pending.pop(pending_key, None))
+            self._stats["calls"] += 1
+        else:
+            self._stats["coalesced"] += 1
+            metrics.inc("coalesced_requests_total", kind=kind)
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return dict(self._stats, in_flight=len(self._pending), enabled=self.enabled)
+
+
+def coalesce_key(*parts, **options):
+    """Stable key for a call's arguments."""
+    return json.dumps([parts, options], sort_keys=True, default=str)
+
+
+coalescer = RequestCoalescer(enabled=os.getenv("COALESCE_REQUESTS", "true").lower() != "false")
@@ -0,0 +1,54 @@
+"""
+Primary-key fetches for ``get-workflow-details``.
+
+A single id is read with ``get_document``; several ids are fetched in one
+request with a ``search.in`` filter instead of one scored search per id.
+Ids are validated against the characters Azure AI Search allows in document
+keys, so they can be placed in a filter without escaping tricks.
+"""
+
+import re
+
+from azure.core.exceptions import ResourceNotFoundError
+
+MAX_LOOKUP_IDS = 100
+# Document keys may only contain letters, digits, underscore, dash and equal sign
+_DOCUMENT_KEY = re.compile(r"^[A-Za-z0-9_\-=]{1,1024}$")
+
+
+def parse_document_ids(data):
+    """Ids from ``workflow_id`` and/or ``workflow_ids``, de-duplicated in request order."""
+    ids = []
+    if data.get("workflow_id"):
+        ids.append(data["workflow_id"])
+    extra = data.get("workflow_ids") or []
+    if not isinstance(extra, list):
+        raise ValueError("'workflow_ids' must be a list of ids")
+    ids.extend(extra)
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_LOOKUP_IDS:
+        raise ValueError(f"At most {MAX_LOOKUP_IDS} ids can be fetched per request")
+    for doc_id in ids:
+        if not isinstance(doc_id, str) or not _DOCUMENT_KEY.match(doc_id):
+            raise ValueError(f"Invalid workflow id: {doc_id!r}")
+    return ids
+
+
+def id_in_filter(ids):
+    """OData filter matching any of ``ids`` (already validated, so they contain no ``|``)."""
+    return f"search.in(id, '{'|'.join(ids)}', '|')"
+
+
+async def fetch_documents(client, ids):
+    """Fetch documents by key from an ``aio`` ``SearchClient`` in one round trip; returns {id: document}."""
+    if len(ids) == 1:
+        try:
+            return {ids[0]: await client.get_document(key=ids[0])}
+        except (ResourceNotFoundError, KeyError):
+            # KeyError is what the local stand-in raises
+            return {}
+    results = await client.search(search_text="*", filter=id_in_filter(ids), top=len(ids))
+    found = {}
+    async for doc in results:
+        found[doc["id"]] = {key: value for key, value in doc.items() if not key.startswith("@search.")}
+    return found
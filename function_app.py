@@ -1,17 +1,31 @@
 import os
 import json
+import time
+import asyncio
 import logging
-import xml.etree.ElementTree as ET
-from azure.functions import HttpRequest, HttpResponse, FunctionApp
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from azure.storage.blob import BlobServiceClient
-from azure.search.documents.indexes import SearchIndexClient
-from azure.search.documents.indexes.models import SearchIndex, SimpleField, SearchableField
+from azure.functions import HttpRequest, HttpResponse, FunctionApp, TimerRequest, QueueMessage, Out
+from clients import (
+    get_search_client, get_search_index_client, get_container_client,
+    get_async_search_client, get_async_container_client
+)
+from result_cache import result_cache, normalize_query
+from search_paging import PageRequest, table_filter, DEFAULT_SELECT, TABLE_SELECT
+from local_index import local_index_cache, get_local_search_mode
+from batch_uploader import THROTTLED_STATUS_CODES
+from metrics import metrics, instrumented, add_span
+from coalescing import coalescer, coalesce_key
+from admission import admission, admitted, admission_route, Overloaded, overloaded_response
+from parse_cache import parse_cache, listed_digest
+from startup import start_warm_up, warm_up, last_warm_up, get_warmup_mode
+
+# The Azure SDKs, the XML parser and the ingestion pipeline are imported by the
+# routes that use them (see startup.py), so loading the app stays cheap
 
 app = FunctionApp()
+start_warm_up()
 
 @app.route(route="health", methods=["GET"])
+@instrumented("health")
 def health_check(req: HttpRequest) -> HttpResponse:
     """Simple health check endpoint."""
     return HttpResponse(
@@ -23,65 +37,396 @@ def health_check(req: HttpRequest) -> HttpResponse:
         mimetype="application/json"
     )
 
-def get_search_client():
-    endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
-    api_key = os.getenv("AZURE_SEARCH_API_KEY")
-    index_name = os.getenv("AZURE_SEARCH_INDEX_NAME")
-    if not (endpoint and api_key and index_name):
-        raise ValueError("Missing Azure Search environment variables.")
-    return SearchClient(
-        endpoint=endpoint,
-        index_name=index_name,
-        credential=AzureKeyCredential(api_key)
+@app.route(route="warmup", methods=["GET"])
+@instrumented("warmup")
+def warmup(req: HttpRequest) -> HttpResponse:
+    """Import the deferred modules and build the shared clients now; ?status=true only reports the last warm-up."""
+    try:
+        if req.params.get("status", "").lower() == "true":
+            result = last_warm_up()
+        else:
+            result = warm_up(connect=req.params.get("connect", "true").lower() != "false")
+        return HttpResponse(
+            json.dumps({"mode": get_warmup_mode(), "warm_up": result}, indent=2),
+            mimetype="application/json"
+        )
+    except Exception as e:
+        logging.exception("Error in warmup")
+        return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
+
+async def search_documents(search_text, **kwargs):
+    """Run a query on Azure AI Search or the local index; returns (documents, "remote" or "local").
+
+    Identical queries already in flight are joined instead of sent again.
+    """
+    async def remote():
+        results = await _read_search_client().search(search_text=search_text, **kwargs)
+        return [doc async for doc in results]
+    return await coalescer.run(
+        "search",
+        coalesce_key(search_text, **kwargs),
+        lambda: _with_local_fallback(remote, lambda local_index: local_index.search(search_text=search_text, **kwargs))
+    )
+
+async def lookup_documents(ids):
+    """Fetch documents by key in one round trip; returns ({id: document}, "remote" or "local")."""
+    from document_lookup import fetch_documents
+
+    async def remote():
+        return await fetch_documents(_read_search_client(), ids)
+    return await coalescer.run(
+        "lookup",
+        coalesce_key(*ids),
+        lambda: _with_local_fallback(remote, lambda local_index: local_index.get_documents(ids))
     )
 
+def _read_search_client():
+    """Search client for the read routes. Throttling is handled by admission control,
+    so the SDK retries less than it does for ingestion."""
+    return get_async_search_client(max_retries=int(os.getenv("SEARCH_READ_MAX_RETRIES", 1)))
+
+async def _with_local_fallback(remote, local):
+    """Answer with ``remote()`` or ``local(index)`` according to LOCAL_SEARCH_MODE.
+    
+    With LOCAL_SEARCH_MODE=primary the local index answers whenever one has been
+    built. In fallback mode it only answers when the service is throttled,
+    unreachable or not configured, or admission control turned the call away.
+    """
+    mode = get_local_search_mode()
+    if mode == "primary":
+        local_index = await _get_local_index()
+        if local_index is not None:
+            with metrics.timer("search_request_seconds", span="search-local", backend="local"):
+                return local(local_index), "local"
+    try:
+        async with admission.call("search"):
+            with metrics.timer("search_request_seconds", span="search", backend="remote"):
+                return await remote(), "remote"
+    except Exception as e:
+        from azure.core.exceptions import ServiceRequestError
+        unavailable = isinstance(e, (ValueError, ServiceRequestError)) or getattr(e, "status_code", None) in THROTTLED_STATUS_CODES
+        if mode == "off" or not unavailable:
+            raise
+        local_index = await _get_local_index()
+        if local_index is None:
+            raise
+        logging.warning(f"Search service unavailable, answering from local index: {str(e)}")
+        metrics.inc("search_fallbacks_total")
+        with metrics.timer("search_request_seconds", span="search-local", backend="local"):
+            return local(local_index), "local"
+
+async def _get_local_index():
+    container_name = os.getenv("BLOB_CONTAINER_NAME", "xml-metadata")
+    index_name = os.getenv("AZURE_SEARCH_INDEX_NAME", "informatica-workflows")
+    try:
+        return await asyncio.to_thread(local_index_cache.get, get_container_client(container_name), index_name)
+    except Exception as e:
+        logging.error(f"Local search index unavailable: {str(e)}")
+        return None
+
 @app.route(route="search-workflow", methods=["POST"])
-def search_workflow(req: HttpRequest) -> HttpResponse:
+@instrumented("search-workflow")
+@admitted("search-workflow")
+async def search_workflow(req: HttpRequest) -> HttpResponse:
     try:
-        data = req.get_json()
-        workflow_name = data.get("workflow_name")
-        if not workflow_name:
-            return HttpResponse(json.dumps({"error": "Missing 'workflow_name' in request."}), status_code=400)
-        client = get_search_client()
-        results = client.search(search_text=workflow_name)
-        workflows = [doc for doc in results]
-        return HttpResponse(json.dumps({"workflows": workflows}, default=str), mimetype="application/json")
+        return await _search_workflow(req.get_json())
     except Exception as e:
         logging.exception("Error in search-workflow")
         return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
 
+async def _search_workflow(data):
+    workflow_name = data.get("workflow_name")
+    if not workflow_name:
+        return HttpResponse(json.dumps({"error": "Missing 'workflow_name' in request."}), status_code=400)
+    query = normalize_query(workflow_name)
+    try:
+        page = PageRequest.from_body(data, query)
+    except ValueError as e:
+        return HttpResponse(json.dumps({"error": str(e)}), status_code=400)
+    cache_key = page.cache_key(query)
+    cached = result_cache.get("search-workflow", cache_key)
+    if cached is not None:
+        add_span("cache", 0.0, "hit")
+        return HttpResponse(cached, mimetype=page.mimetype)
+    try:
+        workflows, backend = await search_documents(workflow_name, **page.search_kwargs())
+    except Overloaded as e:
+        return _overloaded_answer("search-workflow", e, cache_key, page.mimetype)
+    body = page.render("workflows", workflows)
+    if backend == "remote":
+        result_cache.put("search-workflow", cache_key, body)
+    return HttpResponse(body, mimetype=page.mimetype, headers={"X-Search-Backend": backend})
+
 @app.route(route="debug-table", methods=["POST"])
-def debug_table(req: HttpRequest) -> HttpResponse:
+@instrumented("debug-table")
+@admitted("debug-table")
+async def debug_table(req: HttpRequest) -> HttpResponse:
+    """Workflows that read or write a table: an exact filter on the table fields, or 'match': 'text' for full-text search."""
     try:
-        data = req.get_json()
-        table_name = data.get("table_name")
-        if not table_name:
-            return HttpResponse(json.dumps({"error": "Missing 'table_name' in request."}), status_code=400)
-        client = get_search_client()
-        results = client.search(search_text=table_name, filter="type eq 'table'")
-        tables = [doc for doc in results]
-        return HttpResponse(json.dumps({"tables": tables}, default=str), mimetype="application/json")
+        return await _debug_table(req.get_json())
     except Exception as e:
         logging.exception("Error in debug-table")
         return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
 
+async def _debug_table(data):
+    table_name = data.get("table_name")
+    if not table_name:
+        return HttpResponse(json.dumps({"error": "Missing 'table_name' in request."}), status_code=400)
+    match = str(data.get("match", "exact")).lower()
+    if match not in ("exact", "text"):
+        return HttpResponse(json.dumps({"error": "'match' must be 'exact' or 'text'."}), status_code=400)
+    if match == "exact":
+        # Filters compare case-sensitively, so the name is not normalized
+        search_text = "*"
+        search_filter = table_filter(table_name)
+        query = str(table_name)
+        default_select = TABLE_SELECT
+    else:
+        search_text = table_name
+        search_filter = "type eq 'table'"
+        query = normalize_query(table_name)
+        default_select = DEFAULT_SELECT
+    try:
+        page = PageRequest.from_body(data, query, search_filter, default_select)
+    except ValueError as e:
+        return HttpResponse(json.dumps({"error": str(e)}), status_code=400)
+    cache_key = page.cache_key(query)
+    cached = result_cache.get("debug-table", cache_key, search_filter)
+    if cached is not None:
+        add_span("cache", 0.0, "hit")
+        return HttpResponse(cached, mimetype=page.mimetype)
+    try:
+        tables, backend = await search_documents(search_text, filter=search_filter, **page.search_kwargs())
+    except Overloaded as e:
+        return _overloaded_answer("debug-table", e, cache_key, page.mimetype, search_filter)
+    body = page.render("tables", tables)
+    if backend == "remote":
+        result_cache.put("debug-table", cache_key, body, search_filter)
+    return HttpResponse(body, mimetype=page.mimetype, headers={"X-Search-Backend": backend})
+
 @app.route(route="get-workflow-details", methods=["POST"])
-def get_workflow_details(req: HttpRequest) -> HttpResponse:
+@instrumented("get-workflow-details")
+@admitted("get-workflow-details")
+async def get_workflow_details(req: HttpRequest) -> HttpResponse:
+    """Fetch one workflow by id, or many via 'workflow_ids', with one lookup for all uncached ids."""
     try:
-        data = req.get_json()
-        workflow_id = data.get("workflow_id")
-        if not workflow_id:
-            return HttpResponse(json.dumps({"error": "Missing 'workflow_id' in request."}), status_code=400)
-        client = get_search_client()
-        results = client.search(search_text=workflow_id, filter=f"id eq '{workflow_id}'")
-        details = [doc for doc in results]
-        return HttpResponse(json.dumps({"workflow_details": details}, default=str), mimetype="application/json")
+        return await _get_workflow_details(req.get_json())
     except Exception as e:
         logging.exception("Error in get-workflow-details")
         return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
 
+async def _get_workflow_details(data):
+    from document_lookup import parse_document_ids
+    try:
+        workflow_ids = parse_document_ids(data)
+    except ValueError as e:
+        return HttpResponse(json.dumps({"error": str(e)}), status_code=400)
+    if not workflow_ids:
+        return HttpResponse(json.dumps({"error": "Missing 'workflow_id' in request."}), status_code=400)
+    # Documents are cached per id; keys are case-sensitive, so ids are cached as given
+    cached = {}
+    for workflow_id in workflow_ids:
+        body = result_cache.get("get-workflow-details", workflow_id)
+        if body is not None:
+            cached[workflow_id] = body
+    missing = [workflow_id for workflow_id in workflow_ids if workflow_id not in cached]
+    backend = "cache"
+    if missing:
+        try:
+            found, backend = await lookup_documents(missing)
+        except Overloaded as e:
+            # Expired documents are still a better answer than none, if there is one for every id
+            stale = {
+                workflow_id: result_cache.get_stale("get-workflow-details", workflow_id, max_stale=admission.max_stale)
+                for workflow_id in missing
+            }
+            if None in stale.values():
+                return overloaded_response(e)
+            metrics.inc("admission_stale_answers_total", route="get-workflow-details")
+            cached.update(stale)
+            found, backend = {}, "stale-cache"
+        for workflow_id, document in found.items():
+            cached[workflow_id] = json.dumps(document, default=str)
+            if backend == "remote":
+                result_cache.put("get-workflow-details", workflow_id, cached[workflow_id])
+    
+    details = ",".join(cached[workflow_id] for workflow_id in workflow_ids if workflow_id in cached)
+    not_found = [workflow_id for workflow_id in workflow_ids if workflow_id not in cached]
+    body = f'{{"workflow_details": [{details}], "not_found": {json.dumps(not_found)}}}'
+    return HttpResponse(body, mimetype="application/json", headers={"X-Search-Backend": backend})
+
+def _overloaded_answer(route, error, cache_key, mimetype, search_filter=None):
+    """Answer a query that was not admitted from an expired cache entry, or with 503 and Retry-After."""
+    stale = result_cache.get_stale(route, cache_key, search_filter, max_stale=admission.max_stale)
+    if stale is None:
+        return overloaded_response(error)
+    metrics.inc("admission_stale_answers_total", route=route)
+    return HttpResponse(stale, mimetype=mimetype, headers={"X-Search-Backend": "stale-cache"})
+
+# Read routes a batch may contain, by route name
+BATCH_ROUTES = {
+    "search-workflow": _search_workflow,
+    "debug-table": _debug_table,
+    "get-workflow-details": _get_workflow_details
+}
+
+@app.route(route="batch", methods=["POST"])
+@instrumented("batch")
+@admitted("batch")
+async def batch(req: HttpRequest) -> HttpResponse:
+    """Run several read route queries concurrently in one call.
+
+    Body: {"queries": [{"id": ..., "route": "search-workflow", ...route body}, ...]}.
+    Results come back in request order with each query's status and body;
+    one failing query does not fail the others.
+    """
+    try:
+        data = req.get_json()
+        queries = data.get("queries")
+        if not isinstance(queries, list) or not queries:
+            return HttpResponse(json.dumps({"error": "'queries' must be a non-empty list."}), status_code=400)
+        max_queries = int(os.getenv("BATCH_MAX_QUERIES", "50"))
+        if len(queries) > max_queries:
+            return HttpResponse(json.dumps({"error": f"At most {max_queries} queries per batch."}), status_code=400)
+        for query in queries:
+            if not isinstance(query, dict) or query.get("route") not in BATCH_ROUTES:
+                return HttpResponse(json.dumps({"error": f"Each query needs a 'route' of {', '.join(BATCH_ROUTES)}."}), status_code=400)
+        
+        semaphore = asyncio.Semaphore(max(1, int(os.getenv("BATCH_CONCURRENCY", "16"))))
+        
+        async def run(index, query):
+            route = query["route"]
+            # Batches always answer in JSON so results can be embedded as they are
+            body = {key: value for key, value in query.items() if key not in ("id", "route", "format")}
+            # Each query is admitted under its own route
+            async with semaphore:
+                try:
+                    with admission_route(route):
+                        response = await BATCH_ROUTES[route](body)
+                    status, result = response.status_code, response.get_body().decode()
+                except Exception as e:
+                    logging.exception(f"Error in batch query {index} ({route})")
+                    status, result = 500, json.dumps({"error": str(e)})
+            metrics.inc("batch_queries_total", route=route, status=str(status))
+            query_id = json.dumps(query.get("id", index), default=str)
+            return f'{{"id": {query_id}, "route": {json.dumps(route)}, "status": {status}, "body": {result}}}'
+        
+        results = await asyncio.gather(*(run(index, query) for index, query in enumerate(queries)))
+        return HttpResponse(f'{{"results": [{",".join(results)}]}}', mimetype="application/json")
+    except Exception as e:
+        logging.exception("Error in batch")
+        return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
+
+@app.route(route="lineage", methods=["POST"])
+@instrumented("lineage")
+async def lineage(req: HttpRequest) -> HttpResponse:
+    """Upstream/downstream impact analysis for a table or workflow from the local lineage graph."""
+    from lineage_graph import lineage_cache
+    try:
+        start = time.perf_counter()
+        try:
+            data = req.get_json()
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return HttpResponse(json.dumps({"error": "Request body must be a JSON object."}), status_code=400)
+        table_name = data.get("table_name")
+        workflow = data.get("workflow_id") or data.get("workflow_name")
+        if not (table_name or workflow):
+            return HttpResponse(json.dumps({"error": "Missing 'table_name' or 'workflow_id' in request."}), status_code=400)
+        direction = data.get("direction", "both")
+        if direction not in ("upstream", "downstream", "both"):
+            return HttpResponse(json.dumps({"error": "'direction' must be 'upstream', 'downstream' or 'both'."}), status_code=400)
+        try:
+            limit = int(data.get("limit", 500))
+        except (TypeError, ValueError):
+            limit = 0
+        if limit < 1:
+            return HttpResponse(json.dumps({"error": "'limit' must be a positive integer."}), status_code=400)
+        
+        container_name = os.getenv("BLOB_CONTAINER_NAME", "xml-metadata")
+        index_name = os.getenv("AZURE_SEARCH_INDEX_NAME", "informatica-workflows")
+        graph = await asyncio.to_thread(lineage_cache.get, get_container_client(container_name), index_name)
+        if graph is None:
+            return HttpResponse(json.dumps({"error": "Lineage graph not built yet; run process-xml first"}), status_code=404)
+        
+        nodes = [graph.find_table(table_name)] if table_name else graph.find_workflows(workflow)
+        nodes = [node for node in nodes if node is not None]
+        if not nodes:
+            return HttpResponse(json.dumps({"error": f"'{table_name or workflow}' not found in lineage graph"}), status_code=404)
+        
+        matches = []
+        for node in nodes:
+            match = {
+                "node": graph.describe(node),
+                "direct_upstream": graph.summarize(graph.predecessors(node), limit),
+                "direct_downstream": graph.summarize(graph.successors(node), limit)
+            }
+            if direction in ("upstream", "both"):
+                match["upstream"] = graph.summarize(graph.upstream(node), limit)
+            if direction in ("downstream", "both"):
+                match["downstream"] = graph.summarize(graph.downstream(node), limit)
+            matches.append(match)
+        
+        result = {
+            "matches": matches,
+            "graph": {"nodes": graph.node_count, "edges": graph.edge_count},
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
+        return HttpResponse(json.dumps(result), mimetype="application/json")
+    except Exception as e:
+        logging.exception("Error in lineage")
+        return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
+
+@app.route(route="metrics", methods=["GET"])
+def metrics_endpoint(req: HttpRequest) -> HttpResponse:
+    """Latency histograms, counters and cache gauges of this worker in Prometheus text format."""
+    try:
+        return HttpResponse(metrics.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+    except Exception as e:
+        logging.exception("Error in metrics")
+        return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
+
+def _cache_gauges():
+    """Result and parse cache statistics, read at scrape time: lookup counters and occupancy gauges."""
+    results = result_cache.stats()
+    parses = parse_cache.stats()
+    return {
+        "result_cache_entries": results["entries"],
+        "result_cache_bytes": results["bytes"],
+        "result_cache_lookups_total": {
+            (("route", route), ("outcome", outcome)): count
+            for route, counts in results["routes"].items() for outcome, count in counts.items()
+        },
+        "parse_cache_lookups_total": {(("outcome", "hits"),): parses["hits"], (("outcome", "misses"),): parses["misses"]},
+        "parse_cache_bytes": parses["bytes"] or 0
+    }
+
+metrics.add_collector(_cache_gauges)
+
+def _admission_gauges():
+    """Concurrency limit and in-flight calls per backend as scrape-time gauges."""
+    backends = admission.stats()["backends"]
+    return {
+        "admission_concurrency_limit": {(("backend", name),): limit["limit"] for name, limit in backends.items()},
+        "admission_in_flight": {(("backend", name),): limit["in_flight"] for name, limit in backends.items()}
+    }
+
+metrics.add_collector(_admission_gauges)
+
+@app.route(route="cache-stats", methods=["GET"])
+@instrumented("cache-stats")
+def cache_stats(req: HttpRequest) -> HttpResponse:
+    """Report hit/miss counters and occupancy of the read route result cache, request coalescing counts and admission control state."""
+    return HttpResponse(
+        json.dumps(dict(result_cache.stats(), coalescing=coalescer.stats(), admission=admission.stats()), indent=2),
+        mimetype="application/json"
+    )
+
 @app.route(route="test-blob", methods=["GET"])
-def test_blob_storage(req: HttpRequest) -> HttpResponse:
+@instrumented("test-blob")
+@admitted("test-blob")
+async def test_blob_storage(req: HttpRequest) -> HttpResponse:
     """Test blob storage connection and list XML files."""
     try:
         # Get blob storage configuration
@@ -91,12 +436,11 @@ def test_blob_storage(req: HttpRequest) -> HttpResponse:
         if not connection_string:
             return HttpResponse(json.dumps({"error": "AZURE_STORAGE_CONNECTION_STRING not configured"}), status_code=500)
         
-        # Create blob service client
-        blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-        container_client = blob_service_client.get_container_client(container_name)
+        # Get shared container client
+        container_client = get_async_container_client(container_name)
         
         # List blobs
-        blobs = list(container_client.list_blobs())
+        blobs = [blob async for blob in container_client.list_blobs()]
         
         result = {
             "container_name": container_name,
@@ -124,6 +468,7 @@ def test_blob_storage(req: HttpRequest) -> HttpResponse:
         return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
 
 @app.route(route="create-index", methods=["POST"])
+@instrumented("create-index")
 def create_search_index(req: HttpRequest) -> HttpResponse:
     """Create Azure AI Search index for workflow metadata."""
     try:
@@ -135,31 +480,12 @@ def create_search_index(req: HttpRequest) -> HttpResponse:
         if not search_endpoint or not search_key:
             return HttpResponse(json.dumps({"error": "Azure Search credentials not configured"}), status_code=500)
         
-        # Create search index client
-        client = SearchIndexClient(
-            endpoint=search_endpoint,
-            credential=AzureKeyCredential(search_key)
-        )
-        
-        # Define the index schema
-        index = SearchIndex(
-            name=index_name,
-            fields=[
-                SimpleField(name="id", type="Edm.String", key=True),
-                SearchableField(name="workflow_name", type="Edm.String", filterable=True, sortable=True),
-                SearchableField(name="source_tables", type="Collection(Edm.String)"),
-                SearchableField(name="target_tables", type="Collection(Edm.String)"),
-                SearchableField(name="transformations", type="Collection(Edm.String)"),
-                SearchableField(name="mapping_name", type="Edm.String", filterable=True),
-                SearchableField(name="session_name", type="Edm.String", filterable=True),
-                SearchableField(name="xml_file", type="Edm.String", filterable=True),
-                SearchableField(name="full_content", type="Edm.String", searchable=True),
-                SearchableField(name="metadata", type="Edm.String")
-            ]
-        )
+        # Get shared search index client
+        from index_versions import workflow_index
+        client = get_search_index_client()
         
         # Create the index
-        client.create_index(index)
+        client.create_index(workflow_index(index_name))
         
         result = {
             "status": "success",
@@ -175,8 +501,13 @@ def create_search_index(req: HttpRequest) -> HttpResponse:
         return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
 
 @app.route(route="process-xml", methods=["POST"])
-def process_xml_files(req: HttpRequest) -> HttpResponse:
+@instrumented("process-xml")
+async def process_xml_files(req: HttpRequest) -> HttpResponse:
     """Process XML files from blob storage and upload to Azure AI Search."""
+    from ingestion import get_pipeline_config, run_ingestion_pipeline, run_ingestion_pipeline_async, StageTimings
+    from index_manifest import load_manifest, diff_manifest, known_document_hashes
+    from ingestion_jobs import finalize_ingestion
+    from blob_prefilter import load_prefilter
     try:
         # Get configuration
         blob_connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
@@ -188,68 +519,118 @@ def process_xml_files(req: HttpRequest) -> HttpResponse:
         if not all([blob_connection_string, search_endpoint, search_key]):
             return HttpResponse(json.dumps({"error": "Missing required configuration"}), status_code=500)
         
-        # Get blob service client
-        blob_service_client = BlobServiceClient.from_connection_string(blob_connection_string)
-        container_client = blob_service_client.get_container_client(container_name)
+        # Get shared blob and search clients
+        container_client = get_container_client(container_name)
+        search_client = get_search_client(index_name)
         
-        # Get search client
-        search_client = SearchClient(
-            endpoint=search_endpoint,
-            index_name=index_name,
-            credential=AzureKeyCredential(search_key)
-        )
+        # Optional per-request overrides for worker counts
+        try:
+            overrides = req.get_json()
+        except ValueError:
+            overrides = None
+        if not isinstance(overrides, dict):
+            overrides = {}
+        try:
+            config = get_pipeline_config(overrides)
+        except (TypeError, ValueError) as e:
+            return HttpResponse(json.dumps({"error": f"Invalid pipeline settings: {str(e)}"}), status_code=400)
+        incremental = bool(overrides.get("incremental", False))
+        use_parse_cache = parse_cache.enabled and overrides.get("parse_cache", True) is not False
+        engine = overrides.get("engine", "async")
+        if engine not in ("async", "threads"):
+            return HttpResponse(json.dumps({"error": "'engine' must be 'async' or 'threads'."}), status_code=400)
+        timings = StageTimings()
         
         # List XML files
-        blobs = list(container_client.list_blobs())
+        start = time.perf_counter()
+        blobs = await asyncio.to_thread(lambda: list(container_client.list_blobs()))
         xml_files = [blob for blob in blobs if blob.name.lower().endswith('.xml')]
+        timings.add("list", time.perf_counter() - start)
         
         if not xml_files:
             return HttpResponse(json.dumps({"error": "No XML files found in container"}), status_code=404)
         
-        all_workflows = []
-        processed_files = 0
-        
-        # Process each XML file
-        for blob in xml_files:
-            try:
-                # Download XML content
-                blob_client = container_client.get_blob_client(blob.name)
-                xml_content = blob_client.download_blob().readall().decode('utf-8')
-                
-                # Parse XML and extract workflows
-                workflows = extract_workflows_from_xml(xml_content, blob.name)
-                all_workflows.extend(workflows)
-                processed_files += 1
-                
-                logging.info(f"Processed {blob.name}: {len(workflows)} workflows")
-                
-            except Exception as e:
-                logging.error(f"Error processing {blob.name}: {str(e)}")
-                continue
-        
-        if not all_workflows:
+        # Compare against the manifest so incremental runs only fetch new or changed blobs
+        manifest = await asyncio.to_thread(load_manifest, container_client, index_name)
+        changed, unchanged, removed = diff_manifest(manifest, xml_files)
+        if not incremental:
+            changed, unchanged = xml_files, []
+        
+        # Exports seen before (by content digest) are not parsed again, and documents
+        # whose content hash matches the manifest are not uploaded again
+        blob_names = [blob.name for blob in changed]
+        dedup = {
+            "parse_cache": parse_cache if use_parse_cache else None,
+            "digests": {blob.name: listed_digest(blob) for blob in changed},
+            "known_hashes": known_document_hashes(manifest, changed) if incremental else None
+        }
+        # Exports known or sniffed to hold no workflows are not downloaded at all
+        prefilter = None
+        if config["prefilter"]:
+            prefilter = await asyncio.to_thread(load_prefilter, container_client, changed)
+            dedup["prefilter"] = prefilter
+        
+        # Download, parse and upload through the bounded pipeline; the async engine
+        # overlaps downloads and uploads on the event loop, the threaded one uses pools
+        if engine == "async":
+            stats = await run_ingestion_pipeline_async(
+                get_async_container_client(container_name),
+                blob_names,
+                get_async_search_client(index_name),
+                config=config,
+                timings=timings,
+                **dedup
+            )
+        else:
+            stats = await asyncio.to_thread(
+                lambda: run_ingestion_pipeline(
+                    container_client, blob_names, search_client, config, timings, **dedup
+                )
+            )
+        if prefilter is not None:
+            await asyncio.to_thread(prefilter.save, container_client)
+        
+        if not incremental and not stats["workflows_extracted"]:
             return HttpResponse(json.dumps({"error": "No workflows extracted from XML files"}), status_code=500)
         
-        # Upload to search index in batches
-        batch_size = 10
-        uploaded_count = 0
+        for stage, timing in timings.as_dict().items():
+            add_span(stage, timing["seconds"])
         
-        for i in range(0, len(all_workflows), batch_size):
-            batch = all_workflows[i:i + batch_size]
-            try:
-                result = search_client.upload_documents(batch)
-                successful = sum(1 for r in result if r.succeeded)
-                uploaded_count += successful
-            except Exception as e:
-                logging.error(f"Error uploading batch {i//batch_size + 1}: {str(e)}")
+        # Record what was indexed, drop documents of removed or rewritten exports and
+        # rebuild the lineage graph and local search index
+        finalized = await asyncio.to_thread(
+            finalize_ingestion, container_client, search_client, index_name, manifest, changed, removed,
+            stats, incremental, timings
+        )
         
         result = {
             "status": "success",
             "message": "XML processing completed",
-            "xml_files_processed": processed_files,
-            "workflows_extracted": len(all_workflows),
-            "workflows_uploaded": uploaded_count,
-            "index_name": index_name
+            "mode": "incremental" if incremental else "full",
+            "engine": engine,
+            "xml_files_processed": stats["files_processed"],
+            "xml_files_failed": stats["files_failed"],
+            "xml_files_unchanged": len(unchanged),
+            "xml_files_removed": len(removed),
+            "xml_files_from_parse_cache": stats["files_from_cache"],
+            "xml_files_skipped": stats["files_skipped"],
+            "workflows_extracted": stats["workflows_extracted"],
+            "workflows_unchanged": stats["workflows_unchanged"],
+            "workflows_uploaded": stats["workflows_uploaded"],
+            "workflows_failed": stats["workflows_failed"],
+            "upload_batches": stats["upload_batches"],
+            "upload_retries": stats["upload_retries"],
+            "documents_deleted": finalized["documents_deleted"],
+            "lineage_nodes": finalized["lineage_nodes"],
+            "lineage_edges": finalized["lineage_edges"],
+            "local_index_documents": finalized["local_index_documents"],
+            "snapshot": finalized["snapshot"],
+            "parse_cache": parse_cache.stats() if use_parse_cache else None,
+            "prefilter": prefilter.stats() if prefilter is not None else None,
+            "index_name": index_name,
+            "pipeline": stats["config"],
+            "stage_timings": timings.as_dict(),
+            "wall_seconds": stats["wall_seconds"]
         }
         
         return HttpResponse(json.dumps(result, indent=2), mimetype="application/json")
@@ -258,60 +639,438 @@ def process_xml_files(req: HttpRequest) -> HttpResponse:
         logging.exception("Error in process-xml")
         return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
 
-def extract_workflows_from_xml(xml_content, xml_filename):
-    """Extract workflow information from XML content."""
+def _job_response(job):
+    from ingestion_jobs import job_status
+    status_code = 202 if job["status"] == "running" else 200
+    return HttpResponse(json.dumps(job_status(job), indent=2), status_code=status_code, mimetype="application/json")
+
+async def _run_job_slice(job, container_name, slices):
+    """Run one time-boxed slice of an ingestion job on the shared clients, and queue the next one if work is left."""
+    from ingestion_jobs import run_job_slice
+    index_name = job["index_name"]
+    attempts = sum(shard["attempts"] for shard in job["shards"])
+    job = await run_job_slice(
+        job,
+        get_container_client(container_name),
+        get_async_container_client(container_name),
+        get_search_client(index_name),
+        get_async_search_client(index_name)
+    )
+    if job["status"] == "running":
+        if sum(shard["attempts"] for shard in job["shards"]) > attempts:
+            slices.set(job["job_id"])
+        else:
+            # The budget left no room for a wave; queueing again would spin, the timer retries later
+            logging.warning(f"Job {job['job_id']}: slice started no wave, leaving the job to the timer")
+    return job
+
+# Slices run from this storage queue (AzureWebJobsStorage), never inside an HTTP
+# request, whose response times out long before a slice's budget is spent
+JOB_QUEUE_NAME = "ingest-job-slices"
+
+@app.route(route="ingest-jobs", methods=["POST"])
+@app.queue_output(arg_name="slices", queue_name=JOB_QUEUE_NAME, connection="AzureWebJobsStorage")
+@instrumented("ingest-jobs")
+async def start_ingest_job(req: HttpRequest, slices: Out[str]) -> HttpResponse:
+    """Plan a resumable ingestion job and queue its first slice; answers 202 with the job id."""
+    from ingestion import get_pipeline_config
+    from index_manifest import load_manifest
+    from ingestion_jobs import create_job, save_job
     try:
-        root = ET.fromstring(xml_content)
-        workflows = []
-        
-        # Find all workflow elements
-        for workflow in root.findall('.//WORKFLOW'):
-            workflow_name = workflow.get('NAME', 'Unknown')
-            mapping_name = workflow.get('MAPPINGNAME', 'Unknown')
-            session_name = workflow.get('SESSIONNAME', 'Unknown')
-            
-            # Extract source tables
-            source_tables = []
-            for source in workflow.findall('.//SOURCE'):
-                table_name = source.get('NAME', '')
-                if table_name:
-                    source_tables.append(table_name)
-            
-            # Extract target tables
-            target_tables = []
-            for target in workflow.findall('.//TARGET'):
-                table_name = target.get('NAME', '')
-                if table_name:
-                    target_tables.append(table_name)
-            
-            # Extract transformations
-            transformations = []
-            for transform in workflow.findall('.//TRANSFORMATION'):
-                transform_name = transform.get('NAME', '')
-                transform_type = transform.get('TYPE', '')
-                if transform_name and transform_type:
-                    transformations.append(f"{transform_name} ({transform_type})")
-            
-            # Create workflow document - map to existing index fields
-            workflow_doc = {
-                "id": f"{xml_filename}_{workflow_name}_{mapping_name}".replace(" ", "_").replace(".", "_")[:100],
-                "name": workflow_name[:100] if workflow_name else "Unknown",
-                "type": "workflow",
-                "description": f"Mapping: {mapping_name}, Session: {session_name}, XML: {xml_filename}, Sources: {len(source_tables)}, Targets: {len(target_tables)}, Transformations: {len(transformations)}"
-            }
-            
-            workflows.append(workflow_doc)
+        blob_connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+        container_name = os.getenv("BLOB_CONTAINER_NAME", "xml-metadata")
+        search_endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
+        search_key = os.getenv("AZURE_SEARCH_API_KEY")
+        index_name = os.getenv("AZURE_SEARCH_INDEX_NAME", "informatica-workflows")
+        
+        if not all([blob_connection_string, search_endpoint, search_key]):
+            return HttpResponse(json.dumps({"error": "Missing required configuration"}), status_code=500)
+        
+        try:
+            overrides = req.get_json()
+        except ValueError:
+            overrides = None
+        if not isinstance(overrides, dict):
+            overrides = {}
+        try:
+            config = get_pipeline_config(overrides)
+        except (TypeError, ValueError) as e:
+            return HttpResponse(json.dumps({"error": f"Invalid pipeline settings: {str(e)}"}), status_code=400)
+        # Only settings that apply to every slice are stored with the job
+        options = {key: overrides[key] for key in list(config) + ["parse_cache"] if key in overrides}
+        
+        container_client = get_container_client(container_name)
+        blobs = await asyncio.to_thread(lambda: list(container_client.list_blobs()))
+        xml_files = [blob for blob in blobs if blob.name.lower().endswith('.xml')]
+        if not xml_files:
+            return HttpResponse(json.dumps({"error": "No XML files found in container"}), status_code=404)
+        
+        manifest = await asyncio.to_thread(load_manifest, container_client, index_name)
+        job = create_job(index_name, manifest, xml_files, bool(overrides.get("incremental", False)), options)
+        await asyncio.to_thread(save_job, container_client, job)
+        logging.info(f"Created ingestion job {job['job_id']} with {len(job['shards'])} shards")
+        slices.set(job["job_id"])
+        return _job_response(job)
         
-        return workflows
+    except Exception as e:
+        logging.exception("Error in ingest-jobs")
+        return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
+
+@app.route(route="ingest-jobs/{job_id}", methods=["GET"])
+@instrumented("ingest-jobs/{job_id}")
+async def get_ingest_job(req: HttpRequest) -> HttpResponse:
+    """Progress and throughput of an ingestion job."""
+    from ingestion_jobs import is_job_id, load_job
+    try:
+        job_id = req.route_params.get("job_id")
+        if not is_job_id(job_id):
+            return HttpResponse(json.dumps({"error": "Invalid job id"}), status_code=400)
+        container_client = get_container_client(os.getenv("BLOB_CONTAINER_NAME", "xml-metadata"))
+        job = await asyncio.to_thread(load_job, container_client, job_id)
+        if job is None:
+            return HttpResponse(json.dumps({"error": f"Job '{job_id}' not found"}), status_code=404)
+        return _job_response(job)
         
-    except ET.ParseError as e:
-        logging.error(f"XML parsing error in {xml_filename}: {str(e)}")
-        return []
     except Exception as e:
-        logging.error(f"Error processing {xml_filename}: {str(e)}")
-        return []
+        logging.exception("Error in ingest-jobs status")
+        return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
+
+@app.route(route="ingest-jobs/{job_id}/resume", methods=["POST"])
+@app.queue_output(arg_name="slices", queue_name=JOB_QUEUE_NAME, connection="AzureWebJobsStorage")
+@instrumented("ingest-jobs/{job_id}/resume")
+async def resume_ingest_job(req: HttpRequest, slices: Out[str]) -> HttpResponse:
+    """Queue the next slice of an unfinished ingestion job, e.g. one that gave up on the queue."""
+    from ingestion_jobs import is_job_id, load_job, is_leased
+    try:
+        job_id = req.route_params.get("job_id")
+        if not is_job_id(job_id):
+            return HttpResponse(json.dumps({"error": "Invalid job id"}), status_code=400)
+        container_name = os.getenv("BLOB_CONTAINER_NAME", "xml-metadata")
+        job = await asyncio.to_thread(load_job, get_container_client(container_name), job_id)
+        if job is None:
+            return HttpResponse(json.dumps({"error": f"Job '{job_id}' not found"}), status_code=404)
+        if job["status"] == "running":
+            if is_leased(job):
+                return HttpResponse(json.dumps({"error": "Job is already running"}), status_code=409)
+            slices.set(job_id)
+        return _job_response(job)
+        
+    except Exception as e:
+        logging.exception("Error in ingest-jobs resume")
+        return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
+
+@app.queue_trigger(arg_name="message", queue_name=JOB_QUEUE_NAME, connection="AzureWebJobsStorage")
+@app.queue_output(arg_name="slices", queue_name=JOB_QUEUE_NAME, connection="AzureWebJobsStorage")
+async def run_ingest_job_slice(message: QueueMessage, slices: Out[str]) -> None:
+    """Run the next slice of the queued job and queue another while shards are pending."""
+    from ingestion_jobs import is_job_id, load_job, is_leased
+    try:
+        job_id = message.get_body().decode("utf-8").strip()
+        if not is_job_id(job_id):
+            logging.error(f"Ignoring queued slice of invalid job id '{job_id}'")
+            return
+        container_name = os.getenv("BLOB_CONTAINER_NAME", "xml-metadata")
+        job = await asyncio.to_thread(load_job, get_container_client(container_name), job_id)
+        # A leased job is being run by another slice, which queues the next one itself
+        if job is not None and job["status"] == "running" and not is_leased(job):
+            await _run_job_slice(job, container_name, slices)
+    except Exception:
+        # Not retried from the queue; the timer trigger picks the job up once its lease expires
+        logging.exception("Error running ingestion job slice")
+
+@app.timer_trigger(schedule=os.getenv("INGEST_JOB_SCHEDULE", "0 */5 * * * *"), arg_name="timer", run_on_startup=False)
+@app.queue_output(arg_name="slices", queue_name=JOB_QUEUE_NAME, connection="AzureWebJobsStorage")
+async def resume_ingest_jobs(timer: TimerRequest, slices: Out[str]) -> None:
+    """Continue the oldest unfinished ingestion job that no worker is running, e.g. after a crashed slice."""
+    from ingestion_jobs import list_jobs, is_leased
+    try:
+        container_name = os.getenv("BLOB_CONTAINER_NAME", "xml-metadata")
+        jobs = await asyncio.to_thread(list_jobs, get_container_client(container_name))
+        waiting = sorted(
+            (job for job in jobs if job["status"] == "running" and not is_leased(job)), key=lambda job: job["created"]
+        )
+        if waiting:
+            logging.info(f"Resuming ingestion job {waiting[0]['job_id']}")
+            await _run_job_slice(waiting[0], container_name, slices)
+    except Exception:
+        logging.exception("Error resuming ingestion jobs")
+
+@app.route(route="snapshot", methods=["GET"])
+@instrumented("snapshot")
+async def get_snapshot(req: HttpRequest) -> HttpResponse:
+    """Describe an index's catalog snapshot; ?download=true returns the snapshot file itself."""
+    from catalog_snapshot import get_snapshot_blob_name, CatalogSnapshot
+    try:
+        container_client = get_container_client(os.getenv("BLOB_CONTAINER_NAME", "xml-metadata"))
+        index_name = req.params.get("index_name") or os.getenv("AZURE_SEARCH_INDEX_NAME", "informatica-workflows")
+        blob_client = container_client.get_blob_client(get_snapshot_blob_name(index_name))
+        if not await asyncio.to_thread(blob_client.exists):
+            return HttpResponse(json.dumps({"error": f"No snapshot for '{index_name}'; run process-xml first"}), status_code=404)
+        data = await asyncio.to_thread(lambda: blob_client.download_blob().readall())
+        if req.params.get("download", "").lower() == "true":
+            return HttpResponse(data, mimetype="application/octet-stream", headers={
+                "Content-Disposition": f'attachment; filename="{index_name}.wcs"'
+            })
+        result = CatalogSnapshot(data).describe()
+        result["index_name"] = index_name
+        return HttpResponse(json.dumps(result, indent=2), mimetype="application/json")
+        
+    except Exception as e:
+        logging.exception("Error in snapshot")
+        return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
+
+@app.route(route="bulk-load", methods=["POST"])
+@instrumented("bulk-load")
+async def bulk_load(req: HttpRequest) -> HttpResponse:
+    """Fill an index from a catalog snapshot instead of parsing the XML exports again.
+
+    Body (all optional): 'index_name' to load into, 'source_index' whose
+    snapshot to load, or 'snapshot_blob' for a snapshot uploaded under
+    _snapshots/ in the container, plus the upload settings of process-xml.
+    Both indexes must be the configured one (AZURE_SEARCH_INDEX_NAME) or one
+    of its blue/green versions. The index must exist (see create-index). Its
+    manifest, lineage graph, local index and snapshot are written as if
+    process-xml had filled it, so incremental runs continue from there.
+    """
+    from ingestion import get_pipeline_config, StageTimings
+    from index_manifest import empty_manifest
+    from ingestion_jobs import finalize_ingestion, listed_blob
+    from catalog_snapshot import get_snapshot_blob_name, is_snapshot_blob_name, load_snapshot, bulk_load_snapshot
+    from index_versions import IndexVersions
+    try:
+        container_name = os.getenv("BLOB_CONTAINER_NAME", "xml-metadata")
+        default_index = os.getenv("AZURE_SEARCH_INDEX_NAME", "informatica-workflows")
+        try:
+            data = req.get_json()
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            data = {}
+        index_name = data.get("index_name") or default_index
+        source_index = data.get("source_index") or default_index
+        # Loading replaces the index's manifest, so only indexes this app manages may be named
+        named = {index_name, source_index} - {default_index}
+        if named:
+            known = await asyncio.to_thread(IndexVersions(get_search_index_client(), default_index).versions)
+            unknown = sorted(name for name in named if name not in known)
+            if unknown:
+                return HttpResponse(json.dumps({
+                    "error": f"'{unknown[0]}' is neither '{default_index}' nor one of its index versions"
+                }), status_code=400)
+        blob_name = data.get("snapshot_blob") or get_snapshot_blob_name(source_index)
+        if not is_snapshot_blob_name(blob_name):
+            return HttpResponse(json.dumps({"error": "'snapshot_blob' must name a .wcs blob under _snapshots/"}), status_code=400)
+        # Start wide; the uploader halves its concurrency when the service throttles
+        if data.get("upload_concurrency") is None:
+            data["upload_concurrency"] = int(os.getenv("BULK_LOAD_UPLOAD_CONCURRENCY", 16))
+        try:
+            config = get_pipeline_config(data)
+        except (TypeError, ValueError) as e:
+            return HttpResponse(json.dumps({"error": f"Invalid upload settings: {str(e)}"}), status_code=400)
+        
+        container_client = get_container_client(container_name)
+        timings = StageTimings()
+        start = time.perf_counter()
+        snapshot = await asyncio.to_thread(load_snapshot, container_client, blob_name)
+        if snapshot is None:
+            return HttpResponse(json.dumps({"error": f"Snapshot '{blob_name}' not found"}), status_code=404)
+        timings.add("download", time.perf_counter() - start)
+        
+        try:
+            stats = await bulk_load_snapshot(snapshot, get_async_search_client(index_name), config, timings)
+            # Exports without a fingerprint did not fully index when the snapshot was taken;
+            # leaving them out of the manifest makes the next incremental run re-parse them
+            changed = [
+                listed_blob(export["xml_file"], export["fingerprint"])
+                for export in snapshot.exports if export["fingerprint"]
+            ]
+            finalized = await asyncio.to_thread(
+                finalize_ingestion, container_client, get_search_client(index_name), index_name,
+                empty_manifest(index_name), changed, [], stats, False, timings, snapshot
+            )
+        finally:
+            snapshot.close()
+        
+        for stage, timing in timings.as_dict().items():
+            add_span(stage, timing["seconds"])
+        
+        result = {
+            "status": "success" if not stats["workflows_failed"] else "completed_with_errors",
+            "index_name": index_name,
+            "snapshot_blob": blob_name,
+            "exports": stats["exports"],
+            "workflows_loaded": stats["workflows_uploaded"],
+            "workflows_failed": stats["workflows_failed"],
+            "upload_batches": stats["upload_batches"],
+            "upload_retries": stats["upload_retries"],
+            "workflows_per_second": round(stats["workflows_uploaded"] / stats["wall_seconds"], 1) if stats["wall_seconds"] else None,
+            "lineage_nodes": finalized["lineage_nodes"],
+            "lineage_edges": finalized["lineage_edges"],
+            "local_index_documents": finalized["local_index_documents"],
+            "upload": {key: config[key] for key in ("batch_size", "batch_bytes", "upload_concurrency", "upload_max_retries")},
+            "stage_timings": timings.as_dict(),
+            "wall_seconds": stats["wall_seconds"]
+        }
+        return HttpResponse(json.dumps(result, indent=2), mimetype="application/json")
+        
+    except Exception as e:
+        logging.exception("Error in bulk-load")
+        return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
+
+@app.route(route="rebuild-index", methods=["POST"])
+@instrumented("rebuild-index")
+async def rebuild_index(req: HttpRequest) -> HttpResponse:
+    """Blue/green rebuild: fill a new index version, validate it and switch the alias to it.
+
+    Body (all optional): 'source' ('xml', the default, or 'snapshot' for the
+    alias's catalog snapshot), 'force' to switch despite failed validation,
+    'replace_index' to replace a regular index that has the alias name, the
+    rebuild settings ('keep_versions', 'max_shrink', 'count_timeout') and the
+    pipeline settings of process-xml.
+    """
+    from ingestion import get_pipeline_config, run_ingestion_pipeline_async, StageTimings
+    from index_manifest import empty_manifest
+    from ingestion_jobs import finalize_ingestion, listed_blob
+    from catalog_snapshot import get_snapshot_blob_name, load_snapshot, bulk_load_snapshot
+    from index_versions import (
+        IndexVersions, AliasesUnavailable, get_rebuild_settings, blue_green_rebuild, RebuildRejected, delete_artifacts
+    )
+    from blob_prefilter import load_prefilter
+    try:
+        container_name = os.getenv("BLOB_CONTAINER_NAME", "xml-metadata")
+        alias = os.getenv("AZURE_SEARCH_INDEX_NAME", "informatica-workflows")
+        try:
+            data = req.get_json()
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            data = {}
+        source = data.get("source", "xml")
+        if source not in ("xml", "snapshot"):
+            return HttpResponse(json.dumps({"error": "'source' must be 'xml' or 'snapshot'."}), status_code=400)
+        try:
+            config = get_pipeline_config(data)
+            settings = get_rebuild_settings(data)
+        except (TypeError, ValueError) as e:
+            return HttpResponse(json.dumps({"error": f"Invalid rebuild settings: {str(e)}"}), status_code=400)
+        
+        container_client = get_container_client(container_name)
+        timings = StageTimings()
+        
+        async def fill(version):
+            if source == "snapshot":
+                snapshot = await asyncio.to_thread(load_snapshot, container_client, get_snapshot_blob_name(alias))
+                if snapshot is None:
+                    raise LookupError(f"No snapshot for '{alias}'; rebuild from 'xml' first")
+                try:
+                    stats = await bulk_load_snapshot(snapshot, get_async_search_client(version), config, timings)
+                    changed = [
+                        listed_blob(export["xml_file"], export["fingerprint"])
+                        for export in snapshot.exports if export["fingerprint"]
+                    ]
+                    await asyncio.to_thread(
+                        finalize_ingestion, container_client, get_search_client(version), version,
+                        empty_manifest(version), changed, [], stats, False, timings, snapshot
+                    )
+                finally:
+                    snapshot.close()
+                stats["files_failed"] = 0
+            else:
+                blobs = await asyncio.to_thread(lambda: list(container_client.list_blobs()))
+                changed = [blob for blob in blobs if blob.name.lower().endswith('.xml')]
+                prefilter = None
+                if config["prefilter"]:
+                    prefilter = await asyncio.to_thread(load_prefilter, container_client, changed)
+                stats = await run_ingestion_pipeline_async(
+                    get_async_container_client(container_name),
+                    [blob.name for blob in changed],
+                    get_async_search_client(version),
+                    config=config,
+                    timings=timings,
+                    parse_cache=parse_cache if parse_cache.enabled else None,
+                    digests={blob.name: listed_digest(blob) for blob in changed},
+                    prefilter=prefilter
+                )
+                if prefilter is not None:
+                    await asyncio.to_thread(prefilter.save, container_client)
+                await asyncio.to_thread(
+                    finalize_ingestion, container_client, get_search_client(version), version,
+                    empty_manifest(version), changed, [], stats, False, timings
+                )
+            uploaded = {key for keys in stats["documents_by_blob"].values() for key in keys} - stats["failed_keys"]
+            return {"documents": len(uploaded), "failed_documents": stats["workflows_failed"], "failed_files": stats["files_failed"]}
+        
+        versions = IndexVersions(get_search_index_client(), alias)
+        try:
+            versions.check_aliases()
+            report = await blue_green_rebuild(
+                versions, fill, get_search_client, settings,
+                force=bool(data.get("force", False)),
+                replace_index=bool(data.get("replace_index", False)),
+                on_activate=lambda version: _publish_version(container_client, version, alias),
+                on_drop=lambda version: delete_artifacts(container_client, version)
+            )
+        except AliasesUnavailable as e:
+            return HttpResponse(json.dumps({"error": str(e)}), status_code=501)
+        except RebuildRejected as e:
+            return HttpResponse(json.dumps(dict(e.report, status="rejected"), indent=2), status_code=409, mimetype="application/json")
+        except ValueError as e:
+            return HttpResponse(json.dumps({"error": str(e)}), status_code=409)
+        except LookupError as e:
+            return HttpResponse(json.dumps({"error": str(e)}), status_code=404)
+        
+        for stage, timing in timings.as_dict().items():
+            add_span(stage, timing["seconds"])
+        report.update({"status": "success", "source": source, "stage_timings": timings.as_dict()})
+        return HttpResponse(json.dumps(report, indent=2), mimetype="application/json")
+        
+    except Exception as e:
+        logging.exception("Error in rebuild-index")
+        return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
+
+@app.route(route="index-versions", methods=["GET", "POST"])
+@instrumented("index-versions")
+async def list_index_versions(req: HttpRequest) -> HttpResponse:
+    """List the index versions behind the alias; POST {"version": ...} points the alias back at an older one."""
+    from index_versions import IndexVersions, AliasesUnavailable
+    try:
+        alias = os.getenv("AZURE_SEARCH_INDEX_NAME", "informatica-workflows")
+        versions = IndexVersions(get_search_index_client(), alias)
+        try:
+            versions.check_aliases()
+        except AliasesUnavailable as e:
+            return HttpResponse(json.dumps({"error": str(e)}), status_code=501)
+        if req.method == "POST":
+            version = (req.get_json() or {}).get("version")
+            if version not in await asyncio.to_thread(versions.versions):
+                return HttpResponse(json.dumps({"error": f"'{version}' is not a version of '{alias}'"}), status_code=400)
+            container_client = get_container_client(os.getenv("BLOB_CONTAINER_NAME", "xml-metadata"))
+            await asyncio.to_thread(versions.activate, version)
+            await asyncio.to_thread(_publish_version, container_client, version, alias)
+        
+        active = await asyncio.to_thread(versions.active)
+        listed = []
+        for name in await asyncio.to_thread(versions.versions):
+            count = await asyncio.to_thread(get_search_client(name).get_document_count)
+            listed.append({"name": name, "documents": count, "active": name == active})
+        return HttpResponse(json.dumps({"alias": alias, "active": active, "versions": listed}, indent=2), mimetype="application/json")
+        
+    except Exception as e:
+        logging.exception("Error in index-versions")
+        return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
+
+def _publish_version(container_client, version, alias):
+    """After the alias moved to ``version``: give the alias that version's blobs and drop stale cached state."""
+    from index_versions import publish_artifacts
+    from lineage_graph import lineage_cache, load_lineage_graph
+    publish_artifacts(container_client, version, alias)
+    lineage_cache.put(alias, load_lineage_graph(container_client, alias)[0])
+    local_index_cache.get(container_client, alias, True)
+    result_cache.invalidate()
 
 @app.route(route="debug-upload", methods=["POST"])
+@instrumented("debug-upload")
+@admitted("debug-upload")
 def debug_upload_issues(req: HttpRequest) -> HttpResponse:
     """Debug upload issues by testing with a single workflow document."""
     try:
@@ -325,16 +1084,9 @@ def debug_upload_issues(req: HttpRequest) -> HttpResponse:
         if not all([blob_connection_string, search_endpoint, search_key]):
             return HttpResponse(json.dumps({"error": "Missing required configuration"}), status_code=500)
         
-        # Get blob service client
-        blob_service_client = BlobServiceClient.from_connection_string(blob_connection_string)
-        container_client = blob_service_client.get_container_client(container_name)
-        
-        # Get search client
-        search_client = SearchClient(
-            endpoint=search_endpoint,
-            index_name=index_name,
-            credential=AzureKeyCredential(search_key)
-        )
+        # Get shared blob and search clients
+        container_client = get_container_client(container_name)
+        search_client = get_search_client(index_name)
         
         # Get the first XML file
         blobs = list(container_client.list_blobs())
@@ -346,18 +1098,15 @@ def debug_upload_issues(req: HttpRequest) -> HttpResponse:
         # Process first XML file
         blob = xml_files[0]
         blob_client = container_client.get_blob_client(blob.name)
-        xml_content = blob_client.download_blob().readall().decode('utf-8')
-        
-        # Extract workflows
-        workflows = extract_workflows_from_xml(xml_content, blob.name)
-        
-        if not workflows:
+
+        # Extract only the first workflow; the rest of the blob is never downloaded
+        from xml_extractor import iter_workflows_from_blob
+        test_workflow = next(iter_workflows_from_blob(blob_client, blob.name), None)
+
+        if not test_workflow:
             return HttpResponse(json.dumps({"error": "No workflows extracted"}), status_code=500)
         
-        # Take first workflow and clean it
-        test_workflow = workflows[0]
-        
-        # Use the workflow document as-is since extract_workflows_from_xml already maps to correct fields
+        # Use the workflow document as-is since the extractor already maps to correct fields
         cleaned_workflow = {
             "id": test_workflow["id"][:100],  # Limit ID length
             "name": test_workflow["name"][:100] if test_workflow["name"] else "Unknown",
@@ -414,6 +1163,8 @@ def debug_upload_issues(req: HttpRequest) -> HttpResponse:
         return HttpResponse(json.dumps({"error": str(e)}), status_code=500)
 
 @app.route(route="check-index", methods=["GET"])
+@instrumented("check-index")
+@admitted("check-index")
 def check_index_schema(req: HttpRequest) -> HttpResponse:
     """Check the schema of the existing Azure AI Search index."""
     try:
@@ -425,11 +1176,8 @@ def check_index_schema(req: HttpRequest) -> HttpResponse:
         if not search_endpoint or not search_key:
             return HttpResponse(json.dumps({"error": "Azure Search credentials not configured"}), status_code=500)
         
-        # Create search index client
-        index_client = SearchIndexClient(
-            endpoint=search_endpoint,
-            credential=AzureKeyCredential(search_key)
-        )
+        # Get shared search index client
+        index_client = get_search_index_client()
         
         # Get the index
         index = index_client.get_index(index_name)
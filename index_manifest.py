@@ -0,0 +1,131 @@
+"""
+Change tracking for incremental re-indexing of XML exports.
+
+A manifest blob is kept in the export container, one per search index. It
+records the ETag, size and last-modified time of every export that has been
+indexed along with the ids and content hashes of the documents it produced,
+so later runs only need to fetch blobs that changed, can skip re-uploading
+documents whose content did not change, and can delete documents of blobs
+that were removed.
+"""
+
+import json
+import logging
+from datetime import datetime, timezone
+
+MANIFEST_VERSION = 1
+MANIFEST_PREFIX = "_manifests/"
+DELETE_BATCH_SIZE = 1000
+
+
+def get_manifest_blob_name(index_name):
+    """Name of the manifest blob that tracks the given index."""
+    return f"{MANIFEST_PREFIX}{index_name}.json"
+
+
+def empty_manifest(index_name):
+    return {"version": MANIFEST_VERSION, "index_name": index_name, "updated": None, "blobs": {}}
+
+
+def load_manifest(container_client, index_name):
+    """Read the manifest for ``index_name``, or an empty one if none exists yet."""
+    blob_client = container_client.get_blob_client(get_manifest_blob_name(index_name))
+    if not blob_client.exists():
+        return empty_manifest(index_name)
+    try:
+        manifest = json.loads(blob_client.download_blob().readall())
+    except ValueError as e:
+        logging.error(f"Ignoring unreadable manifest for {index_name}: {str(e)}")
+        return empty_manifest(index_name)
+    if manifest.get("version") != MANIFEST_VERSION:
+        logging.info(f"Manifest version mismatch for {index_name}, starting from empty manifest")
+        return empty_manifest(index_name)
+    # A manifest copied from an index version to its alias is saved back under the alias
+    manifest["index_name"] = index_name
+    return manifest
+
+
+def save_manifest(container_client, manifest):
+    """Write the manifest back next to the exports it describes."""
+    manifest["updated"] = datetime.now(timezone.utc).isoformat()
+    blob_client = container_client.get_blob_client(get_manifest_blob_name(manifest["index_name"]))
+    blob_client.upload_blob(json.dumps(manifest, separators=(",", ":")).encode("utf-8"), overwrite=True)
+
+
+def blob_fingerprint(blob):
+    """ETag, size and last-modified time of a listed blob."""
+    return {
+        "etag": blob.etag,
+        "size": blob.size,
+        "last_modified": blob.last_modified.isoformat() if blob.last_modified else None
+    }
+
+
+def diff_manifest(manifest, blobs):
+    """Split listed blobs into (changed, unchanged) and return the names of removed blobs."""
+    tracked = manifest["blobs"]
+    changed = []
+    unchanged = []
+    for blob in blobs:
+        entry = tracked.get(blob.name)
+        fingerprint = blob_fingerprint(blob)
+        if entry and all(entry.get(key) == value for key, value in fingerprint.items()):
+            unchanged.append(blob)
+        else:
+            changed.append(blob)
+    listed = {blob.name for blob in blobs}
+    removed = [name for name in tracked if name not in listed]
+    return changed, unchanged, removed
+
+
+def known_document_hashes(manifest, blobs):
+    """{document id: content hash} recorded for the given blobs' documents by earlier runs."""
+    known = {}
+    for blob in blobs:
+        entry = manifest["blobs"].get(blob.name, {})
+        known.update(zip(entry.get("documents", []), entry.get("hashes", [])))
+    return known
+
+
+def delete_documents(search_client, keys):
+    """Delete documents by key in batches and return how many were removed."""
+    keys = list(keys)
+    deleted = 0
+    for i in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = [{"id": key} for key in keys[i:i + DELETE_BATCH_SIZE]]
+        try:
+            result = search_client.delete_documents(documents=batch)
+            deleted += sum(1 for r in result if r.succeeded)
+        except Exception as e:
+            logging.error(f"Error deleting batch {i // DELETE_BATCH_SIZE + 1}: {str(e)}")
+    return deleted
+
+
+def apply_ingestion_result(manifest, changed_blobs, removed, documents_by_blob, failed_keys, document_hashes=None):
+    """Update the manifest after a run and return the document keys that are now stale.
+
+    Blobs whose documents did not all upload are left at their previous entry so
+    the next incremental run picks them up again.
+    """
+    tracked = manifest["blobs"]
+    stale_keys = set()
+
+    for name in removed:
+        stale_keys.update(tracked.pop(name, {}).get("documents", []))
+
+    for blob in changed_blobs:
+        documents = documents_by_blob.get(blob.name)
+        if documents is None or failed_keys.intersection(documents):
+            continue
+        previous = tracked.get(blob.name, {}).get("documents", [])
+        stale_keys.update(set(previous) - set(documents))
+        entry = blob_fingerprint(blob)
+        entry["documents"] = documents
+        if document_hashes is not None:
+            entry["hashes"] = [document_hashes.get(key, "") for key in documents]
+        tracked[blob.name] = entry
+
+    # Never delete a key that this run just uploaded from another blob
+    for documents in documents_by_blob.values():
+        stale_keys.difference_update(documents)
+    return stale_keys
@@ -0,0 +1,310 @@
+"""
+Blue/green rebuilds of the search index behind an alias.
+
+``process-xml`` writes into the index that agents are querying, so a full
+rebuild shows them partial or stale results and competes with their
+queries. In blue/green mode, AZURE_SEARCH_INDEX_NAME names an index alias
+rather than an index. Readers and incremental runs go through the alias,
+while a rebuild:
+
+1. creates the next versioned index, ``<alias>-v<n>``;
+2. fills it at full ingest throughput, from the catalog snapshot or the XML;
+3. waits for its document count to reach what was uploaded, and refuses to
+   switch if uploads failed or the index shrank by more than
+   REBUILD_MAX_SHRINK against the live one (unless forced);
+4. points the alias at the new version in one update, so every query sees
+   either the old or the new index in full;
+5. deletes the versions beyond the newest REBUILD_KEEP_VERSIONS, keeping the
+   previous one around for a rollback.
+
+The index-level blobs written during ingestion (manifest, lineage graph,
+local index, snapshot) are written for the version and copied to the alias
+name when it goes live.
+"""
+
+import os
+import re
+import time
+import asyncio
+import logging
+
+from index_manifest import get_manifest_blob_name, load_manifest, save_manifest
+from lineage_graph import get_lineage_blob_name
+from local_index import get_local_index_blob_name
+from catalog_snapshot import get_snapshot_blob_name
+
+# Blobs kept per index name by ingestion; all but the manifest are copied to the alias as they are
+COPIED_BLOB_NAMES = (get_lineage_blob_name, get_local_index_blob_name, get_snapshot_blob_name)
+ARTIFACT_BLOB_NAMES = (get_manifest_blob_name,) + COPIED_BLOB_NAMES
+
+
+def get_rebuild_settings(overrides=None):
+    """Validation and retention settings from app settings and per-request overrides."""
+    settings = {
+        "keep_versions": int(os.getenv("REBUILD_KEEP_VERSIONS", 2)),
+        "max_shrink": float(os.getenv("REBUILD_MAX_SHRINK", 0.1)),
+        "count_timeout": float(os.getenv("REBUILD_COUNT_TIMEOUT_SECONDS", 120))
+    }
+    for key in settings:
+        if overrides and overrides.get(key) is not None:
+            settings[key] = type(settings[key])(overrides[key])
+    settings["keep_versions"] = max(1, settings["keep_versions"])
+    settings["max_shrink"] = min(max(0.0, settings["max_shrink"]), 1.0)
+    return settings
+
+
+def workflow_index(name):
+    """``SearchIndex`` definition for workflow documents."""
+    from azure.search.documents.indexes.models import SearchIndex, SimpleField, SearchableField
+    return SearchIndex(
+        name=name,
+        fields=[
+            SimpleField(name="id", type="Edm.String", key=True, filterable=True),
+            # Summary fields read by the routes' default projection
+            SearchableField(name="name"),
+            SimpleField(name="type", type="Edm.String", filterable=True),
+            SearchableField(name="description"),
+            # Structured fields written by the extractor; the table collections
+            # are filterable so table lookups are exact filters
+            SearchableField(name="workflow_name", filterable=True, sortable=True),
+            SearchableField(name="source_tables", collection=True, filterable=True, facetable=True),
+            SearchableField(name="target_tables", collection=True, filterable=True, facetable=True),
+            SearchableField(name="transformations", collection=True, filterable=True),
+            SearchableField(name="mapping_name", filterable=True),
+            SearchableField(name="session_name", filterable=True),
+            SearchableField(name="xml_file", filterable=True),
+            SearchableField(name="full_content"),
+            SimpleField(name="metadata", type="Edm.String")
+        ]
+    )
+
+
+def search_alias(name, indexes):
+    from azure.search.documents.indexes.models import SearchAlias
+    return SearchAlias(name=name, indexes=indexes)
+
+
+class AliasesUnavailable(Exception):
+    """The installed ``azure-search-documents`` has no index alias API.
+
+    Aliases are only in its preview releases; the GA releases lack
+    ``SearchAlias`` and ``SearchIndexClient.create_or_update_alias``.
+    """
+
+    def __init__(self, missing):
+        super().__init__(
+            f"Blue/green index versions need index aliases, but this azure-search-documents has no {', '.join(missing)}; "
+            "install a preview release that ships them (pip install --pre azure-search-documents)"
+        )
+        self.missing = missing
+
+
+class IndexVersions:
+    """The ``<alias>-v<n>`` indexes behind one alias.
+
+    ``build_index(name)`` and ``build_alias(name=, indexes=)`` create the model
+    objects passed to ``index_client``; the defaults are the Azure SDK models.
+    """
+
+    def __init__(self, index_client, alias, build_index=workflow_index, build_alias=search_alias):
+        self.index_client = index_client
+        self.alias = alias
+        self.build_index = build_index
+        self.build_alias = build_alias
+        self._pattern = re.compile(rf"^{re.escape(alias)}-v(\d+)$")
+
+    def check_aliases(self):
+        """Raise ``AliasesUnavailable`` unless the client and SDK models support index aliases."""
+        missing = [name for name in ("list_aliases", "create_or_update_alias") if not hasattr(self.index_client, name)]
+        if self.build_alias is search_alias:
+            try:
+                from azure.search.documents.indexes.models import SearchAlias  # noqa: F401
+            except ImportError:
+                missing.append("SearchAlias")
+        if missing:
+            raise AliasesUnavailable(missing)
+
+    def versions(self):
+        """Version index names, oldest first."""
+        numbered = []
+        for name in self.index_client.list_index_names():
+            match = self._pattern.match(name)
+            if match:
+                numbered.append((int(match.group(1)), name))
+        return [name for _, name in sorted(numbered)]
+
+    def active(self):
+        """The index the alias points at, or ``None`` if there is no alias yet."""
+        for alias in self.index_client.list_aliases():
+            if alias.name == self.alias:
+                return alias.indexes[0] if alias.indexes else None
+        return None
+
+    def has_plain_index(self):
+        """Whether a regular index already uses the alias name (a deployment from before blue/green)."""
+        return self.alias in self.index_client.list_index_names()
+
+    def create_next(self):
+        versions = self.versions()
+        number = int(self._pattern.match(versions[-1]).group(1)) + 1 if versions else 1
+        name = f"{self.alias}-v{number}"
+        self.index_client.create_index(self.build_index(name))
+        logging.info(f"Created index version {name}")
+        return name
+
+    def activate(self, version, replace_index=False):
+        """Point the alias at ``version``; ``replace_index`` first deletes a plain index of the same name."""
+        if replace_index and self.has_plain_index():
+            logging.warning(f"Deleting index '{self.alias}' so an alias can take its name")
+            self.index_client.delete_index(self.alias)
+        self.index_client.create_or_update_alias(self.build_alias(name=self.alias, indexes=[version]))
+        logging.info(f"Alias {self.alias} now points at {version}")
+
+    def drop(self, version):
+        self.index_client.delete_index(version)
+
+    def collect_garbage(self, keep):
+        """Delete all but the newest ``keep`` versions, never the active one; returns the deleted names."""
+        active = self.active()
+        versions = self.versions()
+        kept = set(versions[-keep:]) | {active}
+        deleted = []
+        for name in versions:
+            if name in kept:
+                continue
+            try:
+                self.drop(name)
+                deleted.append(name)
+            except Exception as e:
+                logging.error(f"Could not delete old index version {name}: {str(e)}")
+        return deleted
+
+
+def wait_for_document_count(search_client, expected, timeout, interval=2.0):
+    """Poll the index's (eventually consistent) document count until it reaches ``expected``; returns the last count."""
+    deadline = time.monotonic() + timeout
+    while True:
+        count = search_client.get_document_count()
+        if count >= expected or time.monotonic() >= deadline:
+            return count
+        time.sleep(interval)
+
+
+def validation_problems(expected, indexed, failed_documents, failed_files, live, max_shrink):
+    """Reasons not to switch readers to a freshly built version (empty when it may go live)."""
+    problems = []
+    if failed_documents:
+        problems.append(f"{failed_documents} documents failed to upload")
+    if failed_files:
+        problems.append(f"{failed_files} exports could not be processed")
+    if indexed != expected:
+        problems.append(f"index holds {indexed} documents, {expected} were uploaded")
+    if live and indexed < live * (1 - max_shrink):
+        problems.append(f"index would shrink from {live} to {indexed} documents")
+    if not expected:
+        problems.append("no documents were loaded")
+    return problems
+
+
+class RebuildRejected(Exception):
+    """A rebuilt version failed validation; ``report`` says why. The version has been deleted."""
+
+    def __init__(self, report):
+        super().__init__("; ".join(report["problems"]))
+        self.report = report
+
+
+async def blue_green_rebuild(versions, fill, search_client_for, settings, force=False, replace_index=False,
+                             on_activate=None, on_drop=None):
+    """Build, validate and activate the next version; returns a report of what happened.
+
+    ``fill(version)`` is a coroutine function that loads the new index and
+    returns a dict of ``documents`` uploaded, ``failed_documents`` and
+    ``failed_files``. ``search_client_for(name)``
+    returns a sync search client for an index or the alias. ``on_activate``
+    and ``on_drop`` are called with the version that went live or was
+    deleted, e.g. to move the blobs kept per index.
+    """
+    previous = await asyncio.to_thread(versions.active)
+    plain_index = previous is None and await asyncio.to_thread(versions.has_plain_index)
+    if plain_index and not replace_index:
+        raise ValueError(
+            f"A regular index named '{versions.alias}' exists; pass 'replace_index' to delete it when the "
+            "first version goes live"
+        )
+    live = None
+    if previous or plain_index:
+        live = await asyncio.to_thread(search_client_for(versions.alias).get_document_count)
+
+    version = await asyncio.to_thread(versions.create_next)
+    report = {"alias": versions.alias, "version": version, "previous": previous or (versions.alias if plain_index else None)}
+    try:
+        start = time.perf_counter()
+        loaded = await fill(version)
+        report["load_seconds"] = round(time.perf_counter() - start, 3)
+        expected = loaded["documents"]
+        indexed = await asyncio.to_thread(
+            wait_for_document_count, search_client_for(version), expected, settings["count_timeout"]
+        )
+        report.update({
+            "expected_documents": expected,
+            "indexed_documents": indexed,
+            "live_documents": live,
+            "failed_documents": loaded["failed_documents"],
+            "failed_files": loaded["failed_files"]
+        })
+        report["problems"] = validation_problems(
+            expected, indexed, loaded["failed_documents"], loaded["failed_files"], live, settings["max_shrink"]
+        )
+        if report["problems"] and not force:
+            raise RebuildRejected(report)
+    except Exception:
+        await asyncio.to_thread(_drop_quietly, versions, version, on_drop)
+        raise
+
+    await asyncio.to_thread(versions.activate, version, replace_index)
+    report["activated"] = True
+    if on_activate:
+        await asyncio.to_thread(on_activate, version)
+    deleted = await asyncio.to_thread(versions.collect_garbage, settings["keep_versions"])
+    if on_drop:
+        for name in deleted:
+            await asyncio.to_thread(on_drop, name)
+    report["deleted_versions"] = deleted
+    return report
+
+
+def _drop_quietly(versions, version, on_drop):
+    try:
+        versions.drop(version)
+        if on_drop:
+            on_drop(version)
+    except Exception as e:
+        logging.error(f"Could not delete index version {version}: {str(e)}")
+
+
+def publish_artifacts(container_client, version, alias):
+    """Copy the blobs ingestion wrote for ``version`` to the alias name, so readers of the alias use them.
+
+    The manifest names the index it tracks, and incremental runs save it back
+    there, so it is re-saved under the alias rather than copied.
+    """
+    if container_client.get_blob_client(get_manifest_blob_name(version)).exists():
+        manifest = load_manifest(container_client, version)
+        manifest["index_name"] = alias
+        save_manifest(container_client, manifest)
+    for blob_name in COPIED_BLOB_NAMES:
+        source = container_client.get_blob_client(blob_name(version))
+        if source.exists():
+            data = source.download_blob().readall()
+            container_client.get_blob_client(blob_name(alias)).upload_blob(data, overwrite=True)
+
+
+def delete_artifacts(container_client, version):
+    for blob_name in ARTIFACT_BLOB_NAMES:
+        blob_client = container_client.get_blob_client(blob_name(version))
+        try:
+            if blob_client.exists():
+                blob_client.delete_blob()
+        except Exception as e:
+            logging.error(f"Could not delete {blob_name(version)}: {str(e)}")
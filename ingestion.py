@@ -0,0 +1,551 @@
+"""
+Pipelined ingestion of Informatica XML exports into Azure AI Search.
+
+Blobs flow through three bounded stages: a thread pool of downloaders, a
+process pool that does the CPU-bound XML parsing, and an uploader thread that
+feeds ``BatchUploader`` with several size-aware batches in flight. Bounded queues between the stages
+provide backpressure so a slow stage throttles the ones in front of it instead
+of letting downloaded data pile up in memory. Downloads for the process pool
+are written straight into shared memory (see ``parse_pool``), so export bytes
+are never pickled to the parse workers.
+
+``run_ingestion_pipeline_async`` is the event loop engine for ``aio`` clients:
+downloads and uploads are coroutines that overlap on one loop, while parsing
+still runs in the process pool (or a worker thread) off the loop.
+"""
+
+import os
+import json
+import time
+import hashlib
+import contextlib
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from xml_extractor import iter_workflow_buckets_from_chunks, WorkflowPushParser
+from workflow_model import WorkflowTable
+from parse_cache import content_digest
+from blob_prefilter import SKIPPED
+from parse_pool import ParsePool, SharedBuffer, HANDOFFS, parse_blob_bytes
+from metrics import metrics
+from batch_uploader import BatchUploader, AsyncBatchUploader, MAX_BATCH_DOCUMENTS, MAX_BATCH_BYTES
+
+# Documents are handed from parsers to the uploader in chunks of this size
+QUEUE_CHUNK_SIZE = 100
+
+
+def get_pipeline_config(overrides=None):
+    """Resolve pipeline worker counts from app settings and per-request overrides."""
+    cpu_count = os.cpu_count() or 1
+    config = {
+        "download_workers": int(os.getenv("INGEST_DOWNLOAD_WORKERS", 8)),
+        "parse_workers": int(os.getenv("INGEST_PARSE_WORKERS", cpu_count if cpu_count > 1 else 0)),
+        "max_pending_batches": int(os.getenv("INGEST_MAX_PENDING_BATCHES", 50)),
+        "batch_size": int(os.getenv("INGEST_UPLOAD_BATCH_SIZE", MAX_BATCH_DOCUMENTS)),
+        "batch_bytes": int(os.getenv("INGEST_UPLOAD_BATCH_BYTES", MAX_BATCH_BYTES)),
+        "upload_concurrency": int(os.getenv("INGEST_UPLOAD_CONCURRENCY", 4)),
+        "upload_max_retries": int(os.getenv("INGEST_UPLOAD_MAX_RETRIES", 5))
+    }
+    for key in config:
+        if overrides and overrides.get(key) is not None:
+            config[key] = int(overrides[key])
+    config["download_workers"] = max(1, config["download_workers"])
+    config["parse_workers"] = max(0, config["parse_workers"])
+    config["max_pending_batches"] = max(1, config["max_pending_batches"])
+    config["batch_size"] = max(1, min(config["batch_size"], MAX_BATCH_DOCUMENTS))
+    config["batch_bytes"] = max(1, min(config["batch_bytes"], MAX_BATCH_BYTES))
+    config["upload_concurrency"] = max(1, config["upload_concurrency"])
+    config["upload_max_retries"] = max(0, config["upload_max_retries"])
+    config["parse_handoff"] = (overrides or {}).get("parse_handoff") or os.getenv("INGEST_PARSE_HANDOFF", "shared_memory")
+    if config["parse_handoff"] not in HANDOFFS:
+        raise ValueError(f"'parse_handoff' must be one of {', '.join(HANDOFFS)}")
+    prefilter = (overrides or {}).get("prefilter")
+    if prefilter is None:
+        prefilter = os.getenv("INGEST_PREFILTER", "true").lower() != "false"
+    config["prefilter"] = bool(prefilter)
+    return config
+
+
+class StageTimings:
+    """Thread-safe accumulator of busy time per pipeline stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seconds = {}
+        self._calls = {}
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+            self._calls[stage] = self._calls.get(stage, 0) + 1
+        metrics.observe("ingest_stage_seconds", seconds, stage=stage)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                stage: {"seconds": round(seconds, 3), "calls": self._calls[stage]}
+                for stage, seconds in self._seconds.items()
+            }
+
+
+def run_ingestion_pipeline(container_client, blob_names, search_client, config=None, timings=None,
+                           parse_cache=None, digests=None, known_hashes=None, prefilter=None):
+    """Download, parse and upload the given blobs with bounded concurrency per stage.
+
+    With a ``parse_cache``, exports whose content digest (from ``digests`` or
+    computed after download) was parsed before are not parsed again.
+    Documents whose hash matches ``known_hashes`` are not re-uploaded.
+    Exports a ``BlobPrefilter`` classifies as having no workflows are not
+    downloaded and count as parsed with none.
+    """
+    config = config or get_pipeline_config()
+    timings = timings or StageTimings()
+    doc_queue = queue.Queue(maxsize=config["max_pending_batches"])
+    counters = {
+        "files_processed": 0, "files_failed": 0, "files_from_cache": 0, "files_skipped": 0, "workflows_extracted": 0
+    }
+    by_blob = {"documents_by_blob": {}, "workflows_by_blob": {}}
+    counters_lock = threading.Lock()
+    wall_start = time.perf_counter()
+
+    batch_uploader = BatchUploader(
+        search_client,
+        max_batch_documents=config["batch_size"],
+        max_batch_bytes=config["batch_bytes"],
+        max_in_flight=config["upload_concurrency"],
+        max_retries=config["upload_max_retries"],
+        timings=timings
+    )
+    upload_result = {}
+    uploader = threading.Thread(
+        target=_upload_worker, args=(doc_queue, batch_uploader, upload_result, known_hashes or {}), daemon=True
+    )
+    uploader.start()
+
+    parse_pool = ParsePool(config["parse_workers"], config["parse_handoff"]) if config["parse_workers"] else None
+
+    def ingest(blob_name):
+        try:
+            if prefilter is not None and prefilter.classify(container_client.get_blob_client(blob_name), timings) in SKIPPED:
+                _record_skipped(blob_name, counters, by_blob, counters_lock)
+                return
+            if parse_cache is not None:
+                digest = (digests or {}).get(blob_name)
+                table, cached = _ingest_blob_cached(
+                    container_client, blob_name, digest, parse_cache, parse_pool, doc_queue, timings
+                )
+            else:
+                table, cached = _ingest_blob(container_client, blob_name, parse_pool, doc_queue, timings), False
+            if prefilter is not None:
+                prefilter.learn(blob_name, table)
+            logging.info(f"Processed {blob_name}: {len(table)} workflows{' (parse cache)' if cached else ''}")
+            with counters_lock:
+                counters["files_processed"] += 1
+                counters["files_from_cache"] += cached
+                counters["workflows_extracted"] += len(table)
+                _record_blob(by_blob, table)
+        except Exception as e:
+            logging.error(f"Error processing {blob_name}: {str(e)}")
+            with counters_lock:
+                counters["files_failed"] += 1
+
+    try:
+        with ThreadPoolExecutor(max_workers=config["download_workers"]) as downloaders:
+            list(downloaders.map(ingest, blob_names))
+    finally:
+        doc_queue.put(None)
+        uploader.join()
+        if parse_pool:
+            parse_pool.shutdown()
+
+    return _pipeline_result(counters, upload_result, by_blob, timings, wall_start, config)
+
+
+async def run_ingestion_pipeline_async(container_client, blob_names, search_client, config=None, timings=None,
+                                       parse_cache=None, digests=None, known_hashes=None, prefilter=None):
+    """Event loop variant of ``run_ingestion_pipeline`` for ``aio`` blob and search clients."""
+    config = config or get_pipeline_config()
+    timings = timings or StageTimings()
+    doc_queue = asyncio.Queue(maxsize=config["max_pending_batches"])
+    counters = {
+        "files_processed": 0, "files_failed": 0, "files_from_cache": 0, "files_skipped": 0, "workflows_extracted": 0
+    }
+    by_blob = {"documents_by_blob": {}, "workflows_by_blob": {}}
+    wall_start = time.perf_counter()
+
+    batch_uploader = AsyncBatchUploader(
+        search_client,
+        max_batch_documents=config["batch_size"],
+        max_batch_bytes=config["batch_bytes"],
+        max_in_flight=config["upload_concurrency"],
+        max_retries=config["upload_max_retries"],
+        timings=timings
+    )
+    upload_result = {}
+    uploader = asyncio.ensure_future(
+        _upload_worker_async(doc_queue, batch_uploader, upload_result, known_hashes or {})
+    )
+
+    parse_pool = ParsePool(config["parse_workers"], config["parse_handoff"]) if config["parse_workers"] else None
+    pending_names = list(reversed(blob_names))
+
+    async def download_worker():
+        while pending_names:
+            blob_name = pending_names.pop()
+            try:
+                if prefilter is not None:
+                    verdict = await prefilter.classify_async(container_client.get_blob_client(blob_name), timings)
+                    if verdict in SKIPPED:
+                        _record_skipped(blob_name, counters, by_blob)
+                        continue
+                if parse_cache is not None:
+                    digest = (digests or {}).get(blob_name)
+                    table, cached = await _ingest_blob_cached_async(
+                        container_client, blob_name, digest, parse_cache, parse_pool, doc_queue, timings
+                    )
+                else:
+                    table, cached = await _ingest_blob_async(container_client, blob_name, parse_pool, doc_queue, timings), False
+                if prefilter is not None:
+                    prefilter.learn(blob_name, table)
+                logging.info(f"Processed {blob_name}: {len(table)} workflows{' (parse cache)' if cached else ''}")
+                counters["files_processed"] += 1
+                counters["files_from_cache"] += cached
+                counters["workflows_extracted"] += len(table)
+                _record_blob(by_blob, table)
+            except Exception as e:
+                logging.error(f"Error processing {blob_name}: {str(e)}")
+                counters["files_failed"] += 1
+
+    try:
+        await asyncio.gather(*(download_worker() for _ in range(config["download_workers"])))
+    finally:
+        await doc_queue.put(None)
+        await uploader
+        if parse_pool:
+            parse_pool.shutdown()
+
+    return _pipeline_result(counters, upload_result, by_blob, timings, wall_start, config)
+
+
+def _record_blob(by_blob, table):
+    """Keep what later steps need from a parsed blob: its document keys and compact workflow table."""
+    by_blob["documents_by_blob"][table.xml_file] = table.ids()
+    by_blob["workflows_by_blob"][table.xml_file] = table
+
+
+def _record_skipped(blob_name, counters, by_blob, lock=None):
+    """Record an export the prefilter ruled out as parsed, with no workflows."""
+    logging.info(f"Skipped {blob_name}: no workflows (prefilter)")
+    with lock or contextlib.nullcontext():
+        counters["files_processed"] += 1
+        counters["files_skipped"] += 1
+        _record_blob(by_blob, WorkflowTable(blob_name).freeze())
+
+
+def _pipeline_result(counters, upload_result, by_blob, timings, wall_start, config):
+    result = dict(counters)
+    result["workflows_uploaded"] = upload_result.get("succeeded", 0)
+    result["workflows_failed"] = upload_result.get("failed", 0)
+    result["upload_batches"] = upload_result.get("batches", 0)
+    result["upload_retries"] = upload_result.get("retries", 0)
+    result["workflows_unchanged"] = upload_result.get("unchanged", 0)
+    result["document_hashes"] = upload_result.get("document_hashes", {})
+    result.update(by_blob)
+    metrics.inc("ingest_documents_total", counters["workflows_extracted"], outcome="extracted")
+    metrics.inc("ingest_documents_total", result["workflows_unchanged"], outcome="unchanged")
+    result["failed_keys"] = upload_result.get("failed_keys", set())
+    result["stage_timings"] = timings.as_dict()
+    result["wall_seconds"] = round(time.perf_counter() - wall_start, 3)
+    result["config"] = config
+    return result
+
+
+def _ingest_blob(container_client, blob_name, parse_pool, doc_queue, timings):
+    """Download one blob, parse it, hand its documents to the uploader and return its ``WorkflowTable``."""
+    blob_client = container_client.get_blob_client(blob_name)
+
+    if parse_pool is None:
+        # No worker processes: stream chunks straight through the extractor
+        start = time.perf_counter()
+        download_seconds = [0.0]
+        # Time spent outside the parser: queue waits and document building
+        excluded = 0.0
+        table = WorkflowTable(blob_name)
+        enqueued = 0
+        for bucket in iter_workflow_buckets_from_chunks(_timed_chunks(blob_client, download_seconds), blob_name):
+            table.append(bucket)
+            if len(table) - enqueued >= QUEUE_CHUNK_SIZE:
+                excluded += _enqueue_documents(doc_queue, table, enqueued, len(table), timings)
+                enqueued = len(table)
+        if len(table) > enqueued:
+            excluded += _enqueue_documents(doc_queue, table, enqueued, len(table), timings)
+        timings.add("download", download_seconds[0])
+        timings.add("parse", max(0.0, time.perf_counter() - start - download_seconds[0] - excluded))
+        return table.freeze()
+
+    with _download(blob_client, parse_pool, timings) as buffer:
+        table = _parse(buffer, blob_name, parse_pool, timings)
+    _enqueue_table(doc_queue, table, timings)
+    return table
+
+
+def _ingest_blob_cached(container_client, blob_name, digest, parse_cache, parse_pool, doc_queue, timings):
+    """``_ingest_blob`` through the parse cache; returns (table, served from cache)."""
+    table = _cache_lookup(parse_cache, digest, blob_name, timings)
+    cached = table is not None
+    if not cached:
+        with _download(container_client.get_blob_client(blob_name), parse_pool, timings) as buffer:
+            if digest is None:
+                digest = content_digest(buffer.data())
+                table = _cache_lookup(parse_cache, digest, blob_name, timings)
+                cached = table is not None
+            if not cached:
+                table = _parse(buffer, blob_name, parse_pool, timings)
+        if not cached:
+            start = time.perf_counter()
+            parse_cache.put(digest, table)
+            timings.add("cache", time.perf_counter() - start)
+
+    _enqueue_table(doc_queue, table, timings)
+    return table, cached
+
+
+async def _ingest_blob_async(container_client, blob_name, parse_pool, doc_queue, timings):
+    """Coroutine counterpart of ``_ingest_blob`` for ``aio`` clients."""
+    blob_client = container_client.get_blob_client(blob_name)
+
+    if parse_pool is None:
+        # No worker processes: feed chunks to the push parser on a worker thread
+        parser = WorkflowPushParser(blob_name)
+        download_seconds = 0.0
+        parse_seconds = 0.0
+        table = WorkflowTable(blob_name)
+        enqueued = 0
+        start = time.perf_counter()
+        downloader = await blob_client.download_blob()
+        chunks = downloader.chunks().__aiter__()
+        while True:
+            try:
+                chunk = await chunks.__anext__()
+                metrics.inc("ingest_bytes_total", len(chunk))
+            except StopAsyncIteration:
+                chunk = None
+            download_seconds += time.perf_counter() - start
+
+            # A malformed export raises ExpatError, failing the blob in download_worker
+            start = time.perf_counter()
+            if chunk is None:
+                buckets = parser.close()
+            else:
+                buckets = await asyncio.to_thread(parser.feed, chunk)
+            parse_seconds += time.perf_counter() - start
+
+            for bucket in buckets:
+                table.append(bucket)
+            while len(table) - enqueued >= QUEUE_CHUNK_SIZE:
+                await _enqueue_async(doc_queue, _documents(table, enqueued, enqueued + QUEUE_CHUNK_SIZE, timings), timings)
+                enqueued += QUEUE_CHUNK_SIZE
+            if chunk is None:
+                break
+            start = time.perf_counter()
+
+        if len(table) > enqueued:
+            await _enqueue_async(doc_queue, _documents(table, enqueued, len(table), timings), timings)
+        timings.add("download", download_seconds)
+        timings.add("parse", parse_seconds)
+        return table.freeze()
+
+    with await _download_async(blob_client, parse_pool, timings) as buffer:
+        table = await _parse_async(buffer, blob_name, parse_pool, timings)
+    await _enqueue_table_async(doc_queue, table, timings)
+    return table
+
+
+async def _ingest_blob_cached_async(container_client, blob_name, digest, parse_cache, parse_pool, doc_queue, timings):
+    """Coroutine counterpart of ``_ingest_blob_cached``."""
+    table = await asyncio.to_thread(_cache_lookup, parse_cache, digest, blob_name, timings)
+    cached = table is not None
+    if not cached:
+        with await _download_async(container_client.get_blob_client(blob_name), parse_pool, timings) as buffer:
+            if digest is None:
+                digest = await asyncio.to_thread(lambda: content_digest(buffer.data()))
+                table = await asyncio.to_thread(_cache_lookup, parse_cache, digest, blob_name, timings)
+                cached = table is not None
+            if not cached:
+                table = await _parse_async(buffer, blob_name, parse_pool, timings)
+        if not cached:
+            start = time.perf_counter()
+            await asyncio.to_thread(parse_cache.put, digest, table)
+            timings.add("cache", time.perf_counter() - start)
+
+    await _enqueue_table_async(doc_queue, table, timings)
+    return table, cached
+
+
+def _download(blob_client, parse_pool, timings):
+    """Download a blob straight into a buffer a parse worker can map (a plain one without workers)."""
+    start = time.perf_counter()
+    downloader = blob_client.download_blob()
+    buffer = _new_buffer(downloader.size, parse_pool)
+    try:
+        for chunk in downloader.chunks():
+            buffer.write(chunk)
+    except BaseException:
+        buffer.close()
+        raise
+    timings.add("download", time.perf_counter() - start)
+    metrics.inc("ingest_bytes_total", buffer.length)
+    return buffer
+
+
+async def _download_async(blob_client, parse_pool, timings):
+    start = time.perf_counter()
+    downloader = await blob_client.download_blob()
+    buffer = _new_buffer(downloader.size, parse_pool)
+    try:
+        async for chunk in downloader.chunks():
+            buffer.write(chunk)
+    except BaseException:
+        buffer.close()
+        raise
+    timings.add("download", time.perf_counter() - start)
+    metrics.inc("ingest_bytes_total", buffer.length)
+    return buffer
+
+
+def _new_buffer(size, parse_pool):
+    return parse_pool.buffer(size) if parse_pool is not None else SharedBuffer(size, handoff="bytes")
+
+
+def _parse(buffer, blob_name, parse_pool, timings):
+    if parse_pool is None:
+        table, parse_seconds = parse_blob_bytes(buffer.data(), blob_name)
+    else:
+        table, parse_seconds = parse_pool.submit(buffer, blob_name).result()
+    timings.add("parse", parse_seconds)
+    return table
+
+
+async def _parse_async(buffer, blob_name, parse_pool, timings):
+    if parse_pool is None:
+        table, parse_seconds = await asyncio.to_thread(lambda: parse_blob_bytes(buffer.data(), blob_name))
+    else:
+        table, parse_seconds = await asyncio.wrap_future(parse_pool.submit(buffer, blob_name))
+    timings.add("parse", parse_seconds)
+    return table
+
+
+def _cache_lookup(parse_cache, digest, blob_name, timings):
+    if digest is None:
+        return None
+    start = time.perf_counter()
+    table = parse_cache.get(digest, blob_name)
+    timings.add("cache", time.perf_counter() - start)
+    return table
+
+
+def _timed_chunks(blob_client, download_seconds):
+    """Yield download chunks while accumulating time spent waiting on the network."""
+    start = time.perf_counter()
+    chunks = iter(blob_client.download_blob().chunks())
+    while True:
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            download_seconds[0] += time.perf_counter() - start
+            return
+        download_seconds[0] += time.perf_counter() - start
+        metrics.inc("ingest_bytes_total", len(chunk))
+        yield chunk
+        start = time.perf_counter()
+
+
+def _documents(table, start, stop, timings):
+    """Build the search documents of a slice of a table, timed as the extract stage."""
+    begin = time.perf_counter()
+    documents = list(table.documents(start, stop))
+    timings.add("extract", time.perf_counter() - begin)
+    return documents
+
+
+def _enqueue_documents(doc_queue, table, start, stop, timings):
+    """Build and enqueue a slice of a table; returns the seconds spent."""
+    begin = time.perf_counter()
+    _enqueue(doc_queue, _documents(table, start, stop, timings), timings)
+    return time.perf_counter() - begin
+
+
+def _enqueue_table(doc_queue, table, timings):
+    for i in range(0, len(table), QUEUE_CHUNK_SIZE):
+        _enqueue_documents(doc_queue, table, i, min(i + QUEUE_CHUNK_SIZE, len(table)), timings)
+
+
+async def _enqueue_table_async(doc_queue, table, timings):
+    for i in range(0, len(table), QUEUE_CHUNK_SIZE):
+        await _enqueue_async(doc_queue, _documents(table, i, min(i + QUEUE_CHUNK_SIZE, len(table)), timings), timings)
+
+
+def _enqueue(doc_queue, batch, timings):
+    """Put a batch on the upload queue, blocking while the uploader is behind."""
+    start = time.perf_counter()
+    doc_queue.put(batch)
+    waited = time.perf_counter() - start
+    timings.add("queue_wait", waited)
+    return waited
+
+
+async def _enqueue_async(doc_queue, batch, timings):
+    start = time.perf_counter()
+    await doc_queue.put(batch)
+    timings.add("queue_wait", time.perf_counter() - start)
+
+
+def document_hash(doc):
+    """Stable fingerprint of a search document's content."""
+    return hashlib.sha1(json.dumps(doc, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _changed_documents(docs, known_hashes, upload_result):
+    """Record every document's hash and yield only those not already indexed with it."""
+    hashes = upload_result.setdefault("document_hashes", {})
+    for doc in docs:
+        digest = hashes[doc["id"]] = document_hash(doc)
+        if known_hashes.get(doc["id"]) == digest:
+            upload_result["unchanged"] = upload_result.get("unchanged", 0) + 1
+        else:
+            yield doc
+
+
+def _upload_worker(doc_queue, batch_uploader, upload_result, known_hashes):
+    """Drain the document queue into the batch uploader and record its totals."""
+    try:
+        while True:
+            docs = doc_queue.get()
+            if docs is None:
+                break
+            for doc in _changed_documents(docs, known_hashes, upload_result):
+                batch_uploader.add(doc)
+    finally:
+        # Keep draining so producers never block on a dead uploader
+        while docs is not None:
+            docs = doc_queue.get()
+        upload_result.update(batch_uploader.close())
+
+
+async def _upload_worker_async(doc_queue, batch_uploader, upload_result, known_hashes):
+    """Coroutine counterpart of ``_upload_worker``."""
+    docs = []
+    try:
+        while True:
+            docs = await doc_queue.get()
+            if docs is None:
+                break
+            for doc in _changed_documents(docs, known_hashes, upload_result):
+                await batch_uploader.add(doc)
+    finally:
+        while docs is not None:
+            docs = await doc_queue.get()
+        upload_result.update(await batch_uploader.close())
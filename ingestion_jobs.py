@@ -0,0 +1,446 @@
+"""
+Durable, resumable ingestion jobs.
+
+``process-xml`` ingests everything inside one HTTP call, so a run that hits
+the function timeout loses all of its progress. A job instead records its
+plan and progress in a blob (``_jobs/<job id>.json``) next to the index
+manifest. Every listed export is one shard. Shards are ingested in waves and
+checkpointed after each wave: a finished shard's ``WorkflowTable`` is saved
+as ``_jobs/<job id>/<shard>.tbl`` and the shard is marked done. A slice of
+work stops before its time budget runs out: each wave holds only as many
+shards as the job's measured throughput says will finish in the time left,
+and no wave starts with less than INGEST_JOB_MIN_WAVE_SECONDS to go. The
+next slice (from the job queue or the timer trigger) continues with the
+shards that are still pending. A shard's attempt is recorded before its
+wave starts, so a shard that keeps crashing the worker is still given up on
+after INGEST_JOB_MAX_ATTEMPTS. Once every shard is settled the job is finalized like
+``process-xml``: manifest, stale document deletion, lineage graph, local
+search index and catalog snapshot.
+
+Slices take a time-limited lease on the job so two workers do not normally
+run the same job. Uploads are idempotent, so the rare overlap after an expired
+lease only repeats work.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timezone
+from collections import namedtuple
+
+from ingestion import get_pipeline_config, run_ingestion_pipeline_async, StageTimings, document_hash
+from index_manifest import (
+    load_manifest, save_manifest, diff_manifest, blob_fingerprint, apply_ingestion_result,
+    delete_documents, known_document_hashes
+)
+from lineage_graph import lineage_cache, load_lineage_graph, save_lineage_graph, merge_lineage
+from local_index import local_index_cache, merge_local_index, save_local_index
+from parse_cache import parse_cache, listed_digest
+from blob_prefilter import load_prefilter
+from catalog_snapshot import (
+    get_snapshot_blob_name, snapshots_enabled, load_snapshot, save_snapshot, merge_snapshot
+)
+from result_cache import result_cache
+from workflow_model import WorkflowTable
+
+JOB_PREFIX = "_jobs/"
+JOB_SLICE_SECONDS = float(os.getenv("INGEST_JOB_SLICE_SECONDS", 420))
+JOB_WAVE_SIZE = int(os.getenv("INGEST_JOB_WAVE_SIZE", 32))
+JOB_MAX_ATTEMPTS = int(os.getenv("INGEST_JOB_MAX_ATTEMPTS", 3))
+# No wave starts with less than this left of the slice budget
+JOB_MIN_WAVE_SECONDS = float(os.getenv("INGEST_JOB_MIN_WAVE_SECONDS", 30))
+# Added to the slice budget so a crashed slice's lease expires soon after the host kills it
+LEASE_GRACE_SECONDS = 60
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# What finalization needs from a listed blob; rebuilt from the fingerprint stored in the job
+ListedBlob = namedtuple("ListedBlob", ["name", "etag", "size", "last_modified"])
+
+
+def get_job_blob_name(job_id):
+    return f"{JOB_PREFIX}{job_id}.json"
+
+
+def get_shard_blob_name(job_id, number):
+    return f"{JOB_PREFIX}{job_id}/{number}.tbl"
+
+
+def is_job_id(value):
+    return isinstance(value, str) and bool(_JOB_ID.match(value))
+
+
+def create_job(index_name, manifest, blobs, incremental=False, options=None):
+    """Plan a job over the listed exports; incremental jobs only shard new or changed blobs."""
+    changed, unchanged, removed = diff_manifest(manifest, blobs)
+    if not incremental:
+        changed, unchanged = blobs, []
+    now = _now()
+    return {
+        "job_id": uuid.uuid4().hex,
+        "index_name": index_name,
+        "mode": "incremental" if incremental else "full",
+        "status": "running",
+        "created": now,
+        "updated": now,
+        "completed": None,
+        "lease_expires": 0,
+        "options": options or {},
+        "unchanged": len(unchanged),
+        "removed": removed,
+        "shards": [
+            {
+                "blob": blob.name,
+                "fingerprint": blob_fingerprint(blob),
+                "digest": listed_digest(blob),
+                "status": "pending",
+                "attempts": 0,
+                "workflows": 0
+            }
+            for blob in changed
+        ],
+        "totals": {
+            "slices": 0,
+            "active_seconds": 0.0,
+            "shard_bytes": 0,
+            "files_from_cache": 0,
+            "files_skipped": 0,
+            "workflows_extracted": 0,
+            "workflows_uploaded": 0,
+            "workflows_unchanged": 0,
+            "workflows_failed": 0,
+            "upload_retries": 0
+        },
+        "result": None
+    }
+
+
+def load_job(container_client, job_id):
+    """The job record, or ``None`` if there is no such job."""
+    blob_client = container_client.get_blob_client(get_job_blob_name(job_id))
+    if not blob_client.exists():
+        return None
+    return json.loads(blob_client.download_blob().readall())
+
+
+def save_job(container_client, job):
+    job["updated"] = _now()
+    blob_client = container_client.get_blob_client(get_job_blob_name(job["job_id"]))
+    blob_client.upload_blob(json.dumps(job, separators=(",", ":")).encode("utf-8"), overwrite=True)
+
+
+def list_jobs(container_client):
+    """All job records in the container."""
+    jobs = []
+    for blob in container_client.list_blobs(name_starts_with=JOB_PREFIX):
+        name = blob.name[len(JOB_PREFIX):]
+        if name.endswith(".json") and is_job_id(name[:-5]):
+            job = load_job(container_client, name[:-5])
+            if job is not None:
+                jobs.append(job)
+    return jobs
+
+
+def is_leased(job):
+    return job["lease_expires"] > time.time()
+
+
+def job_status(job):
+    """Progress summary of a job for the status route."""
+    shards = job["shards"]
+    counts = {"pending": 0, "done": 0, "failed": 0}
+    for shard in shards:
+        counts[shard["status"]] += 1
+    totals = job["totals"]
+    active = totals["active_seconds"]
+    settled = counts["done"] + counts["failed"]
+    status = {
+        "job_id": job["job_id"],
+        "index_name": job["index_name"],
+        "mode": job["mode"],
+        "status": job["status"],
+        "created": job["created"],
+        "updated": job["updated"],
+        "completed": job["completed"],
+        "running": job["status"] == "running" and is_leased(job),
+        "shards": dict(counts, total=len(shards)),
+        "progress": round(settled / len(shards), 4) if shards else 1.0,
+        "xml_files_unchanged": job["unchanged"],
+        "xml_files_removed": len(job["removed"]),
+        "totals": totals,
+        "throughput": {
+            "files_per_second": round(settled / active, 2) if active else None,
+            "bytes_per_second": round(_bytes_per_second(job)) if _bytes_per_second(job) else None,
+            "workflows_per_second": round(totals["workflows_extracted"] / active, 1) if active else None
+        },
+        "failed_shards": [
+            {"blob": shard["blob"], "attempts": shard["attempts"]}
+            for shard in shards if shard["status"] == "failed"
+        ],
+        "result": job["result"]
+    }
+    if active and counts["pending"] and settled:
+        status["eta_seconds"] = round(active / settled * counts["pending"], 1)
+    return status
+
+
+async def run_job_slice(job, container_client, async_container_client, search_client, async_search_client,
+                        budget_seconds=None):
+    """Ingest pending shards until the budget is spent, checkpointing after each wave; finalize when done."""
+    budget_seconds = JOB_SLICE_SECONDS if budget_seconds is None else budget_seconds
+    deadline = time.monotonic() + budget_seconds
+    job["lease_expires"] = time.time() + budget_seconds + LEASE_GRACE_SECONDS
+    job["totals"]["slices"] += 1
+    await asyncio.to_thread(save_job, container_client, job)
+
+    options = job["options"]
+    config = get_pipeline_config(options)
+    use_parse_cache = parse_cache.enabled and options.get("parse_cache", True) is not False
+    incremental = job["mode"] == "incremental"
+    manifest = await asyncio.to_thread(load_manifest, container_client, job["index_name"])
+    _give_up_exhausted(job)
+    # A budget set below the minimum would otherwise never start a wave
+    minimum = min(JOB_MIN_WAVE_SECONDS, budget_seconds / 2)
+    first = True
+
+    try:
+        while True:
+            wave = _next_wave(job, deadline - time.monotonic(), first, minimum)
+            if not wave:
+                break
+            first = False
+            # Count the attempt before running it, so a shard that takes the worker down still uses one up
+            for shard in wave:
+                shard["attempts"] += 1
+            await asyncio.to_thread(save_job, container_client, job)
+            start = time.perf_counter()
+            await _run_wave(
+                job, wave, container_client, async_container_client, async_search_client,
+                config, manifest if incremental else None, use_parse_cache
+            )
+            totals = job["totals"]
+            totals["active_seconds"] = round(totals["active_seconds"] + time.perf_counter() - start, 3)
+            # Jobs started before shard_bytes was added do not have it yet
+            totals["shard_bytes"] = totals.get("shard_bytes", 0) + sum(_shard_size(shard) for shard in wave)
+            await asyncio.to_thread(save_job, container_client, job)
+
+        if all(shard["status"] != "pending" for shard in job["shards"]):
+            await asyncio.to_thread(_finalize_job, job, container_client, search_client, manifest)
+    finally:
+        job["lease_expires"] = 0
+        await asyncio.to_thread(save_job, container_client, job)
+    return job
+
+
+def _give_up_exhausted(job):
+    """Fail pending shards whose attempts are used up, e.g. by slices that crashed while running them."""
+    for shard in job["shards"]:
+        if shard["status"] == "pending" and shard["attempts"] >= JOB_MAX_ATTEMPTS:
+            shard["status"] = "failed"
+            logging.error(f"Job {job['job_id']}: giving up on shard {shard['blob']} after {shard['attempts']} attempts")
+
+
+def _next_wave(job, remaining, first, minimum=None):
+    """Pending shards expected to finish within ``remaining`` seconds, at most JOB_WAVE_SIZE.
+
+    Nothing starts with less than ``minimum`` (JOB_MIN_WAVE_SECONDS) left.
+    Until the job has measured its throughput a wave holds one shard. The
+    first wave of a slice always gets its first shard, since a shard too big
+    for a whole budget would otherwise never run.
+    """
+    pending = [shard for shard in job["shards"] if shard["status"] == "pending"]
+    if not pending or remaining < (JOB_MIN_WAVE_SECONDS if minimum is None else minimum):
+        return []
+    rate = _bytes_per_second(job)
+    if rate is None:
+        return pending[:1]
+    wave = []
+    estimate = 0.0
+    for shard in pending[:JOB_WAVE_SIZE]:
+        estimate += _shard_size(shard) / rate
+        if estimate > remaining and (wave or not first):
+            break
+        wave.append(shard)
+    return wave
+
+
+def _bytes_per_second(job):
+    """Export bytes the job has worked through per second of wave time, or ``None`` before its first wave."""
+    totals = job["totals"]
+    shard_bytes = totals.get("shard_bytes", 0)
+    return shard_bytes / totals["active_seconds"] if shard_bytes and totals["active_seconds"] else None
+
+
+def _shard_size(shard):
+    return shard["fingerprint"].get("size") or 0
+
+
+async def _run_wave(job, wave, container_client, async_container_client, async_search_client,
+                    config, manifest, use_parse_cache):
+    names = [shard["blob"] for shard in wave]
+    listed = [_listed_blob(shard) for shard in wave]
+    digests = {shard["blob"]: shard["digest"] for shard in wave}
+    prefilter = None
+    if config["prefilter"]:
+        prefilter = await asyncio.to_thread(load_prefilter, container_client, listed, digests)
+    stats = await run_ingestion_pipeline_async(
+        async_container_client,
+        names,
+        async_search_client,
+        config=config,
+        timings=StageTimings(),
+        parse_cache=parse_cache if use_parse_cache else None,
+        digests=digests,
+        known_hashes=known_document_hashes(manifest, listed) if manifest is not None else None,
+        prefilter=prefilter
+    )
+    if prefilter is not None:
+        await asyncio.to_thread(prefilter.save, container_client)
+    totals = job["totals"]
+    for key in ("files_from_cache", "files_skipped", "workflows_extracted", "workflows_uploaded",
+                "workflows_unchanged", "workflows_failed", "upload_retries"):
+        # Jobs started before a total was added do not have it yet
+        totals[key] = totals.get(key, 0) + stats[key]
+
+    for shard in wave:
+        table = stats["workflows_by_blob"].get(shard["blob"])
+        documents = stats["documents_by_blob"].get(shard["blob"])
+        if table is None or stats["failed_keys"].intersection(documents):
+            shard["status"] = "failed" if shard["attempts"] >= JOB_MAX_ATTEMPTS else "pending"
+            logging.error(f"Job {job['job_id']}: shard {shard['blob']} failed (attempt {shard['attempts']})")
+            continue
+        number = job["shards"].index(shard)
+        blob_client = container_client.get_blob_client(get_shard_blob_name(job["job_id"], number))
+        await asyncio.to_thread(blob_client.upload_blob, table.to_bytes(), overwrite=True)
+        shard["status"] = "done"
+        shard["workflows"] = len(table)
+
+
+def _finalize_job(job, container_client, search_client, manifest):
+    """Apply the checkpointed shards like a single ``process-xml`` run would and remove the checkpoints."""
+    tables = {}
+    for number, shard in enumerate(job["shards"]):
+        if shard["status"] == "done":
+            data = container_client.get_blob_client(get_shard_blob_name(job["job_id"], number)).download_blob().readall()
+            tables[shard["blob"]] = WorkflowTable.from_bytes(data)
+
+    document_hashes = {}
+    documents_by_blob = {}
+    for name, table in tables.items():
+        documents_by_blob[name] = []
+        for document in table.documents():
+            documents_by_blob[name].append(document["id"])
+            document_hashes[document["id"]] = document_hash(document)
+    stats = {
+        "documents_by_blob": documents_by_blob,
+        "document_hashes": document_hashes,
+        "workflows_by_blob": tables,
+        "failed_keys": set(),
+        "workflows_uploaded": job["totals"]["workflows_uploaded"]
+    }
+    changed = [_listed_blob(shard) for shard in job["shards"]]
+    job["result"] = finalize_ingestion(
+        container_client, search_client, job["index_name"], manifest, changed, job["removed"], stats,
+        job["mode"] == "incremental", StageTimings()
+    )
+
+    for number, shard in enumerate(job["shards"]):
+        if shard["status"] == "done":
+            try:
+                container_client.get_blob_client(get_shard_blob_name(job["job_id"], number)).delete_blob()
+            except Exception as e:
+                logging.error(f"Could not remove checkpoint {number} of job {job['job_id']}: {str(e)}")
+    job["status"] = "completed" if all(shard["status"] == "done" for shard in job["shards"]) else "completed_with_errors"
+    job["completed"] = _now()
+
+
+def finalize_ingestion(container_client, search_client, index_name, manifest, changed, removed, stats,
+                       incremental, timings, snapshot=None):
+    """Record a run in the manifest, delete stale documents and rebuild the lineage graph, local index and snapshot.
+
+    ``snapshot`` is saved as the index's catalog snapshot as it is, instead of
+    one built from the run (for ``bulk-load``, which has one already).
+    """
+    stale_keys = apply_ingestion_result(
+        manifest, changed, removed, stats["documents_by_blob"], stats["failed_keys"], stats["document_hashes"]
+    )
+    start = time.perf_counter()
+    deleted_count = delete_documents(search_client, stale_keys) if stale_keys else 0
+    if stale_keys:
+        timings.add("delete", time.perf_counter() - start)
+    save_manifest(container_client, manifest)
+
+    # Rebuild the lineage graph, carrying over exports that were not re-parsed
+    start = time.perf_counter()
+    previous_graph = load_lineage_graph(container_client, index_name)[0] if incremental else None
+    workflows_by_blob = stats["workflows_by_blob"]
+    graph = merge_lineage(
+        previous_graph, {name: table.lineage_records() for name, table in workflows_by_blob.items()}, removed, incremental
+    )
+    save_lineage_graph(container_client, index_name, graph)
+    lineage_cache.put(index_name, graph)
+    timings.add("lineage", time.perf_counter() - start)
+
+    # Rebuild the embedded search index the read routes fall back to
+    start = time.perf_counter()
+    previous_index = local_index_cache.get(container_client, index_name, True) if incremental else None
+    local_index = merge_local_index(
+        previous_index, {name: table.index_entries() for name, table in workflows_by_blob.items()}, removed, incremental
+    )
+    save_local_index(container_client, index_name, local_index)
+    local_index_cache.put(index_name, local_index)
+    timings.add("local_index", time.perf_counter() - start)
+
+    # Snapshot the catalog so the index can be rebuilt without parsing the exports again
+    snapshot_info = None
+    if snapshot is not None or snapshots_enabled():
+        start = time.perf_counter()
+        if snapshot is None:
+            failed_keys = stats["failed_keys"]
+            fingerprints = {
+                blob.name: blob_fingerprint(blob) for blob in changed
+                if not failed_keys.intersection(stats["documents_by_blob"].get(blob.name, ()))
+            }
+            previous = load_snapshot(container_client, get_snapshot_blob_name(index_name)) if incremental else None
+            try:
+                snapshot = merge_snapshot(previous, workflows_by_blob, fingerprints, removed, incremental)
+            finally:
+                if previous is not None:
+                    previous.close()
+        save_snapshot(container_client, index_name, snapshot)
+        snapshot_info = {"exports": len(snapshot.exports), "workflows": len(snapshot), "bytes": len(snapshot.buffer)}
+        timings.add("snapshot", time.perf_counter() - start)
+
+    # Cached lookups may now be stale
+    if stats["workflows_uploaded"] or deleted_count:
+        result_cache.invalidate()
+
+    return {
+        "documents_deleted": deleted_count,
+        "lineage_nodes": graph.node_count,
+        "lineage_edges": graph.edge_count,
+        "local_index_documents": local_index.doc_count,
+        "snapshot": snapshot_info
+    }
+
+
+def listed_blob(name, fingerprint):
+    """``ListedBlob`` for an export from its recorded ``blob_fingerprint``."""
+    last_modified = fingerprint["last_modified"]
+    return ListedBlob(
+        name,
+        fingerprint["etag"],
+        fingerprint["size"],
+        datetime.fromisoformat(last_modified) if last_modified else None
+    )
+
+
+def _listed_blob(shard):
+    return listed_blob(shard["blob"], shard["fingerprint"])
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
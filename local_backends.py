@@ -0,0 +1,429 @@
+"""
+Local stand-ins for Azure Blob Storage and Azure AI Search.
+
+These mimic the small subset of the SDK surface used by the function app
+(``list_blobs``/``get_blob_client``/``download_blob`` and
+``search``/``upload_documents``/``delete_documents``) so ingestion and the
+read routes can be exercised and benchmarked without Azure credentials. The
+``LocalAsync*`` classes wrap them with the ``aio`` client interfaces.
+``LocalSearchIndexClient`` adds named indexes and aliases, so blue/green
+rebuilds can be tested end to end.
+"""
+
+import hashlib
+import os
+import re
+import asyncio
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+_FILTER_CLAUSE = re.compile(r"^\s*(\w+)\s+eq\s+'((?:[^']|'')*)'\s*$")
+_SEARCH_IN_CLAUSE = re.compile(r"^\s*search\.in\((\w+),\s*'((?:[^']|'')*)',\s*'(.)'\)\s*$")
+_ANY_CLAUSE = re.compile(r"^\s*(\w+)/any\((\w+):\s*\2\s+eq\s+'((?:[^']|'')*)'\)\s*$")
+
+# Stand-ins for the ``SearchIndex`` and ``SearchAlias`` models; only the names matter locally
+LocalIndexDefinition = namedtuple("LocalIndexDefinition", ["name"])
+LocalAlias = namedtuple("LocalAlias", ["name", "indexes"])
+
+
+class LocalBlobProperties:
+    """Subset of ``azure.storage.blob.BlobProperties`` for a local file."""
+
+    def __init__(self, name, size, last_modified, etag):
+        self.name = name
+        self.size = size
+        self.last_modified = last_modified
+        self.etag = etag
+
+
+class LocalStorageStreamDownloader:
+    """Subset of ``StorageStreamDownloader`` reading from a local file."""
+
+    def __init__(self, path, latency=0.0, chunk_size=4 * 1024 * 1024, offset=0, length=None):
+        self._path = path
+        self._chunk_size = chunk_size
+        self._offset = offset
+        remaining = max(0, os.path.getsize(path) - offset)
+        self.size = remaining if length is None else min(length, remaining)
+        if latency:
+            # Simulate time to first byte of a remote download
+            time.sleep(latency)
+
+    def chunks(self):
+        with open(self._path, "rb") as f:
+            f.seek(self._offset)
+            remaining = self.size
+            while remaining:
+                chunk = f.read(min(self._chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def readall(self):
+        with open(self._path, "rb") as f:
+            f.seek(self._offset)
+            return f.read(self.size)
+
+
+class LocalBlobClient:
+    """Subset of ``BlobClient`` backed by a file under the container root."""
+
+    def __init__(self, container, blob_name):
+        self._container = container
+        self.blob_name = blob_name
+        self._path = os.path.join(container.root, blob_name)
+
+    def exists(self):
+        return os.path.isfile(self._path)
+
+    def upload_blob(self, data, overwrite=False):
+        if not overwrite and self.exists():
+            raise FileExistsError(f"Blob {self.blob_name} already exists")
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with open(self._path, "wb") as f:
+            f.write(data)
+
+    def delete_blob(self):
+        os.remove(self._path)
+
+    def get_blob_properties(self):
+        return _file_properties(self.blob_name, self._path)
+
+    def download_blob(self, offset=0, length=None):
+        return LocalStorageStreamDownloader(
+            self._path,
+            latency=self._container.latency,
+            chunk_size=self._container.chunk_size,
+            offset=offset,
+            length=length
+        )
+
+
+class LocalContainerClient:
+    """Subset of ``ContainerClient`` backed by a local directory."""
+
+    def __init__(self, root, latency=0.0, chunk_size=4 * 1024 * 1024):
+        self.root = root
+        self.latency = latency
+        self.chunk_size = chunk_size
+
+    def list_blobs(self, name_starts_with=None):
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if name_starts_with is None or name.startswith(name_starts_with):
+                    yield _file_properties(name, path)
+
+    def get_blob_client(self, blob):
+        return LocalBlobClient(self, blob)
+
+
+class LocalIndexingResult:
+    """Subset of ``azure.search.documents.models.IndexingResult``."""
+
+    def __init__(self, key, succeeded=True, status_code=201, error_message=None):
+        self.key = key
+        self.succeeded = succeeded
+        self.status_code = status_code
+        self.error_message = error_message
+
+
+class LocalSearchClient:
+    """Subset of ``SearchClient`` storing documents in an in-memory dict."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.documents = {}
+        self._lock = threading.Lock()
+
+    def search(self, search_text=None, filter=None, select=None, top=None, skip=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        terms = [] if search_text in (None, "", "*") else str(search_text).casefold().split()
+        predicate = _parse_filter(filter)
+        with self._lock:
+            documents = list(self.documents.values())
+        results = []
+        for doc in documents:
+            if not predicate(doc):
+                continue
+            text = " ".join(_field_text(value) for value in doc.values()).casefold()
+            score = sum(text.count(term) for term in terms)
+            if terms and not all(term in text for term in terms):
+                continue
+            result = {key: doc.get(key) for key in select} if select else dict(doc)
+            result["@search.score"] = float(score or 1)
+            results.append(result)
+        results.sort(key=lambda doc: -doc["@search.score"])
+        start = skip or 0
+        return iter(results[start:start + top] if top is not None else results[start:])
+
+    def get_document(self, key, selected_fields=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            doc = self.documents.get(key)
+        if doc is None:
+            raise KeyError(key)
+        return {field: doc.get(field) for field in selected_fields} if selected_fields else dict(doc)
+
+    def upload_documents(self, documents):
+        if self.latency:
+            time.sleep(self.latency)
+        results = []
+        with self._lock:
+            for doc in documents:
+                self.documents[doc["id"]] = dict(doc)
+                results.append(LocalIndexingResult(doc["id"]))
+        return results
+
+    def delete_documents(self, documents):
+        if self.latency:
+            time.sleep(self.latency)
+        results = []
+        with self._lock:
+            for doc in documents:
+                existed = self.documents.pop(doc["id"], None) is not None
+                results.append(LocalIndexingResult(doc["id"], status_code=200 if existed else 404))
+        return results
+
+    def get_document_count(self):
+        return len(self.documents)
+
+
+class LocalSearchIndexClient:
+    """Subset of ``SearchIndexClient`` with in-memory indexes and aliases.
+
+    Like the service, an alias is resolved on every request, so clients
+    obtained for an alias follow it when it is pointed at another index.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.indexes = {}
+        self.aliases = {}
+        self._lock = threading.Lock()
+
+    def create_index(self, index):
+        with self._lock:
+            if index.name in self.indexes or index.name in self.aliases:
+                raise ValueError(f"Index or alias '{index.name}' already exists")
+            self.indexes[index.name] = LocalSearchClient(self.latency)
+        return index
+
+    def delete_index(self, index):
+        name = getattr(index, "name", index)
+        with self._lock:
+            if any(name in alias.indexes for alias in self.aliases.values()):
+                raise ValueError(f"Index '{name}' is referenced by an alias")
+            self.indexes.pop(name, None)
+
+    def list_index_names(self):
+        with self._lock:
+            return list(self.indexes)
+
+    def create_or_update_alias(self, alias):
+        with self._lock:
+            if alias.name in self.indexes:
+                raise ValueError(f"An index named '{alias.name}' already exists")
+            missing = [name for name in alias.indexes if name not in self.indexes]
+            if missing:
+                raise ValueError(f"Alias '{alias.name}' refers to missing index {missing[0]}")
+            self.aliases[alias.name] = alias
+        return alias
+
+    def delete_alias(self, alias):
+        with self._lock:
+            self.aliases.pop(getattr(alias, "name", alias), None)
+
+    def list_aliases(self):
+        with self._lock:
+            return list(self.aliases.values())
+
+    def get_search_client(self, index_name):
+        return _LocalAliasedSearchClient(self, index_name)
+
+    def resolve(self, name):
+        """The ``LocalSearchClient`` that ``name`` (an index or alias) currently refers to."""
+        with self._lock:
+            alias = self.aliases.get(name)
+            client = self.indexes.get(alias.indexes[0] if alias else name)
+        if client is None:
+            raise KeyError(f"No index or alias named '{name}'")
+        return client
+
+
+class _LocalAliasedSearchClient:
+    """``LocalSearchClient`` interface that looks up its index on every call."""
+
+    def __init__(self, service, name):
+        self._service = service
+        self.index_name = name
+
+    def __getattr__(self, attribute):
+        return getattr(self._service.resolve(self.index_name), attribute)
+
+
+def _file_properties(name, path):
+    stat = os.stat(path)
+    etag = hashlib.md5(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+    return LocalBlobProperties(
+        name=name,
+        size=stat.st_size,
+        last_modified=datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        etag=f'"0x{etag[:16].upper()}"'
+    )
+
+
+def _field_text(value):
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(item) for item in value)
+    return "" if value is None else str(value)
+
+
+def _parse_filter(filter):
+    """Compile the OData subset used by the routes into a predicate.
+
+    Atoms are ``field eq 'value'``, ``search.in(field, 'a|b', '|')`` and
+    ``field/any(t: t eq 'value')``; atoms may be or-ed inside parentheses and
+    clauses and-ed together.
+    """
+    if not filter:
+        return lambda doc: True
+    clauses = []
+    parts = re.split(r"\s+and\s+", filter)
+    for clause in parts:
+        clause = clause.strip()
+        if clause.startswith("(") and clause.endswith(")"):
+            clause = clause[1:-1]
+        elif len(parts) > 1 and re.search(r"\s+or\s+", clause):
+            raise ValueError(f"Unsupported filter for local search: {filter}")
+        alternatives = []
+        for atom in re.split(r"\s+or\s+", clause):
+            match = _FILTER_CLAUSE.match(atom)
+            if match:
+                alternatives.append((match.group(1), {match.group(2).replace("''", "'")}, False))
+                continue
+            match = _ANY_CLAUSE.match(atom)
+            if match:
+                alternatives.append((match.group(1), {match.group(3).replace("''", "'")}, True))
+                continue
+            match = _SEARCH_IN_CLAUSE.match(atom)
+            if not match:
+                raise ValueError(f"Unsupported filter for local search: {filter}")
+            alternatives.append((match.group(1), set(match.group(2).replace("''", "'").split(match.group(3))), False))
+        clauses.append(alternatives)
+    return lambda doc: all(any(_matches(doc, *alternative) for alternative in alternatives) for alternatives in clauses)
+
+
+def _matches(doc, field, values, collection):
+    if collection:
+        return not values.isdisjoint(doc.get(field) or ())
+    return doc.get(field) in values
+
+
+class _AsyncIterator:
+    """Async iterator over an already materialized sequence."""
+
+    def __init__(self, items):
+        self._items = iter(items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._items)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class LocalAsyncStorageStreamDownloader:
+    """Subset of the ``aio`` ``StorageStreamDownloader``."""
+
+    def __init__(self, downloader):
+        self._downloader = downloader
+        self.size = downloader.size
+
+    def chunks(self):
+        return _AsyncIterator(self._downloader.chunks())
+
+    async def readall(self):
+        return self._downloader.readall()
+
+
+class LocalAsyncBlobClient:
+    """Subset of the ``aio`` ``BlobClient``."""
+
+    def __init__(self, blob_client, latency):
+        self._blob_client = blob_client
+        self._latency = latency
+        self.blob_name = blob_client.blob_name
+
+    async def exists(self):
+        return self._blob_client.exists()
+
+    async def upload_blob(self, data, overwrite=False):
+        self._blob_client.upload_blob(data, overwrite=overwrite)
+
+    async def download_blob(self, offset=0, length=None):
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        return LocalAsyncStorageStreamDownloader(self._blob_client.download_blob(offset, length))
+
+
+class LocalAsyncContainerClient:
+    """Subset of the ``aio`` ``ContainerClient`` backed by a local directory."""
+
+    def __init__(self, root, latency=0.0, chunk_size=4 * 1024 * 1024):
+        # Latency is simulated with asyncio.sleep here, not by the wrapped client
+        self._container = LocalContainerClient(root, chunk_size=chunk_size)
+        self.root = root
+        self.latency = latency
+
+    def list_blobs(self, name_starts_with=None):
+        return _AsyncIterator(list(self._container.list_blobs(name_starts_with)))
+
+    def get_blob_client(self, blob):
+        return LocalAsyncBlobClient(self._container.get_blob_client(blob), self.latency)
+
+
+class LocalAsyncSearchClient:
+    """Subset of the ``aio`` ``SearchClient`` over a ``LocalSearchClient``."""
+
+    def __init__(self, search_client=None, latency=0.0):
+        self._search_client = search_client or LocalSearchClient()
+        self.latency = latency
+        self.documents = self._search_client.documents
+
+    async def _wait(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def search(self, search_text=None, **kwargs):
+        await self._wait()
+        return _AsyncIterator(self._search_client.search(search_text=search_text, **kwargs))
+
+    async def get_document(self, key, selected_fields=None, **kwargs):
+        await self._wait()
+        return self._search_client.get_document(key, selected_fields=selected_fields)
+
+    async def upload_documents(self, documents):
+        await self._wait()
+        return self._search_client.upload_documents(documents)
+
+    async def delete_documents(self, documents):
+        await self._wait()
+        return self._search_client.delete_documents(documents)
+
+    async def get_document_count(self):
+        return self._search_client.get_document_count()
+
+    async def close(self):
+        pass
@@ -0,0 +1,416 @@
+"""
+Embedded BM25 inverted index over the extracted workflow documents.
+
+``process-xml`` builds the index next to the lineage graph and stores it as a
+single blob. Workers download it to local disk and memory-map it: the term
+dictionary is read into a dict, while postings, document lengths and stored
+documents stay in the mapped file and are sliced without copying. Workflow,
+mapping, session and table names are tokenized both whole and split on ``_``
+so ``sales`` finds ``wf_SALES_DAILY``. The filters used by the read routes
+are supported: ``field eq 'value'`` and ``field/any(t: t eq 'value')``, or-ed
+inside parentheses and and-ed together. ``id`` and ``type`` are answered from
+in-memory columns, and exact table filters start from the table name's
+postings instead of scanning every document.
+
+Read routes use it as the primary engine (``LOCAL_SEARCH_MODE=primary``) or
+only when Azure AI Search is throttled, unreachable or not configured
+(``fallback``, the default).
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import mmap
+import time
+import struct
+import logging
+import tempfile
+import threading
+from array import array
+
+LOCAL_INDEX_PREFIX = "_search/"
+FORMAT_MAGIC = b"LIX1"
+BM25_K1 = 1.2
+BM25_B = 0.75
+SEARCH_MODES = ("off", "fallback", "primary")
+# Collection fields whose values are indexed as terms (the ``tables`` of each entry)
+TABLE_FIELDS = ("source_tables", "target_tables")
+
+_TOKEN = re.compile(r"[0-9A-Za-z_]+")
+_FILTER_CLAUSE = re.compile(r"^\s*(\w+)\s+eq\s+'((?:[^']|'')*)'\s*$")
+_ANY_CLAUSE = re.compile(r"^\s*(\w+)/any\((\w+):\s*\2\s+eq\s+'((?:[^']|'')*)'\)\s*$")
+
+
+def get_local_index_blob_name(index_name):
+    return f"{LOCAL_INDEX_PREFIX}{index_name}.lix"
+
+
+def get_local_search_mode():
+    mode = os.getenv("LOCAL_SEARCH_MODE", "fallback").lower()
+    return mode if mode in SEARCH_MODES else "fallback"
+
+
+def tokenize(text):
+    """Lower-cased identifiers plus their ``_``-separated parts."""
+    tokens = []
+    for token in _TOKEN.findall(str(text).casefold()):
+        tokens.append(token)
+        if "_" in token:
+            tokens.extend(part for part in token.split("_") if part)
+    return tokens
+
+
+def parse_filter(filter):
+    """Parse the supported OData subset into and-ed clauses of or-ed (field, value, is collection) alternatives."""
+    if not filter:
+        return []
+    clauses = []
+    parts = re.split(r"\s+and\s+", filter)
+    for clause in parts:
+        clause = clause.strip()
+        if clause.startswith("(") and clause.endswith(")"):
+            clause = clause[1:-1]
+        elif len(parts) > 1 and re.search(r"\s+or\s+", clause):
+            # ``a and b or c`` would need precedence handling; require parentheses
+            raise ValueError(f"Unsupported filter for local search: {filter}")
+        alternatives = []
+        for atom in re.split(r"\s+or\s+", clause):
+            match = _FILTER_CLAUSE.match(atom)
+            if match:
+                alternatives.append((match.group(1), match.group(2).replace("''", "'"), False))
+                continue
+            match = _ANY_CLAUSE.match(atom)
+            if not match:
+                raise ValueError(f"Unsupported filter for local search: {filter}")
+            alternatives.append((match.group(1), match.group(3).replace("''", "'"), True))
+        clauses.append(alternatives)
+    return clauses
+
+
+class LocalSearchIndex:
+    """Read-only BM25 index over a serialized buffer (``bytes`` or an ``mmap``)."""
+
+    def __init__(self, buffer):
+        if bytes(buffer[:4]) != FORMAT_MAGIC:
+            raise ValueError("Not a local search index")
+        header_size = struct.unpack_from("<I", buffer, 4)[0]
+        header = json.loads(bytes(buffer[8:8 + header_size]))
+        self.buffer = buffer
+        self.files = header["files"]
+        self.ids = header["ids"]
+        self.types = header["types"]
+        self.terms = header["terms"]
+        self.doc_count = len(self.ids)
+        self.avgdl = header["avgdl"] or 1.0
+        self._id_lookup = {doc_id: number for number, doc_id in enumerate(self.ids)}
+
+        view = memoryview(buffer)
+        position = 8 + header_size
+        self.doc_lengths, position = _column(view, position, "I", self.doc_count)
+        self.doc_files, position = _column(view, position, "i", self.doc_count)
+        self.stored_offsets, position = _column(view, position, "Q", self.doc_count + 1)
+        self.posting_docs, position = _column(view, position, "I", header["postings"])
+        self.posting_freqs, position = _column(view, position, "I", header["postings"])
+        self._stored = view[position:]
+
+    @classmethod
+    def build(cls, entries_by_blob):
+        """Build an index from ``{blob name: iterable of (document, table names)}``."""
+        return cls(build_index_bytes(entries_by_blob))
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map an index file."""
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def document(self, number):
+        start, end = self.stored_offsets[number], self.stored_offsets[number + 1]
+        return json.loads(bytes(self._stored[start:end]))[0]
+
+    def get_documents(self, ids):
+        """Stored documents by key; unknown ids are left out."""
+        numbers = (self._id_lookup.get(doc_id) for doc_id in ids)
+        return {self.ids[number]: self.document(number) for number in numbers if number is not None}
+
+    def entries_by_blob(self):
+        """Inverse of ``build``, used to carry unchanged exports into an incremental rebuild."""
+        entries = {blob_name: [] for blob_name in self.files}
+        for number in range(self.doc_count):
+            start, end = self.stored_offsets[number], self.stored_offsets[number + 1]
+            document, tables = json.loads(bytes(self._stored[start:end]))
+            entries[self.files[self.doc_files[number]]].append((document, tables))
+        return entries
+
+    def search(self, search_text=None, filter=None, select=None, top=None, skip=None, **kwargs):
+        """Return ranked documents shaped like ``SearchClient.search`` results."""
+        clauses = parse_filter(filter)
+        terms = [] if search_text in (None, "", "*") else self._query_terms(search_text)
+
+        if terms:
+            scores = self._score(terms)
+            candidates = scores.keys()
+        else:
+            scores = None
+            candidates = self._filtered_candidates(clauses)
+        matches = [number for number in candidates if self._matches(number, clauses)]
+        if scores is not None:
+            matches.sort(key=lambda number: (-scores[number], number))
+
+        start = skip or 0
+        page = matches[start:start + top] if top is not None else matches[start:]
+        results = []
+        for number in page:
+            document = self.document(number)
+            result = {key: document.get(key) for key in select} if select else document
+            result["@search.score"] = round(scores[number], 6) if scores is not None else 1.0
+            results.append(result)
+        return results
+
+    def _query_terms(self, text):
+        """Whole identifiers when indexed; their ``_`` parts only for identifiers the index lacks.
+
+        Matching ``wf_sales_daily`` as a whole avoids scoring every document that
+        merely shares a ``wf`` prefix.
+        """
+        terms = []
+        for token in _TOKEN.findall(str(text).casefold()):
+            if token in self.terms or "_" not in token:
+                terms.append(token)
+            else:
+                terms.extend(part for part in token.split("_") if part)
+        return list(dict.fromkeys(terms))
+
+    def _score(self, terms):
+        scores = {}
+        lengths = self.doc_lengths
+        norm = BM25_K1 * (1 - BM25_B)
+        scale = BM25_K1 * BM25_B / self.avgdl
+        for term in terms:
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            offset, count = entry
+            idf = math.log(1 + (self.doc_count - count + 0.5) / (count + 0.5))
+            docs = self.posting_docs[offset:offset + count]
+            freqs = self.posting_freqs[offset:offset + count]
+            for number, tf in zip(docs, freqs):
+                weight = idf * tf * (BM25_K1 + 1) / (tf + norm + scale * lengths[number])
+                scores[number] = scores.get(number, 0.0) + weight
+        return scores
+
+    def _filtered_candidates(self, clauses):
+        """Documents that can match: the narrowest clause answerable from ids or postings, else all."""
+        best = None
+        for alternatives in clauses:
+            numbers = set()
+            for field, value, collection in alternatives:
+                if field == "id" and not collection:
+                    number = self._id_lookup.get(value)
+                    if number is not None:
+                        numbers.add(number)
+                elif collection and field in TABLE_FIELDS and _TOKEN.fullmatch(value):
+                    # Table names are indexed as whole tokens; postings are a superset
+                    # of the exact (case-sensitive) matches, which _matches checks
+                    offset, count = self.terms.get(value.casefold(), (0, 0))
+                    numbers.update(self.posting_docs[offset:offset + count])
+                else:
+                    break
+            else:
+                if best is None or len(numbers) < len(best):
+                    best = numbers
+        return range(self.doc_count) if best is None else sorted(best)
+
+    def _matches(self, number, clauses):
+        document = None
+        for alternatives in clauses:
+            for field, value, collection in alternatives:
+                if field == "id" and not collection:
+                    matched = self.ids[number] == value
+                elif field == "type" and not collection:
+                    matched = self.types[number] == value
+                else:
+                    document = document or self.document(number)
+                    actual = document.get(field)
+                    matched = value in (actual or ()) if collection else actual == value
+                if matched:
+                    break
+            else:
+                return False
+        return True
+
+
+def build_index_bytes(entries_by_blob):
+    """Serialize documents into the index format read by ``LocalSearchIndex``."""
+    files = sorted(entries_by_blob)
+    ids = []
+    types = []
+    doc_lengths = array("I")
+    doc_files = array("i")
+    stored_offsets = array("Q", [0])
+    stored = []
+    stored_size = 0
+    postings = {}
+
+    for file_number, blob_name in enumerate(files):
+        for document, tables in entries_by_blob[blob_name]:
+            number = len(ids)
+            ids.append(document["id"])
+            types.append(document.get("type"))
+            tokens = tokenize(" ".join([
+                str(document.get("name") or ""),
+                str(document.get("description") or ""),
+                " ".join(tables)
+            ]))
+            frequencies = {}
+            for token in tokens:
+                frequencies[token] = frequencies.get(token, 0) + 1
+            for token, tf in frequencies.items():
+                postings.setdefault(token, []).append((number, tf))
+            doc_lengths.append(len(tokens))
+            doc_files.append(file_number)
+            payload = json.dumps([document, list(tables)], separators=(",", ":"), default=str).encode("utf-8")
+            stored.append(payload)
+            stored_size += len(payload)
+            stored_offsets.append(stored_size)
+
+    terms = {}
+    posting_docs = array("I")
+    posting_freqs = array("I")
+    for token in sorted(postings):
+        terms[token] = [len(posting_docs), len(postings[token])]
+        for number, tf in postings[token]:
+            posting_docs.append(number)
+            posting_freqs.append(tf)
+
+    header = json.dumps({
+        "files": files,
+        "ids": ids,
+        "types": types,
+        "terms": terms,
+        "avgdl": sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0,
+        "postings": len(posting_docs)
+    }, separators=(",", ":")).encode("utf-8")
+    # Pad so the 8-byte stored offsets that follow stay aligned in the mapped file
+    header += b" " * (-(8 + len(header)) % 8)
+    columns = [doc_lengths, doc_files, stored_offsets, posting_docs, posting_freqs]
+    return b"".join(
+        [FORMAT_MAGIC, struct.pack("<I", len(header)), header]
+        + [_aligned_bytes(column) for column in columns]
+        + stored
+    )
+
+
+def merge_local_index(previous, entries_by_blob, removed=(), incremental=True):
+    """Index for this run: fresh entries replace those of re-parsed exports, removed ones are dropped."""
+    entries = previous.entries_by_blob() if previous is not None and incremental else {}
+    for blob_name in removed:
+        entries.pop(blob_name, None)
+    entries.update(entries_by_blob)
+    return LocalSearchIndex.build(entries)
+
+
+def save_local_index(container_client, index_name, index):
+    blob_client = container_client.get_blob_client(get_local_index_blob_name(index_name))
+    blob_client.upload_blob(bytes(index.buffer), overwrite=True)
+
+
+class LocalIndexCache:
+    """Per-worker memory-mapped copy of each index, re-downloaded when its blob's ETag changes.
+
+    Downloads land in a temp file that is unlinked as soon as it is mapped, so
+    a replaced index frees its disk space once its last reader lets go of it.
+    Only one thread refreshes an index at a time, outside the cache lock;
+    other readers keep getting the copy they have until the new one is in.
+    """
+
+    def __init__(self, directory=None, refresh_seconds=60):
+        self.directory = directory or tempfile.gettempdir()
+        self.refresh_seconds = refresh_seconds
+        self._indexes = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def get(self, container_client, index_name, refresh=False):
+        """The current index, or ``None`` if ``process-xml`` has not built one yet."""
+        while True:
+            with self._lock:
+                entry = self._indexes.get(index_name)
+                if entry is not None and not refresh and time.monotonic() - entry[2] < self.refresh_seconds:
+                    return entry[0]
+                loading = self._loading.get(index_name)
+                if loading is None:
+                    loading = self._loading[index_name] = threading.Event()
+                    break
+            if entry is not None and not refresh:
+                return entry[0]
+            # Nothing to serve yet, or the caller needs the latest: wait for the refresh in flight
+            loading.wait()
+        try:
+            return self._load(container_client, index_name, entry)
+        finally:
+            with self._lock:
+                del self._loading[index_name]
+            loading.set()
+
+    def put(self, index_name, index):
+        """Install an index this worker just built; the next refresh picks up its ETag."""
+        with self._lock:
+            self._indexes[index_name] = (index, None, time.monotonic())
+
+    def _load(self, container_client, index_name, entry):
+        blob_client = container_client.get_blob_client(get_local_index_blob_name(index_name))
+        if not blob_client.exists():
+            index, etag = None, None
+        else:
+            etag = blob_client.get_blob_properties().etag
+            if entry is not None and entry[1] == etag:
+                index = entry[0]
+            else:
+                index = self._download(blob_client, index_name)
+        with self._lock:
+            self._indexes[index_name] = (index, etag, time.monotonic())
+        return index
+
+    def _download(self, blob_client, index_name):
+        fd, path = tempfile.mkstemp(prefix="local-index-", suffix=".lix", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in blob_client.download_blob().chunks():
+                    f.write(chunk)
+            return LocalSearchIndex.open(path)
+        except (ValueError, OSError) as e:
+            logging.error(f"Ignoring unreadable local search index for {index_name}: {str(e)}")
+            return None
+        finally:
+            # The mapping keeps the data readable; the file itself is not needed any more
+            os.remove(path)
+
+
+local_index_cache = LocalIndexCache(
+    directory=os.getenv("LOCAL_INDEX_DIR"),
+    refresh_seconds=float(os.getenv("LOCAL_INDEX_REFRESH_SECONDS", 60))
+)
+
+
+def _aligned_bytes(column):
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    data = column.tobytes()
+    return data + b"\0" * (-len(data) % 8)
+
+
+def _column(view, position, typecode, count):
+    """Zero-copy typed view of a column (a byte-swapped copy on big-endian hosts)."""
+    size = count * array(typecode).itemsize
+    raw = view[position:position + size]
+    if sys.byteorder == "big":
+        column = array(typecode)
+        column.frombytes(raw)
+        column.byteswap()
+    else:
+        column = raw.cast(typecode)
+    return column, position + size + (-size % 8)
@@ -0,0 +1,225 @@
+"""
+Lightweight in-process instrumentation for the hot paths.
+
+Latency histograms (fixed buckets, cumulative like Prometheus) and counters
+are kept per worker in one registry. ``/metrics`` renders them in the
+Prometheus text format, together with values read from collectors such as
+the cache statistics at scrape time. Recording is a bucket bisect and a few
+additions under one lock, so it can stay on under load; set
+``METRICS_ENABLED=false`` to turn it off.
+
+Timings recorded while a route handler wrapped with ``instrumented`` runs are
+also collected per request and returned in a ``Server-Timing`` header.
+"""
+
+import os
+import time
+import asyncio
+import functools
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "http_request_seconds": "Route handler latency",
+    "ingest_stage_seconds": "Busy time of one ingestion stage call (list, download, parse, extract, queue_wait, upload, ...)",
+    "ingest_bytes_total": "Bytes downloaded from blob storage by ingestion",
+    "search_request_seconds": "Latency of search and lookup calls by backend",
+    "search_upload_bytes_total": "Serialized bytes sent in indexing batches",
+    "search_upload_documents_total": "Documents sent to the index by outcome",
+    "search_upload_retries_total": "Indexing batch retries after throttling or transient errors",
+    "ingest_documents_total": "Documents produced by ingestion by outcome",
+    "ingest_prefilter_total": "Exports classified before download by outcome (workflows, no_workflows, not_export, undecided)",
+    "coalesced_requests_total": "Backend calls avoided by joining an identical in-flight call",
+    "batch_queries_total": "Queries run through the batch route by route and status",
+    "admission_shed_total": "Requests and backend calls turned away by admission control by route and reason",
+    "admission_stale_answers_total": "Queries answered from an expired result cache entry because they were not admitted",
+    "result_cache_lookups_total": "Result cache lookups by route and outcome",
+    "parse_cache_lookups_total": "Parse cache lookups by outcome (hits, misses)",
+    "admission_concurrency_limit": "Current adaptive concurrency limit per backend",
+    "admission_in_flight": "Backend calls in flight under admission control"
+}
+
+# Spans of the request being handled, for its Server-Timing header
+_spans = ContextVar("metrics_spans", default=None)
+
+
+class MetricsRegistry:
+    """Thread-safe histograms and counters keyed by metric name and label values."""
+
+    def __init__(self, enabled=True, buckets=LATENCY_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._collectors = []
+
+    def observe(self, name, seconds, **labels):
+        """Record a duration in the ``name`` histogram."""
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        position = bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][position] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def inc(self, name, value=1, **labels):
+        """Add ``value`` to the ``name`` counter."""
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name, span=None, **labels):
+        """Time a block into the ``name`` histogram and, if ``span`` is given, the request's Server-Timing."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe(name, seconds, **labels)
+            if span:
+                add_span(span, seconds)
+
+    def add_collector(self, collect):
+        """Register a callable returning ``{metric name: value or {label tuple: value}}`` at scrape time.
+
+        Names ending in ``_total`` are monotonic counts and are exported as counters, the rest as gauges.
+        """
+        self._collectors.append(collect)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {key: (list(value[0]), value[1], value[2]) for key, value in self._histograms.items()}
+            counters = dict(self._counters)
+        lines = []
+
+        for name in sorted({key[0] for key in histograms}):
+            _header(lines, name, "histogram")
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        for name in sorted({key[0] for key in counters}):
+            _header(lines, name, "counter")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+
+        for collect in self._collectors:
+            for name, value in sorted(collect().items()):
+                _header(lines, name, "counter" if name.endswith("_total") else "gauge")
+                samples = value.items() if isinstance(value, dict) else [((), value)]
+                for labels, sample in samples:
+                    lines.append(f"{name}{_labels(labels)} {float(sample):g}")
+        return "\n".join(lines) + "\n"
+
+
+def add_span(name, seconds, description=None):
+    """Add a timing to the current request's Server-Timing header, if a request is being instrumented."""
+    spans = _spans.get()
+    if spans is not None:
+        spans.append((name, seconds, description))
+
+
+def server_timing(spans):
+    """``Server-Timing`` header value; repeated names are summed."""
+    merged = {}
+    for name, seconds, description in spans:
+        previous = merged.get(name)
+        merged[name] = (seconds + (previous[0] if previous else 0.0), description or (previous and previous[1]))
+    parts = []
+    for name, (seconds, description) in merged.items():
+        part = f"{name};dur={seconds * 1000:.1f}"
+        if description:
+            part += f';desc="{description}"'
+        parts.append(part)
+    return ", ".join(parts)
+
+
+def instrumented(route):
+    """Record a route handler's latency by status and attach a ``Server-Timing`` header to its response."""
+    def decorate(handler):
+        def finish(response, start, token, spans):
+            seconds = time.perf_counter() - start
+            _spans.reset(token)
+            status = getattr(response, "status_code", 500)
+            metrics.observe("http_request_seconds", seconds, route=route, status=str(status))
+            if response is not None and metrics.enabled:
+                response.headers["Server-Timing"] = server_timing(spans + [("total", seconds, None)])
+            return response
+
+        if asyncio.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def wrapper(*args, **kwargs):
+                spans = []
+                token = _spans.set(spans)
+                start = time.perf_counter()
+                response = None
+                try:
+                    response = await handler(*args, **kwargs)
+                finally:
+                    finish(response, start, token, spans)
+                return response
+        else:
+            @functools.wraps(handler)
+            def wrapper(*args, **kwargs):
+                spans = []
+                token = _spans.set(spans)
+                start = time.perf_counter()
+                response = None
+                try:
+                    response = handler(*args, **kwargs)
+                finally:
+                    finish(response, start, token, spans)
+                return response
+        return wrapper
+    return decorate
+
+
+def _label_key(labels):
+    # Most call sites pass zero or one label, which needs no sorting
+    return tuple(sorted(labels.items())) if len(labels) > 1 else tuple(labels.items())
+
+
+def _header(lines, name, kind):
+    if name in HELP:
+        lines.append(f"# HELP {name} {HELP[name]}")
+    lines.append(f"# TYPE {name} {kind}")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+metrics = MetricsRegistry(enabled=os.getenv("METRICS_ENABLED", "true").lower() != "false")
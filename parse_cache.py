@@ -0,0 +1,145 @@
+"""
+Content-addressed cache of parse results.
+
+Teams often re-export identical folders under new blob names. Parsed
+``WorkflowTable``s are stored on local disk under a digest of the export's
+bytes, so a blob whose content was seen before skips parsing, and skips the
+download too when the listing carries a Content-MD5. Tables do not depend on
+the blob name (it only feeds the document ids), so a hit is re-labelled with
+the new name. The store is bounded by total size and evicts least recently
+used entries.
+
+Entries are a format version byte followed by ``WorkflowTable.to_bytes``, so
+no pickle is involved. An entry in any other format, such as one written by
+an older version of the table layout, is dropped and counted as a miss.
+"""
+
+import os
+import zlib
+import struct
+import hashlib
+import logging
+import tempfile
+import threading
+
+# Bump when the entry layout changes; entries with another version are misses
+CACHE_FORMAT_VERSION = b"\x02"
+
+
+def content_digest(data):
+    return "sha256-" + hashlib.sha256(data).hexdigest()
+
+
+def listed_digest(blob):
+    """Digest from a listed blob's Content-MD5, if the service has one for it."""
+    content_settings = getattr(blob, "content_settings", None)
+    content_md5 = getattr(content_settings, "content_md5", None)
+    return "md5-" + bytes(content_md5).hex() if content_md5 else None
+
+
+class ParseCache:
+    """Size-bounded on-disk store of serialized ``WorkflowTable``s keyed by content digest."""
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, enabled=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._size = None
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            directory=os.getenv("PARSE_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "xml-parse-cache"),
+            max_bytes=int(os.getenv("PARSE_CACHE_MAX_BYTES", 512 * 1024 * 1024)),
+            enabled=os.getenv("PARSE_CACHE_ENABLED", "true").lower() != "false"
+        )
+
+    def get(self, digest, xml_file):
+        """The cached table for ``digest`` labelled as ``xml_file``, or ``None``."""
+        from workflow_model import WorkflowTable
+        path = self._path(digest)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            if data[:1] != CACHE_FORMAT_VERSION:
+                raise ValueError("written in another cache format")
+            table = WorkflowTable.from_bytes(memoryview(data)[1:])
+            os.utime(path)
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        except (OSError, zlib.error, struct.error, ValueError, KeyError, TypeError) as e:
+            logging.error(f"Dropping unreadable parse cache entry {digest}: {str(e)}")
+            self._discard(path)
+            self._count("misses")
+            return None
+        self._count("hits")
+        table.xml_file = xml_file
+        return table
+
+    def put(self, digest, table):
+        """Store a table and evict old entries if the cache is over its size limit."""
+        data = CACHE_FORMAT_VERSION + table.to_bytes()
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(partial, "wb") as f:
+            f.write(data)
+        with self._lock:
+            existing = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(partial, path)
+            self._stats["stores"] += 1
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data) - existing
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, enabled=self.enabled, bytes=self._size, max_bytes=self.max_bytes)
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest[-2:], digest + ".tbl")
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith(".tbl"):
+                    yield os.path.join(dirpath, filename)
+
+    def _scan_size(self):
+        return sum(os.path.getsize(path) for path in self._entries())
+
+    def _evict(self):
+        """Remove least recently used entries until the cache is at 90% of its limit."""
+        entries = []
+        for path in self._entries():
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            self._discard(path)
+            self._size -= size
+            self._stats["evictions"] += 1
+
+    def _discard(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _count(self, outcome):
+        with self._lock:
+            self._stats[outcome] += 1
+
+
+parse_cache = ParseCache.from_env()
@@ -0,0 +1,168 @@
+"""
+Process pool for CPU-bound XML parsing with shared-memory byte handoff.
+
+Parsing holds the GIL, so exports are parsed in worker processes. Passing
+downloaded bytes to ``ProcessPoolExecutor.submit`` pickles them through a
+pipe: a large export is copied several times and the parent blocks while it
+is written. Instead, a download is written chunk by chunk straight into a
+``SharedBuffer`` (a POSIX shared memory segment, or a memory-mapped temp file
+when shared memory is unavailable or too small) and only the buffer's name is
+sent to a worker. The worker maps it and parses the bytes in place. It
+returns the compact ``WorkflowTable`` and never touches the bytes again.
+
+``handoff="pickle"`` keeps the plain pickling behaviour, for comparison.
+
+Workers are started from a fork server (or spawned where there is none),
+never forked from the host. Workers start on the first ``submit``, from a
+downloader thread while the uploader, other downloaders and the host's
+threads are running. A child forked at that point can inherit locks held
+by those threads (logging, the shared memory resource tracker, connection
+pools) and hang.
+"""
+
+import os
+import mmap
+import time
+import logging
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from xml_extractor import iter_workflow_buckets_from_chunks
+from workflow_model import WorkflowTable
+
+HANDOFFS = ("shared_memory", "mmap", "pickle")
+
+
+def parse_blob_bytes(data, xml_filename):
+    """Parse a whole export (``bytes`` or any buffer) and return (``WorkflowTable``, parse seconds)."""
+    start = time.perf_counter()
+    table = WorkflowTable(xml_filename)
+    for bucket in iter_workflow_buckets_from_chunks([data], xml_filename):
+        table.append(bucket)
+    return table.freeze(), time.perf_counter() - start
+
+
+class SharedBuffer:
+    """Writable staging area for one download that a worker process can map by name."""
+
+    def __init__(self, size, handoff="shared_memory", spill_dir=None):
+        self.size = size
+        self.length = 0
+        self.kind = handoff
+        self._shm = None
+        self._mmap = None
+        self._path = None
+        if handoff == "shared_memory":
+            try:
+                self._shm = shared_memory.SharedMemory(create=True, size=max(1, size))
+                self.view = self._shm.buf
+                return
+            except OSError as e:
+                # /dev/shm is often small in containers; fall back to a mapped file
+                logging.warning(f"Shared memory unavailable for {size} bytes, using a temp file: {str(e)}")
+                self.kind = "mmap"
+        if self.kind == "mmap":
+            fd, self._path = tempfile.mkstemp(prefix="xml-parse-", suffix=".buf", dir=spill_dir)
+            with os.fdopen(fd, "r+b") as f:
+                f.truncate(max(1, size))
+                self._mmap = mmap.mmap(f.fileno(), max(1, size))
+            self.view = memoryview(self._mmap)
+        else:
+            self.view = memoryview(bytearray(size))
+
+    def write(self, chunk):
+        end = self.length + len(chunk)
+        if end > self.size:
+            raise ValueError(f"Download is larger than its announced size of {self.size} bytes")
+        self.view[self.length:end] = chunk
+        self.length = end
+
+    def data(self):
+        """The bytes written so far, without copying."""
+        return self.view[:self.length]
+
+    def handle(self):
+        """Picklable description a worker uses to map the buffer."""
+        if self.kind == "shared_memory":
+            return ("shared_memory", self._shm.name, self.length)
+        if self.kind == "mmap":
+            self._mmap.flush()
+            return ("mmap", self._path, self.length)
+        return ("bytes", bytes(self.data()), self.length)
+
+    def close(self):
+        self.view.release()
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            os.remove(self._path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ParsePool:
+    """``ProcessPoolExecutor`` of parse workers fed through ``SharedBuffer``s."""
+
+    def __init__(self, workers, handoff="shared_memory", spill_dir=None):
+        if handoff not in HANDOFFS:
+            raise ValueError(f"Unknown parse handoff '{handoff}'")
+        self.workers = workers
+        self.handoff = handoff
+        self.spill_dir = spill_dir
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=worker_context())
+
+    def buffer(self, size):
+        return SharedBuffer(size, self.handoff, self.spill_dir)
+
+    def submit(self, buffer, xml_file):
+        """Parse a filled buffer in a worker; the future resolves to (``WorkflowTable``, parse seconds)."""
+        return self._executor.submit(parse_shared, buffer.handle(), xml_file)
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+
+def worker_context():
+    """Multiprocessing context that starts workers without forking the (multi-threaded) host."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # Workers forked from the server already have the parser imported
+        context.set_forkserver_preload(["parse_pool"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def parse_shared(handle, xml_file):
+    """Worker side of ``ParsePool.submit``: map the buffer, parse it in place and release it."""
+    kind, source, length = handle
+    if kind == "bytes":
+        return parse_blob_bytes(source, xml_file)
+    if kind == "shared_memory":
+        # Pool workers share the parent's resource tracker, so attaching does not
+        # take ownership; the parent unlinks the segment
+        shm = shared_memory.SharedMemory(name=source)
+        try:
+            view = shm.buf[:length]
+            try:
+                return parse_blob_bytes(view, xml_file)
+            finally:
+                view.release()
+        finally:
+            shm.close()
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)[:length]
+        try:
+            return parse_blob_bytes(view, xml_file)
+        finally:
+            view.release()
+
@@ -0,0 +1,138 @@
+"""
+In-process TTL/LRU cache for read route responses.
+
+Copilot Studio agents repeat the same workflow and table lookups many times
+within a conversation. Serialized response bodies are cached per worker,
+keyed on route, normalized query text and filter, so repeats are answered
+without a round trip to Azure AI Search. Entries expire after a per-route TTL
+and the least recently used ones are evicted once the entry or byte cap is
+reached; expired entries stay until then, so ``get_stale`` can still answer
+while the search service is overloaded. ``process-xml`` invalidates the
+cache after it changes the index.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+DEFAULT_ROUTE_TTLS = {
+    "search-workflow": 300,
+    "debug-table": 300,
+    "get-workflow-details": 600
+}
+
+
+def normalize_query(text):
+    """Case- and whitespace-insensitive form of free-text query input."""
+    return " ".join(str(text).split()).casefold()
+
+
+class ResultCache:
+    """Thread-safe LRU cache with per-route TTLs and a total size cap."""
+
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024, default_ttl=300, route_ttls=None, enabled=True):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.route_ttls = dict(route_ttls or {})
+        self.enabled = enabled
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "stale_hits": 0, "evictions": 0, "invalidations": 0}
+        self._route_stats = {}
+
+    @classmethod
+    def from_env(cls):
+        route_ttls = {}
+        for route, ttl in DEFAULT_ROUTE_TTLS.items():
+            setting = "RESULT_CACHE_TTL_" + route.upper().replace("-", "_")
+            route_ttls[route] = float(os.getenv(setting, ttl))
+        return cls(
+            max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 1024)),
+            max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+            route_ttls=route_ttls,
+            enabled=os.getenv("RESULT_CACHE_ENABLED", "true").lower() != "false"
+        )
+
+    def get(self, route, query, filter=None):
+        """Return the cached value for the lookup, or ``None`` on a miss."""
+        if not self.enabled:
+            return None
+        key = (route, query, filter)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                # Kept until evicted or replaced, for get_stale
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self._count(route, "misses")
+                return None
+            self._entries.move_to_end(key)
+            self._count(route, "hits")
+            return entry[1]
+
+    def get_stale(self, route, query, filter=None, max_stale=None):
+        """Return the cached value even if it expired up to ``max_stale`` seconds ago (default: no bound)."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get((route, query, filter))
+            if entry is None or (max_stale is not None and time.monotonic() - entry[0] > max_stale):
+                return None
+            self._stats["stale_hits"] += 1
+            return entry[1]
+
+    def put(self, route, query, value, filter=None):
+        """Cache a serialized response body for the lookup."""
+        if not self.enabled:
+            return
+        key = (route, query, filter)
+        size = len(value) + len(route) + len(query) + len(filter or "")
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + self.route_ttls.get(route, self.default_ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def invalidate(self, route=None):
+        """Drop every entry, or only those of ``route``."""
+        with self._lock:
+            keys = [key for key in self._entries if route is None or key[0] == route]
+            for key in keys:
+                self._remove(key)
+            self._stats["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                enabled=self.enabled,
+                hit_ratio=round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_entries=self.max_entries,
+                max_bytes=self.max_bytes,
+                routes={route: dict(counts) for route, counts in self._route_stats.items()}
+            )
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _count(self, route, outcome):
+        self._stats[outcome] += 1
+        counts = self._route_stats.setdefault(route, {"hits": 0, "misses": 0})
+        counts[outcome] += 1
+
+
+result_cache = ResultCache.from_env()
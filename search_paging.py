@@ -0,0 +1,145 @@
+"""
+Paging, field projection and NDJSON output for the search read routes.
+
+Read routes return one bounded page of results instead of every match. The
+request body may carry ``top``, ``skip`` and a ``continuation_token`` from the
+previous page, plus ``select`` to project only the fields the caller needs, so
+large fields such as ``full_content`` never leave the search service unless
+asked for. ``"format": "ndjson"`` renders one document per line followed by a
+``@page`` trailer line, so clients can process results as they arrive.
+"""
+
+import re
+import json
+import base64
+import hashlib
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+# Azure AI Search rejects $skip values above this
+MAX_SKIP = 100000
+NDJSON_MIMETYPE = "application/x-ndjson"
+FORMATS = ("json", "ndjson")
+
+# Fields written by the ingestion pipeline; returned when the caller sends no ``select``
+DEFAULT_SELECT = ["id", "name", "type", "description"]
+# Exact table lookups also return the structured fields they matched on. Only
+# indexes with the structured fields can answer those filters, so selecting
+# them cannot fail on an older index the way it would for DEFAULT_SELECT.
+TABLE_SELECT = DEFAULT_SELECT + ["workflow_name", "mapping_name", "session_name", "source_tables", "target_tables", "xml_file"]
+
+_FIELD_NAME = re.compile(r"^[A-Za-z][A-Za-z0-9_]*$")
+
+
+class PageRequest:
+    """Validated paging, projection and output options for one read request."""
+
+    def __init__(self, top=DEFAULT_PAGE_SIZE, skip=0, select=None, format="json", fingerprint=""):
+        self.top = top
+        self.skip = skip
+        self.select = select
+        self.format = format
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_body(cls, data, query, filter=None, default_select=DEFAULT_SELECT):
+        """Build a page request from a route's JSON body; raises ``ValueError`` on bad input."""
+        top = _int_option(data, "top", DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        skip = _int_option(data, "skip", 0, 0, MAX_SKIP)
+        select = _select_option(data.get("select"), default_select)
+        output_format = str(data.get("format", "json")).lower()
+        if output_format not in FORMATS:
+            raise ValueError(f"'format' must be one of {', '.join(FORMATS)}")
+
+        fingerprint = _fingerprint(query, filter, select)
+        token = data.get("continuation_token")
+        if token:
+            skip = _decode_token(token, fingerprint)
+        return cls(top, skip, select, output_format, fingerprint)
+
+    @property
+    def mimetype(self):
+        return NDJSON_MIMETYPE if self.format == "ndjson" else "application/json"
+
+    def cache_key(self, query):
+        """Result cache key for this page of ``query``."""
+        fields = ",".join(self.select) if self.select else "*"
+        return f"{query}|top={self.top}|skip={self.skip}|select={fields}|format={self.format}"
+
+    def search_kwargs(self):
+        """Keyword arguments for ``SearchClient.search``, over-fetching one result to detect a next page."""
+        return {"select": self.select, "top": self.top + 1, "skip": self.skip}
+
+    def next_token(self):
+        next_skip = self.skip + self.top
+        if next_skip > MAX_SKIP:
+            return None
+        payload = json.dumps({"skip": next_skip, "fp": self.fingerprint}).encode("utf-8")
+        return base64.urlsafe_b64encode(payload).decode("ascii")
+
+    def render(self, key, documents):
+        """Serialize a page fetched with ``search_kwargs`` under ``key`` (JSON) or as NDJSON lines."""
+        has_more = len(documents) > self.top
+        documents = documents[:self.top]
+        page = {
+            "count": len(documents),
+            "skip": self.skip,
+            "continuation_token": self.next_token() if has_more else None
+        }
+        if self.format == "ndjson":
+            lines = [json.dumps(doc, default=str) for doc in documents]
+            lines.append(json.dumps({"@page": page}))
+            return "\n".join(lines) + "\n"
+        return json.dumps(dict({key: documents}, **page), default=str)
+
+
+def table_filter(table_name):
+    """OData filter for workflows that read or write ``table_name`` (exact, case-sensitive)."""
+    value = str(table_name).replace("'", "''")
+    return f"(source_tables/any(t: t eq '{value}') or target_tables/any(t: t eq '{value}'))"
+
+
+def _int_option(data, name, default, minimum, maximum):
+    value = data.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be an integer")
+    if not minimum <= value <= maximum:
+        raise ValueError(f"'{name}' must be between {minimum} and {maximum}")
+    return value
+
+
+def _select_option(value, default_select):
+    if value is None:
+        return list(default_select) if default_select else None
+    if isinstance(value, str):
+        value = [field.strip() for field in value.split(",")]
+    if not isinstance(value, list) or not value:
+        raise ValueError("'select' must be a list of field names or a comma-separated string")
+    if value == ["*"]:
+        return None
+    for field in value:
+        if not isinstance(field, str) or not _FIELD_NAME.match(field):
+            raise ValueError(f"Invalid field name in 'select': {field!r}")
+    return value
+
+
+def _fingerprint(query, filter, select):
+    """Short digest tying a continuation token to the query it was issued for."""
+    fields = ",".join(select) if select else "*"
+    return hashlib.sha1(f"{query}\0{filter or ''}\0{fields}".encode("utf-8")).hexdigest()[:16]
+
+
+def _decode_token(token, fingerprint):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(str(token).encode("ascii")))
+        skip = int(payload["skip"])
+        issued_for = payload["fp"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid 'continuation_token'")
+    if issued_for != fingerprint:
+        raise ValueError("'continuation_token' was issued for a different query")
+    if not 0 <= skip <= MAX_SKIP:
+        raise ValueError("Invalid 'continuation_token'")
+    return skip
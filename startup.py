@@ -0,0 +1,124 @@
+"""
+Cold start: deferred imports and optional warm-up.
+
+``function_app`` loads only the Functions runtime, the shared client getters
+and the small modules of the read path. The Azure SDKs (see ``clients``), the
+XML parser and the ingestion pipeline are imported by the first request that
+needs them, so a cold health check or cached search does not wait for them.
+
+The price is paid by the first ingestion or service call instead. Where that
+matters, ``WARMUP_MODE`` moves it back in front of traffic:
+
+``off`` (default)
+    Import and build everything on first use.
+``background``
+    Right after the app loads, a daemon thread imports the deferred modules,
+    builds the shared clients and opens one connection to each service while
+    the host is already serving.
+``blocking``
+    Do the same before the app finishes loading, like the old eager imports.
+
+The ``warmup`` route runs the same steps on demand, e.g. as the slot swap
+warm-up ping.
+"""
+
+import os
+import time
+import logging
+import importlib
+import threading
+
+from clients import get_search_client, get_search_index_client, get_container_client
+
+WARMUP_MODES = ("off", "background", "blocking")
+
+# Modules that routes import on first use
+DEFERRED_MODULES = (
+    "azure.search.documents",
+    "azure.search.documents.aio",
+    "azure.search.documents.indexes",
+    "azure.search.documents.indexes.models",
+    "azure.storage.blob",
+    "azure.storage.blob.aio",
+    "aiohttp",
+    "ingestion",
+    "ingestion_jobs",
+    "lineage_graph",
+    "catalog_snapshot",
+    "index_versions",
+    "blob_prefilter",
+    "document_lookup",
+    "xml_extractor"
+)
+
+_lock = threading.Lock()
+_last_warm_up = None
+
+
+def get_warmup_mode():
+    mode = os.getenv("WARMUP_MODE", "off").lower()
+    if mode not in WARMUP_MODES:
+        logging.warning(f"Unknown WARMUP_MODE '{mode}', not warming up")
+        return "off"
+    return mode
+
+
+def warm_up(modules=DEFERRED_MODULES, connect=True):
+    """Import ``modules`` and build the shared sync clients; returns the seconds spent per step.
+
+    Unconfigured services are skipped and failures are logged, never raised:
+    warm-up only moves work earlier, it must not stop the app from serving.
+    """
+    global _last_warm_up
+    with _lock:
+        steps = {}
+        for name in modules:
+            start = time.perf_counter()
+            try:
+                importlib.import_module(name)
+                steps[f"import:{name}"] = round(time.perf_counter() - start, 4)
+            except ImportError as e:
+                logging.warning(f"Warm-up could not import {name}: {str(e)}")
+                steps[f"import:{name}"] = None
+
+        clients = {
+            "search": get_search_client,
+            "search-index": get_search_index_client,
+            "container": get_container_client
+        }
+        # One cheap call per service opens a pooled, TLS-established connection
+        probes = {
+            "search": lambda client: client.get_document_count(),
+            "container": lambda client: client.exists()
+        }
+        for name, build in clients.items():
+            start = time.perf_counter()
+            try:
+                client = build()
+                if connect and name in probes:
+                    probes[name](client)
+                steps[f"client:{name}"] = round(time.perf_counter() - start, 4)
+            except ValueError:
+                steps[f"client:{name}"] = None  # not configured
+            except Exception as e:
+                logging.warning(f"Warm-up of the {name} client failed: {str(e)}")
+                steps[f"client:{name}"] = None
+
+        _last_warm_up = {"finished": time.time(), "seconds": round(sum(v for v in steps.values() if v), 4), "steps": steps}
+        logging.info(f"Warm-up finished in {_last_warm_up['seconds']}s")
+        return _last_warm_up
+
+
+def last_warm_up():
+    """Result of the most recent warm-up in this worker, or ``None``."""
+    return _last_warm_up
+
+
+def start_warm_up(mode=None):
+    """Warm up according to ``mode`` (default: WARMUP_MODE); called once when the app loads."""
+    mode = mode or get_warmup_mode()
+    if mode == "blocking":
+        warm_up()
+    elif mode == "background":
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    return mode
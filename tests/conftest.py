@@ -0,0 +1,41 @@
+"""
+Shared fixtures over the ``local_backends`` stand-ins for Blob Storage and
+Azure AI Search, so the tests need no Azure SDK or credentials.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_backends import LocalSearchClient, LocalAsyncSearchClient, LocalSearchIndexClient  # noqa: E402
+from ingestion import get_pipeline_config  # noqa: E402
+from helpers import Exports  # noqa: E402
+
+
+@pytest.fixture
+def exports(tmp_path):
+    return Exports(str(tmp_path / "container"))
+
+
+@pytest.fixture
+def search_client():
+    return LocalSearchClient()
+
+
+@pytest.fixture
+def async_search_client(search_client):
+    return LocalAsyncSearchClient(search_client)
+
+
+@pytest.fixture
+def index_service():
+    return LocalSearchIndexClient()
+
+
+@pytest.fixture
+def pipeline_config():
+    """In-process pipeline settings, so tests do not start parse worker processes."""
+    return get_pipeline_config({"parse_workers": 0, "download_workers": 2, "prefilter": False})
@@ -0,0 +1,95 @@
+"""
+Test helpers: PowerCenter exports written as blobs of a local container.
+"""
+
+import os
+import threading
+
+from local_backends import LocalContainerClient, LocalAsyncContainerClient
+
+
+def export_xml(*workflows, folder="FOLDER_1"):
+    """A PowerCenter export with one WORKFLOW per ``(name, sources, targets)``."""
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<POWERMART CREATION_DATE="01/01/2024 00:00:00" REPOSITORY_VERSION="186.95">',
+        '<REPOSITORY NAME="REP_DEV">',
+        f'<FOLDER NAME="{folder}">'
+    ]
+    for name, sources, targets in workflows:
+        lines.append(f'<WORKFLOW NAME="{name}" MAPPINGNAME="m_{name}" SESSIONNAME="s_{name}">')
+        lines.extend(f'<SOURCE NAME="{source}"/>' for source in sources)
+        lines.extend(f'<TARGET NAME="{target}"/>' for target in targets)
+        lines.append('</WORKFLOW>')
+    lines.extend(['</FOLDER>', '</REPOSITORY>', '</POWERMART>'])
+    return "\n".join(lines)
+
+
+class Exports:
+    """A local blob container that exports are written to."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.container = LocalContainerClient(root)
+        self.async_container = LocalAsyncContainerClient(root)
+
+    def write(self, name, content, encoding="utf-8"):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding=encoding) as f:
+            f.write(content)
+        return name
+
+    def remove(self, name):
+        os.remove(os.path.join(self.root, name))
+
+    def listed(self):
+        """The listed ``.xml`` blobs, like process-xml lists them."""
+        return [blob for blob in self.container.list_blobs() if blob.name.lower().endswith(".xml")]
+
+
+def ingest(exports, search_client, index_name, config, incremental=False):
+    """Run ingestion the way process-xml does: diff against the manifest, ingest, finalize."""
+    from ingestion import run_ingestion_pipeline, StageTimings
+    from index_manifest import load_manifest, diff_manifest, known_document_hashes
+    from ingestion_jobs import finalize_ingestion
+    from blob_prefilter import load_prefilter
+
+    listed = exports.listed()
+    manifest = load_manifest(exports.container, index_name)
+    changed, _, removed = diff_manifest(manifest, listed)
+    if not incremental:
+        changed = listed
+    prefilter = load_prefilter(exports.container, changed) if config["prefilter"] else None
+    stats = run_ingestion_pipeline(
+        exports.container, [blob.name for blob in changed], search_client, config,
+        known_hashes=known_document_hashes(manifest, changed) if incremental else None,
+        prefilter=prefilter
+    )
+    if prefilter is not None:
+        prefilter.save(exports.container)
+    finalize_ingestion(
+        exports.container, search_client, index_name, manifest, changed, removed, stats, incremental, StageTimings()
+    )
+    return stats
+
+
+class BlockingDownloads:
+    """Container whose blob downloads wait until released."""
+
+    def __init__(self, container):
+        self._container = container
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def get_blob_client(self, name):
+        blob_client = self._container.get_blob_client(name)
+        download_blob = blob_client.download_blob
+
+        def blocking_download(*args, **kwargs):
+            self.started.set()
+            self.release.wait(5)
+            return download_blob(*args, **kwargs)
+        blob_client.download_blob = blocking_download
+        return blob_client
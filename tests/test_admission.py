@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest
+
+import admission as admission_module
+from admission import (
+    AdaptiveConcurrencyLimit, AdmissionController, Overloaded, TokenBucket, admission_route, admitted
+)
+
+
+class Clock:
+    """Real monotonic time plus ``offset``: the event loop reads the same clock, so it has to keep moving."""
+
+    def __init__(self, monotonic):
+        self.monotonic = monotonic
+        self.offset = 0.0
+
+    def __call__(self):
+        return self.monotonic() + self.offset
+
+
+class RequestError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(admission_module.time.monotonic)
+    monkeypatch.setattr(admission_module.time, "monotonic", clock)
+    return clock
+
+
+def test_token_bucket_allows_a_burst_then_refills_at_its_rate(clock):
+    bucket = TokenBucket(rate=2.0, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take() == pytest.approx(0.5, abs=0.01)
+    clock.offset += 0.5
+    assert bucket.take() == 0.0
+    # Idle time refills no more than the burst
+    clock.offset += 60
+    assert [bucket.take() for _ in range(4)][-1] == pytest.approx(0.5, abs=0.01)
+
+
+def test_limit_grows_additively_and_shrinks_multiplicatively(clock):
+    limit = AdaptiveConcurrencyLimit("search", maximum=10, minimum=2, latency_target=1.0)
+    limit.limit = 4.0
+
+    async def calls(seconds, count=1, throttled=False):
+        for _ in range(count):
+            await limit.acquire()
+            limit.release(seconds, throttled)
+
+    # One slot per ``limit`` fast calls
+    asyncio.run(calls(0.1, count=4))
+    assert limit.limit == pytest.approx(5.0, abs=0.1)
+    asyncio.run(calls(2.0))
+    assert limit.limit == pytest.approx(5.0 * 0.9, abs=0.1)
+    # A second slow call within the same latency_target window does not count again
+    before = limit.limit
+    asyncio.run(calls(2.0))
+    assert limit.limit == before
+    clock.offset += 1.0
+    asyncio.run(calls(0.1, throttled=True))
+    assert limit.limit == pytest.approx(before * 0.5)
+    clock.offset += 1.0
+    asyncio.run(calls(0.1, throttled=True))
+    assert limit.limit == 2
+    assert limit.stats()["slow"] == 2 and limit.stats()["throttled"] == 2
+
+
+def test_limit_queues_callers_and_rejects_them_when_full(clock):
+    limit = AdaptiveConcurrencyLimit("search", maximum=1, max_wait=0.05, max_queue=1)
+
+    async def run():
+        await limit.acquire()
+        waiter = asyncio.ensure_future(limit.acquire())
+        await asyncio.sleep(0)
+        assert limit.saturated()
+        # The queue holds one caller
+        with pytest.raises(Overloaded, match="queue full"):
+            await limit.acquire()
+        limit.release(0.1)
+        await waiter
+        # Nobody releases this time, so the next caller times out
+        with pytest.raises(Overloaded, match="queue timeout") as raised:
+            await limit.acquire()
+        assert raised.value.status_code == 503
+        limit.release(0.1)
+
+    asyncio.run(run())
+    assert limit.stats()["rejected"] == 2
+    assert limit.stats()["in_flight"] == 0
+
+
+def test_limit_stays_saturated_for_the_cooldown_after_throttling(clock):
+    limit = AdaptiveConcurrencyLimit("search", maximum=4, cooldown=10.0)
+
+    async def throttled_call():
+        await limit.acquire()
+        limit.release(0.1, throttled=True)
+
+    asyncio.run(throttled_call())
+    assert limit.saturated()
+    clock.offset += 10.0
+    assert not limit.saturated()
+
+
+def test_routes_over_their_rate_are_shed(clock):
+    controller = AdmissionController(route_rates={"search-workflow": (1.0, 2)})
+    controller.admit("search-workflow")
+    controller.admit("search-workflow")
+    with pytest.raises(Overloaded) as raised:
+        controller.admit("search-workflow")
+    assert raised.value.retry_after == pytest.approx(1.0, abs=0.01)
+    assert controller.stats()["shed"] == {"search-workflow": {"rate": 1}}
+
+
+def test_low_priority_routes_are_shed_while_a_backend_is_saturated(clock):
+    controller = AdmissionController(limit_settings={"maximum": 1, "cooldown": 10.0})
+
+    async def throttled():
+        with admission_route("search-workflow"):
+            async with controller.call("search"):
+                raise RequestError(429)
+
+    with pytest.raises(Overloaded, match="search throttled") as raised:
+        asyncio.run(throttled())
+    assert isinstance(raised.value.__cause__, RequestError)
+    assert controller.overloaded()
+    with pytest.raises(Overloaded, match="low-priority"):
+        controller.admit("test-blob")
+    # Interactive routes are still admitted
+    controller.admit("search-workflow")
+    assert controller.stats()["shed"] == {"search-workflow": {"throttled": 1}, "test-blob": {"priority": 1}}
+    clock.offset += 10.0
+    controller.admit("test-blob")
+
+
+def test_other_backend_errors_pass_through(clock):
+    controller = AdmissionController()
+
+    async def failing():
+        async with controller.call("search"):
+            raise RequestError(400)
+
+    with pytest.raises(RequestError):
+        asyncio.run(failing())
+    assert controller.limit("search").stats()["in_flight"] == 0
+    assert not controller.overloaded()
+
+
+def test_admitted_charges_backend_calls_to_the_route(monkeypatch, clock):
+    controller = AdmissionController(route_rates={"search-workflow": (1.0, 1)})
+    monkeypatch.setattr(admission_module, "admission", controller)
+
+    @admitted("search-workflow")
+    async def handler():
+        async with controller.call("search"):
+            return "answer"
+
+    assert asyncio.run(handler()) == "answer"
+    # The route's only token is spent, so its next backend call is not admitted
+    with pytest.raises(Overloaded, match="over its rate limit"):
+        asyncio.run(handler())
+    assert admission_module._route.get() is None
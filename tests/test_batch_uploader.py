@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from batch_uploader import BatchUploader, AsyncBatchUploader
+from local_backends import LocalSearchClient, LocalAsyncSearchClient, LocalIndexingResult
+
+
+class RequestError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FlakySearchClient(LocalSearchClient):
+    """Throttles each ``throttled`` document once (every time if ``throttle_always``), always
+    rejects ``rejected`` ones, sends no result for ``unanswered`` ones and answers 413 to any
+    request of more than ``max_request`` documents."""
+
+    def __init__(self, throttled=(), rejected=(), max_request=None, throttle_always=False, unanswered=()):
+        super().__init__()
+        self.throttled = set(throttled)
+        self.throttle_always = throttle_always
+        self.rejected = set(rejected)
+        self.unanswered = set(unanswered)
+        self.max_request = max_request
+        self.requests = 0
+
+    def upload_documents(self, documents):
+        self.requests += 1
+        if self.max_request and len(documents) > self.max_request:
+            raise RequestError(413)
+        results = []
+        for doc in documents:
+            if doc["id"] in self.unanswered:
+                continue
+            if doc["id"] in self.rejected:
+                results.append(LocalIndexingResult(doc["id"], False, 400, "invalid document"))
+            elif doc["id"] in self.throttled:
+                if not self.throttle_always:
+                    self.throttled.discard(doc["id"])
+                results.append(LocalIndexingResult(doc["id"], False, 503, "throttled"))
+            else:
+                results.extend(super().upload_documents([doc]))
+        return results
+
+
+def documents(count):
+    return [{"id": f"wf_{n}", "name": f"wf_{n}"} for n in range(count)]
+
+
+def upload(engine, search_client, docs, **kwargs):
+    kwargs.setdefault("base_delay", 0)
+    kwargs.setdefault("max_delay", 0)
+    if engine == "threads":
+        uploader = BatchUploader(search_client, **kwargs)
+        for doc in docs:
+            uploader.add(doc)
+        return uploader.close()
+
+    async def run():
+        uploader = AsyncBatchUploader(LocalAsyncSearchClient(search_client), **kwargs)
+        for doc in docs:
+            await uploader.add(doc)
+        return await uploader.close()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_every_document_is_counted_once(engine):
+    search_client = FlakySearchClient(throttled={"wf_1", "wf_5", "wf_12"}, rejected={"wf_7"}, max_request=4)
+    totals = upload(engine, search_client, documents(20), max_batch_documents=8, max_in_flight=2)
+
+    assert totals["batches"] == 3
+    assert totals["succeeded"] == 19
+    assert totals["failed"] == 1
+    assert totals["failed_keys"] == {"wf_7"}
+    # Only the throttled documents were sent again
+    assert totals["retries"] == 3
+    assert sorted(search_client.documents) == sorted(doc["id"] for doc in documents(20) if doc["id"] != "wf_7")
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_documents_still_throttled_after_the_last_retry_fail(engine):
+    search_client = FlakySearchClient(throttled={"wf_0"}, throttle_always=True)
+    totals = upload(engine, search_client, documents(3), max_retries=2)
+
+    assert totals["succeeded"] == 2
+    assert totals["failed_keys"] == {"wf_0"}
+    assert totals["retries"] == 2
+    assert search_client.requests == 3
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_documents_without_a_result_fail(engine):
+    search_client = FlakySearchClient(unanswered={"wf_2"})
+    totals = upload(engine, search_client, documents(4))
+
+    assert totals["succeeded"] + totals["failed"] == 4
+    assert totals["failed_keys"] == {"wf_2"}
+    assert totals["retries"] == 0
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import pytest
+
+from helpers import export_xml, ingest
+from blob_prefilter import (
+    BlobPrefilter, load_prefilter, sniff, classification_key, WORKFLOWS, NO_WORKFLOWS, NOT_EXPORT
+)
+from ingestion import get_pipeline_config
+from local_backends import LocalBlobProperties
+
+MAPPLETS = export_xml().replace("</FOLDER>", '<MAPPLET NAME="mplt_a"/>\n</FOLDER>').encode("utf-8")
+WORKFLOW = export_xml(("wf_a", ["SRC_A"], ["TGT_A"])).encode("utf-8")
+
+
+@pytest.mark.parametrize("head, complete, verdict", [
+    (WORKFLOW, True, WORKFLOWS),
+    (WORKFLOW[:WORKFLOW.index(b"</WORKFLOW>")], False, WORKFLOWS),
+    (MAPPLETS, True, NO_WORKFLOWS),
+    (MAPPLETS[:200], False, None),
+    (b'<?xml version="1.0"?>\n<project><name>app</name></project>', True, NOT_EXPORT),
+    # Without the whole blob, a missing root in the head does not rule it out
+    (b'<?xml version="1.0"?>\n<!-- ' + b"x" * 100, False, None),
+    # UTF-16 exports never match the byte patterns
+    (WORKFLOW.decode("utf-8").replace("UTF-8", "UTF-16").encode("utf-16"), True, None),
+    (WORKFLOW.decode("utf-8").encode("utf-16-be"), True, None)
+], ids=["workflow", "workflow-partial", "mapplets", "mapplets-partial", "other-xml", "other-partial", "utf-16", "utf-16-be"])
+def test_sniff(head, complete, verdict):
+    assert sniff(head, complete) == verdict
+
+
+def test_classification_keys():
+    blob = LocalBlobProperties(name="a.xml", size=10, last_modified=None, etag='"0x1"')
+    assert classification_key(blob) == 'a.xml@"0x1"'
+    blob.content_settings = SimpleNamespace(content_md5=bytes.fromhex("00ff"))
+    assert classification_key(blob) == "md5-00ff"
+    # A recorded digest wins over the listed version
+    prefilter = BlobPrefilter().track([blob], {"a.xml": "md5-abcd"})
+    assert prefilter._listed["a.xml"] == ("md5-abcd", 10)
+
+
+def test_utf16_exports_are_ingested(exports, search_client):
+    config = get_pipeline_config({"parse_workers": 0, "download_workers": 2, "prefilter": True})
+    exports.write("utf16.xml", export_xml(("wf_u", ["SRC_U"], ["TGT_U"])).replace("UTF-8", "UTF-16"), encoding="utf-16")
+    exports.write("other.xml", '<?xml version="1.0"?>\n<project/>')
+
+    stats = ingest(exports, search_client, "idx", config)
+    assert [doc["workflow_name"] for doc in search_client.documents.values()] == ["wf_u"]
+    assert stats["files_skipped"] == 1
+    # What the parse found is what the next run skips or ingests
+    prefilter = load_prefilter(exports.container, exports.listed())
+    assert sorted(prefilter.classes.values()) == [NOT_EXPORT, WORKFLOWS]
+
+
+def test_partial_not_export_verdicts_are_not_trusted(exports):
+    exports.write("big.xml", export_xml(*((f"wf_{n}", ["SRC"], ["TGT"]) for n in range(50))))
+    listed = exports.listed()
+    classes = {classification_key(blob): NOT_EXPORT for blob in listed}
+    prefilter = BlobPrefilter(classes, sniff_bytes=1024).track(listed)
+
+    assert prefilter.classify(exports.container.get_blob_client("big.xml")) == WORKFLOWS
+    assert list(prefilter.classes.values()) == [WORKFLOWS]
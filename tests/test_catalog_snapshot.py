@@ -0,0 +1,79 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from helpers import export_xml
+import catalog_snapshot
+from catalog_snapshot import get_snapshot_blob_name, load_snapshot, bulk_load_snapshot
+from ingestion import run_ingestion_pipeline, StageTimings
+from ingestion_jobs import finalize_ingestion
+from index_manifest import empty_manifest
+from local_backends import LocalSearchClient, LocalAsyncSearchClient
+
+
+@pytest.fixture
+def snapshot(exports, search_client, pipeline_config):
+    for n in range(3):
+        exports.write(f"export_{n}.xml", export_xml(*((f"wf_{n}_{w}", [f"SRC_{w}"], [f"TGT_{n}"]) for w in range(4))))
+    names = [blob.name for blob in exports.listed()]
+    stats = run_ingestion_pipeline(exports.container, names, search_client, pipeline_config)
+    finalize_ingestion(
+        exports.container, search_client, "idx", empty_manifest("idx"), exports.listed(), [], stats, False, StageTimings()
+    )
+    snapshot = load_snapshot(exports.container, get_snapshot_blob_name("idx"))
+    yield snapshot
+    if not snapshot.buffer.closed:
+        snapshot.close()
+
+
+def test_bulk_load_reproduces_the_index(snapshot, search_client, pipeline_config):
+    target = LocalSearchClient()
+    stats = asyncio.run(bulk_load_snapshot(snapshot, LocalAsyncSearchClient(target), pipeline_config, StageTimings()))
+    assert stats["workflows_uploaded"] == 12
+    assert target.documents == search_client.documents
+
+
+def test_failed_bulk_load_waits_for_the_prefetched_decode(snapshot, pipeline_config, monkeypatch):
+    decoding = threading.Event()
+    decoded = threading.Event()
+    table = snapshot.table
+
+    def slow_table(number):
+        if number == 1:
+            section = snapshot.section(number)
+            decoding.set()
+            time.sleep(0.2)
+            section.release()
+            decoded.set()
+        return table(number)
+    monkeypatch.setattr(snapshot, "table", slow_table)
+
+    class FailingUploader(catalog_snapshot.AsyncBatchUploader):
+        async def add(self, document):
+            # Fail while export 1 is being decoded in its thread
+            await asyncio.to_thread(decoding.wait, 5)
+            raise RuntimeError("upload interrupted")
+    monkeypatch.setattr(catalog_snapshot, "AsyncBatchUploader", FailingUploader)
+
+    async def load_and_close():
+        # Close as soon as the load fails, like the routes do, while the event loop keeps running
+        with pytest.raises(RuntimeError):
+            await bulk_load_snapshot(snapshot, LocalAsyncSearchClient(), pipeline_config, StageTimings())
+        finished = decoded.is_set()
+        snapshot.close()
+        return finished
+    assert asyncio.run(load_and_close())
+
+
+@pytest.mark.parametrize("blob_name, valid", [
+    ("_snapshots/idx.wcs", True),
+    ("_snapshots/idx-v2.wcs", True),
+    ("_manifests/idx.json", False),
+    ("_snapshots/../export.wcs", False),
+    ("_snapshots/.wcs", False),
+    ("export.xml", False)
+])
+def test_snapshot_blob_names(blob_name, valid):
+    assert catalog_snapshot.is_snapshot_blob_name(blob_name) is valid
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from coalescing import RequestCoalescer, coalesce_key
+
+
+class Backend:
+    """A backend call that waits until released, counting how often it is made."""
+
+    def __init__(self, result="answer", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def call(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        coalescer = RequestCoalescer()
+        backend = Backend()
+        other = Backend("other")
+        callers = [asyncio.ensure_future(coalescer.run("search", "q", backend.call)) for _ in range(5)]
+        callers.append(asyncio.ensure_future(coalescer.run("search", "q2", other.call)))
+        await asyncio.sleep(0)
+        assert coalescer.stats()["in_flight"] == 2
+        backend.release.set()
+        other.release.set()
+        results = await asyncio.gather(*callers)
+
+        assert results == ["answer"] * 5 + ["other"]
+        assert (backend.calls, other.calls) == (1, 1)
+        assert coalescer.stats() == {"calls": 2, "coalesced": 4, "in_flight": 0, "enabled": True}
+        # A caller arriving after the call finished starts a new one
+        assert await coalescer.run("search", "q", backend.call) == "answer"
+        assert backend.calls == 2
+    asyncio.run(scenario())
+
+
+def test_exceptions_reach_every_caller():
+    async def scenario():
+        coalescer = RequestCoalescer()
+        backend = Backend(error=RuntimeError("search unavailable"))
+        callers = [asyncio.ensure_future(coalescer.run("search", "q", backend.call)) for _ in range(3)]
+        await asyncio.sleep(0)
+        backend.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        assert [str(result) for result in results] == ["search unavailable"] * 3
+        assert backend.calls == 1
+    asyncio.run(scenario())
+
+
+def test_a_caller_going_away_does_not_cancel_the_call():
+    async def scenario():
+        coalescer = RequestCoalescer()
+        backend = Backend()
+        first = asyncio.ensure_future(coalescer.run("search", "q", backend.call))
+        second = asyncio.ensure_future(coalescer.run("search", "q", backend.call))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        backend.release.set()
+        assert await second == "answer"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+    asyncio.run(scenario())
+
+
+def test_disabled_coalescer_calls_through():
+    async def scenario():
+        coalescer = RequestCoalescer(enabled=False)
+        backend = Backend()
+        backend.release.set()
+        await asyncio.gather(*(coalescer.run("search", "q", backend.call) for _ in range(3)))
+        assert backend.calls == 3
+    asyncio.run(scenario())
+
+
+def test_coalesce_keys_ignore_option_order():
+    assert coalesce_key("q", top=5, select=["id"]) == coalesce_key("q", select=["id"], top=5)
+    assert coalesce_key("q", top=5) != coalesce_key("q", top=6)
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from helpers import export_xml, ingest
+from index_manifest import load_manifest, get_manifest_blob_name
+from index_versions import (
+    IndexVersions, AliasesUnavailable, RebuildRejected, blue_green_rebuild, get_rebuild_settings, publish_artifacts, delete_artifacts
+)
+from local_backends import LocalIndexDefinition, LocalAlias
+
+ALIAS = "idx"
+
+
+@pytest.fixture
+def versions(index_service):
+    return IndexVersions(index_service, ALIAS, build_index=LocalIndexDefinition, build_alias=LocalAlias)
+
+
+def rebuild(versions, exports, pipeline_config, **kwargs):
+    """A blue/green rebuild from the XML, publishing and deleting blobs like the rebuild-index route."""
+    service = versions.index_client
+
+    async def fill(version):
+        stats = await asyncio.to_thread(ingest, exports, service.get_search_client(version), version, pipeline_config)
+        uploaded = {key for keys in stats["documents_by_blob"].values() for key in keys}
+        return {"documents": len(uploaded), "failed_documents": stats["workflows_failed"], "failed_files": stats["files_failed"]}
+
+    settings = get_rebuild_settings({"count_timeout": 0, "keep_versions": 1})
+    return asyncio.run(blue_green_rebuild(
+        versions, fill, service.get_search_client, settings,
+        on_activate=lambda version: publish_artifacts(exports.container, version, ALIAS),
+        on_drop=lambda version: delete_artifacts(exports.container, version),
+        **kwargs
+    ))
+
+
+def test_incremental_runs_through_the_alias_after_a_cutover(versions, exports, pipeline_config):
+    exports.write("a.xml", export_xml(("wf_a", ["SRC_A"], ["TGT_A"])))
+    report = rebuild(versions, exports, pipeline_config)
+    assert report["version"] == "idx-v1" and versions.active() == "idx-v1"
+    assert load_manifest(exports.container, ALIAS)["index_name"] == ALIAS
+
+    alias_client = versions.index_client.get_search_client(ALIAS)
+    exports.write("b.xml", export_xml(("wf_b", ["SRC_B"], ["TGT_B"])))
+    stats = ingest(exports, alias_client, ALIAS, pipeline_config, incremental=True)
+    assert sorted(stats["documents_by_blob"]) == ["b.xml"]
+    assert sorted(load_manifest(exports.container, ALIAS)["blobs"]) == ["a.xml", "b.xml"]
+
+    # Nothing changed since, so the next incremental run has nothing to do
+    stats = ingest(exports, alias_client, ALIAS, pipeline_config, incremental=True)
+    assert stats["files_processed"] == 0
+
+    # The next cutover drops v1 with its blobs; the alias keeps its own manifest
+    rebuild(versions, exports, pipeline_config)
+    assert versions.versions() == ["idx-v2"]
+    assert not exports.container.get_blob_client(get_manifest_blob_name("idx-v1")).exists()
+    assert sorted(load_manifest(exports.container, ALIAS)["blobs"]) == ["a.xml", "b.xml"]
+    assert len(alias_client.documents) == 2
+
+
+def test_rejected_rebuild_keeps_the_live_version(versions, exports, pipeline_config):
+    exports.write("a.xml", export_xml(("wf_a", ["SRC_A"], ["TGT_A"]), ("wf_b", ["SRC_B"], ["TGT_B"])))
+    rebuild(versions, exports, pipeline_config)
+    exports.write("a.xml", export_xml(("wf_a", ["SRC_A"], ["TGT_A"])))
+
+    with pytest.raises(RebuildRejected) as rejected:
+        rebuild(versions, exports, pipeline_config)
+    assert "shrink" in rejected.value.report["problems"][0]
+    assert versions.versions() == ["idx-v1"] and versions.active() == "idx-v1"
+    assert not exports.container.get_blob_client(get_manifest_blob_name("idx-v2")).exists()
+
+
+class IndexClientWithoutAliases:
+    """An index client from a GA azure-search-documents release, which has no alias operations."""
+
+    def __init__(self, service):
+        self.list_index_names = service.list_index_names
+
+
+def test_missing_alias_api_is_reported(versions, index_service):
+    versions.check_aliases()
+    with pytest.raises(AliasesUnavailable) as raised:
+        IndexVersions(IndexClientWithoutAliases(index_service), ALIAS, build_alias=LocalAlias).check_aliases()
+    assert raised.value.missing == ["list_aliases", "create_or_update_alias"]
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from xml.parsers import expat
+
+from helpers import export_xml
+from xml_extractor import iter_workflow_buckets_from_chunks
+from ingestion import run_ingestion_pipeline, run_ingestion_pipeline_async, StageTimings
+from index_manifest import load_manifest, diff_manifest
+from ingestion_jobs import finalize_ingestion
+from blob_prefilter import BlobPrefilter, NO_WORKFLOWS
+
+GOOD = export_xml(("wf_a", ["SRC_A"], ["TGT_A"]), ("wf_b", ["SRC_B"], ["TGT_B"]))
+# Cut off inside the second workflow, after the first one closed
+TRUNCATED = GOOD[:GOOD.index('<WORKFLOW NAME="wf_b"') + 40]
+
+
+def test_truncated_export_raises_after_completed_workflows():
+    chunks = [TRUNCATED[i:i + 64].encode() for i in range(0, len(TRUNCATED), 64)]
+    names = []
+    with pytest.raises(expat.ExpatError):
+        for bucket in iter_workflow_buckets_from_chunks(chunks, "bad.xml"):
+            names.append(bucket["workflow_name"])
+    assert names == ["wf_a"]
+
+
+@pytest.mark.parametrize("engine", ["threads", "async"])
+def test_truncated_export_counts_as_failed(engine, exports, search_client, async_search_client, pipeline_config):
+    exports.write("good.xml", GOOD)
+    exports.write("bad.xml", TRUNCATED)
+    prefilter = BlobPrefilter().track(exports.listed())
+    names = ["bad.xml", "good.xml"]
+    if engine == "threads":
+        stats = run_ingestion_pipeline(exports.container, names, search_client, pipeline_config, prefilter=prefilter)
+    else:
+        stats = asyncio.run(run_ingestion_pipeline_async(
+            exports.async_container, names, async_search_client, pipeline_config, prefilter=prefilter
+        ))
+
+    assert stats["files_processed"] == 1
+    assert stats["files_failed"] == 1
+    assert "bad.xml" not in stats["documents_by_blob"]
+    # Nothing was learned about the broken export
+    assert NO_WORKFLOWS not in prefilter.classes.values()
+
+    manifest = load_manifest(exports.container, "idx")
+    finalize_ingestion(
+        exports.container, search_client, "idx", manifest, exports.listed(), [], stats, False, StageTimings()
+    )
+    changed, _, _ = diff_manifest(load_manifest(exports.container, "idx"), exports.listed())
+    assert [blob.name for blob in changed] == ["bad.xml"]
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from helpers import export_xml
+import ingestion_jobs
+from ingestion_jobs import create_job, save_job, load_job, run_job_slice, job_status, is_leased
+from index_manifest import load_manifest
+
+OPTIONS = {"parse_workers": 0, "parse_cache": False, "prefilter": False}
+
+
+@pytest.fixture
+def small_waves(monkeypatch):
+    monkeypatch.setattr(ingestion_jobs, "JOB_WAVE_SIZE", 2)
+
+
+def write_exports(exports, count):
+    for n in range(count):
+        exports.write(f"export_{n}.xml", export_xml((f"wf_{n}", [f"SRC_{n}"], [f"TGT_{n}"])))
+
+
+def start_job(exports, incremental=False):
+    job = create_job("idx", load_manifest(exports.container, "idx"), exports.listed(), incremental, OPTIONS)
+    save_job(exports.container, job)
+    return job
+
+
+def run_slice(job, exports, search_client, async_search_client, budget_seconds=None):
+    return asyncio.run(run_job_slice(
+        job, exports.container, exports.async_container, search_client, async_search_client, budget_seconds
+    ))
+
+
+def test_job_resumes_after_a_crashed_slice(exports, search_client, async_search_client, small_waves, monkeypatch):
+    write_exports(exports, 5)
+    job = start_job(exports)
+
+    run_wave = ingestion_jobs._run_wave
+    waves = []
+
+    async def crash_on_second_wave(*args, **kwargs):
+        waves.append([shard["blob"] for shard in args[1]])
+        if len(waves) == 2:
+            raise RuntimeError("host stopped")
+        return await run_wave(*args, **kwargs)
+    monkeypatch.setattr(ingestion_jobs, "_run_wave", crash_on_second_wave)
+    with pytest.raises(RuntimeError):
+        run_slice(job, exports, search_client, async_search_client)
+    monkeypatch.setattr(ingestion_jobs, "_run_wave", run_wave)
+    # The first wave measures throughput on one shard, the next ones are sized from it
+    assert waves == [["export_0.xml"], ["export_1.xml", "export_2.xml"]]
+
+    # The first wave's checkpoint survived, the crashed wave used up an attempt and the lease was given up
+    job = load_job(exports.container, job["job_id"])
+    assert job_status(job)["shards"] == {"pending": 4, "done": 1, "failed": 0, "total": 5}
+    assert [shard["attempts"] for shard in job["shards"]] == [1, 1, 1, 0, 0]
+    assert not is_leased(job)
+
+    job = run_slice(job, exports, search_client, async_search_client)
+    assert job["status"] == "completed"
+    assert len(search_client.documents) == 5
+    manifest = load_manifest(exports.container, "idx")
+    assert sorted(manifest["blobs"]) == [f"export_{n}.xml" for n in range(5)]
+    # Checkpoints are removed once the job is finalized
+    assert [blob.name for blob in exports.container.list_blobs("_jobs/")] == [f"_jobs/{job['job_id']}.json"]
+
+
+def test_shard_that_keeps_crashing_the_worker_is_given_up(exports, search_client, async_search_client, monkeypatch):
+    monkeypatch.setattr(ingestion_jobs, "JOB_MAX_ATTEMPTS", 2)
+    write_exports(exports, 3)
+    job = start_job(exports)
+
+    run_wave = ingestion_jobs._run_wave
+
+    async def crash_on_export_0(*args, **kwargs):
+        if any(shard["blob"] == "export_0.xml" for shard in args[1]):
+            raise RuntimeError("worker ran out of memory")
+        return await run_wave(*args, **kwargs)
+    monkeypatch.setattr(ingestion_jobs, "_run_wave", crash_on_export_0)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            run_slice(load_job(exports.container, job["job_id"]), exports, search_client, async_search_client)
+
+    job = run_slice(load_job(exports.container, job["job_id"]), exports, search_client, async_search_client)
+    assert job["status"] == "completed_with_errors"
+    assert job_status(job)["failed_shards"] == [{"blob": "export_0.xml", "attempts": 2}]
+    assert sorted(doc["workflow_name"] for doc in search_client.documents.values()) == ["wf_1", "wf_2"]
+
+
+def test_waves_fit_the_time_left(exports, search_client, async_search_client, monkeypatch):
+    monkeypatch.setattr(ingestion_jobs, "JOB_MIN_WAVE_SECONDS", 30)
+    write_exports(exports, 4)
+    job = start_job(exports)
+    size = job["shards"][0]["fingerprint"]["size"]
+    next_wave = ingestion_jobs._next_wave
+
+    # Nothing measured yet: one shard
+    assert len(next_wave(job, 400, first=True)) == 1
+    # 20 seconds per shard
+    job["totals"].update(shard_bytes=size, active_seconds=20.0)
+    assert len(next_wave(job, 65, first=False)) == 3
+    assert len(next_wave(job, 35, first=False)) == 1
+    assert next_wave(job, 29, first=True) == []
+    # A shard that does not fit waits for a fresh slice, unless the slice has just started
+    job["totals"].update(active_seconds=200.0)
+    assert next_wave(job, 60, first=False) == []
+    assert len(next_wave(job, 60, first=True)) == 1
+
+    # A slice with no time left runs no wave and uses no attempts
+    job = run_slice(job, exports, search_client, async_search_client, budget_seconds=0)
+    assert job["status"] == "running"
+    assert [shard["attempts"] for shard in job["shards"]] == [0, 0, 0, 0]
+    assert not search_client.documents
+
+
+def test_incremental_job_only_shards_changed_exports(exports, search_client, async_search_client, small_waves):
+    write_exports(exports, 3)
+    job = run_slice(start_job(exports), exports, search_client, async_search_client)
+    assert job["status"] == "completed"
+
+    exports.write("export_1.xml", export_xml(("wf_1b", ["SRC_1"], ["TGT_1"])))
+    exports.remove("export_2.xml")
+    job = start_job(exports, incremental=True)
+    assert [shard["blob"] for shard in job["shards"]] == ["export_1.xml"]
+    assert job["removed"] == ["export_2.xml"]
+    job = run_slice(job, exports, search_client, async_search_client)
+
+    assert job["status"] == "completed"
+    assert job["result"]["documents_deleted"] == 2
+    assert sorted(doc["workflow_name"] for doc in search_client.documents.values()) == ["wf_0", "wf_1b"]
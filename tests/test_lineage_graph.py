@@ -0,0 +1,65 @@
+import threading
+
+from helpers import BlockingDownloads
+from lineage_graph import LineageGraph, LineageGraphCache, merge_lineage, save_lineage_graph
+
+# RAW -> wf_load -> STAGE -> wf_build -> MART -> wf_report -> REPORT, and STAGE -> wf_audit -> AUDIT
+RECORDS = {
+    "load.xml": [("load.xml:wf_load", "wf_load", ("RAW",), ("STAGE",))],
+    "build.xml": [
+        ("build.xml:wf_build", "wf_build", ("STAGE",), ("MART",)),
+        ("build.xml:wf_audit", "wf_audit", ("stage",), ("AUDIT",))
+    ],
+    "report.xml": [("report.xml:wf_report", "wf_report", ("MART",), ("REPORT",))]
+}
+
+
+def names(graph, nodes):
+    return sorted(graph.keys[node] for node in nodes)
+
+
+def test_closures_follow_every_hop():
+    graph = LineageGraph.build(RECORDS)
+    stage = graph.find_table("Stage")
+    # Table names are matched case-insensitively
+    assert names(graph, graph.successors(stage)) == ["build.xml:wf_audit", "build.xml:wf_build"]
+    assert names(graph, graph.downstream(stage)) == [
+        "AUDIT", "MART", "REPORT", "build.xml:wf_audit", "build.xml:wf_build", "report.xml:wf_report"
+    ]
+    assert names(graph, graph.upstream(graph.find_table("REPORT"))) == [
+        "MART", "RAW", "STAGE", "build.xml:wf_build", "load.xml:wf_load", "report.xml:wf_report"
+    ]
+    assert graph.find_workflows("WF_BUILD") == graph.find_workflows("build.xml:wf_build")
+    summary = graph.summarize(graph.downstream(stage), 1)
+    assert (summary["workflow_count"], summary["table_count"], len(summary["workflows"])) == (3, 3, 1)
+
+
+def test_round_trip_and_incremental_merge():
+    graph = LineageGraph.build(RECORDS)
+    loaded = LineageGraph.from_bytes(graph.to_bytes())
+    assert loaded.records_by_blob() == graph.records_by_blob()
+    assert (loaded.node_count, loaded.edge_count) == (graph.node_count, graph.edge_count)
+
+    merged = merge_lineage(loaded, {"report.xml": [("report.xml:wf_report", "wf_report", ("MART",), ("KPI",))]},
+                           removed=["load.xml"])
+    assert sorted(merged.files) == ["build.xml", "report.xml"]
+    assert merged.find_table("RAW") is None
+    assert names(merged, merged.downstream(merged.find_table("MART"))) == ["KPI", "report.xml:wf_report"]
+
+
+def test_refresh_downloads_outside_the_cache_lock(exports):
+    cache = LineageGraphCache(refresh_seconds=0)
+    save_lineage_graph(exports.container, "idx", LineageGraph.build(RECORDS))
+    assert cache.get(exports.container, "idx").node_count == 9
+
+    save_lineage_graph(exports.container, "idx", LineageGraph.build({"report.xml": RECORDS["report.xml"]}))
+    blocking = BlockingDownloads(exports.container)
+    refresher = threading.Thread(target=cache.get, args=(blocking, "idx"))
+    refresher.start()
+    assert blocking.started.wait(5)
+    # Readers get the graph they have while the new one downloads, and other indexes are not held up
+    assert cache.get(exports.container, "idx").node_count == 9
+    assert cache.get(exports.container, "other") is None
+    blocking.release.set()
+    refresher.join(5)
+    assert cache.get(exports.container, "idx").node_count == 3
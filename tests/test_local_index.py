@@ -0,0 +1,44 @@
+import os
+import threading
+
+from helpers import BlockingDownloads
+from local_index import LocalIndexCache, LocalSearchIndex, save_local_index
+
+DOCUMENT = {"id": "wf_a", "name": "wf_a", "type": "workflow", "description": "reads SRC_A"}
+
+
+def build_index(*ids):
+    return LocalSearchIndex.build({"a.xml": [(dict(DOCUMENT, id=doc_id, name=doc_id), ["SRC_A"]) for doc_id in ids]})
+
+
+def test_republished_index_is_reloaded_without_leaving_files(exports, tmp_path):
+    directory = tmp_path / "maps"
+    directory.mkdir()
+    cache = LocalIndexCache(directory=str(directory), refresh_seconds=0)
+    assert cache.get(exports.container, "idx") is None
+
+    for version in range(3):
+        ids = [f"wf_{version}_{n}" for n in range(version + 1)]
+        save_local_index(exports.container, "idx", build_index(*ids))
+        index = cache.get(exports.container, "idx")
+        assert sorted(index.ids) == ids
+    # Mapped indexes do not keep their download around
+    assert os.listdir(directory) == []
+
+
+def test_refresh_downloads_outside_the_cache_lock(exports, tmp_path):
+    cache = LocalIndexCache(directory=str(tmp_path), refresh_seconds=0)
+    save_local_index(exports.container, "idx", build_index("wf_old"))
+    assert cache.get(exports.container, "idx").ids == ["wf_old"]
+
+    save_local_index(exports.container, "idx", build_index("wf_new"))
+    blocking = BlockingDownloads(exports.container)
+    refresher = threading.Thread(target=cache.get, args=(blocking, "idx"))
+    refresher.start()
+    assert blocking.started.wait(5)
+    # Readers get the copy they have while the new one downloads, and other indexes are not held up
+    assert cache.get(exports.container, "idx").ids == ["wf_old"]
+    assert cache.get(exports.container, "other") is None
+    blocking.release.set()
+    refresher.join(5)
+    assert cache.get(exports.container, "idx").ids == ["wf_new"]
@@ -0,0 +1,15 @@
+from metrics import MetricsRegistry
+
+
+def test_collected_totals_are_counters():
+    registry = MetricsRegistry()
+    registry.add_collector(lambda: {
+        "parse_cache_lookups_total": {(("outcome", "hits"),): 3, (("outcome", "misses"),): 1},
+        "parse_cache_bytes": 2048
+    })
+    lines = registry.render().splitlines()
+
+    assert "# TYPE parse_cache_lookups_total counter" in lines
+    assert 'parse_cache_lookups_total{outcome="hits"} 3' in lines
+    assert "# TYPE parse_cache_bytes gauge" in lines
+    assert "parse_cache_bytes 2048" in lines
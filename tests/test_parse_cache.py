@@ -0,0 +1,59 @@
+import os
+import zlib
+import pickle
+
+from helpers import export_xml
+from parse_cache import ParseCache
+from workflow_model import WorkflowTable
+from xml_extractor import iter_workflow_buckets_from_chunks
+
+
+def parse(xml_file, *workflows):
+    table = WorkflowTable(xml_file)
+    for bucket in iter_workflow_buckets_from_chunks([export_xml(*workflows)], xml_file):
+        table.append(bucket)
+    return table.freeze()
+
+
+def test_hit_is_relabelled_with_the_new_blob_name(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    table = parse("a.xml", ("wf_a", ["SRC_A"], ["TGT_A"]), ("wf_b", ["SRC_B"], ["TGT_B"]))
+    assert cache.get("sha256-ab", "a.xml") is None
+    cache.put("sha256-ab", table)
+
+    hit = cache.get("sha256-ab", "copy/a.xml")
+    assert hit.xml_file == "copy/a.xml"
+    assert [doc["workflow_name"] for doc in hit.documents()] == ["wf_a", "wf_b"]
+    assert [doc["source_tables"] for doc in hit.documents()] == [["SRC_A"], ["SRC_B"]]
+    assert {key: cache.stats()[key] for key in ("hits", "misses", "stores")} == {"hits": 1, "misses": 1, "stores": 1}
+
+
+def test_entries_in_an_older_format_are_dropped_as_misses(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    table = parse("a.xml", ("wf_a", ["SRC_A"], ["TGT_A"]))
+    cache.put("sha256-ab", table)
+    path = cache._path("sha256-ab")
+    # A pickled table of a layout that no longer loads
+    with open(path, "wb") as f:
+        f.write(zlib.compress(pickle.dumps({"xml_file": "a.xml", "columns": None}), 1))
+
+    assert cache.get("sha256-ab", "a.xml") is None
+    assert not os.path.exists(path)
+    cache.put("sha256-ab", table)
+    assert cache.get("sha256-ab", "a.xml").ids() == table.ids()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    tables = [parse(f"{n}.xml", (f"wf_{n}", [f"SRC_{n}"], [f"TGT_{n}"])) for n in range(4)]
+    size = len(tables[0].to_bytes()) + 1
+    cache = ParseCache(str(tmp_path), max_bytes=size * 3)
+    for n, table in enumerate(tables[:3]):
+        cache.put(f"sha256-{n:02d}", table)
+        os.utime(cache._path(f"sha256-{n:02d}"), (n, n))
+    # Reading entry 0 makes entries 1 and 2 the least recently used
+    assert cache.get("sha256-00", "0.xml") is not None
+    cache.put("sha256-03", tables[3])
+
+    # Eviction goes down to 90% of the limit, which leaves room for two entries
+    assert cache.stats()["evictions"] == 2
+    assert [cache.get(f"sha256-{n:02d}", f"{n}.xml") is not None for n in range(4)] == [True, False, False, True]
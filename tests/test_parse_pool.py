@@ -0,0 +1,28 @@
+import pytest
+
+from helpers import export_xml
+from parse_pool import ParsePool, HANDOFFS
+
+XML = export_xml(("wf_a", ["SRC_A"], ["TGT_A"]), ("wf_b", ["SRC_B"], ["TGT_B"])).encode("utf-8")
+
+
+@pytest.fixture(scope="module")
+def pools():
+    pools = {handoff: ParsePool(1, handoff) for handoff in HANDOFFS}
+    yield pools
+    for pool in pools.values():
+        pool.shutdown()
+
+
+@pytest.mark.parametrize("handoff", HANDOFFS)
+def test_workers_parse_the_handed_off_bytes(pools, handoff):
+    pool = pools[handoff]
+    with pool.buffer(len(XML)) as buffer:
+        for start in range(0, len(XML), 100):
+            buffer.write(XML[start:start + 100])
+        table, _ = pool.submit(buffer, "a.xml").result(timeout=60)
+    assert [doc["workflow_name"] for doc in table.documents()] == ["wf_a", "wf_b"]
+
+
+def test_workers_are_not_forked_from_the_host(pools):
+    assert pools["shared_memory"]._executor._mp_context.get_start_method() in ("forkserver", "spawn")
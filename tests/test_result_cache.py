@@ -0,0 +1,98 @@
+import pytest
+
+import result_cache as result_cache_module
+from result_cache import ResultCache, normalize_query
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache_module.time, "monotonic", clock)
+    return clock
+
+
+def test_entries_expire_after_their_route_ttl(clock):
+    cache = ResultCache(default_ttl=60, route_ttls={"get-workflow-details": 600})
+    cache.put("search-workflow", "q", "results")
+    cache.put("get-workflow-details", "wf", "details")
+    clock.now += 61
+    assert cache.get("search-workflow", "q") is None
+    assert cache.get("get-workflow-details", "wf") == "details"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expired"]) == (1, 1, 1)
+    assert stats["routes"] == {"search-workflow": {"hits": 0, "misses": 1}, "get-workflow-details": {"hits": 1, "misses": 0}}
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = ResultCache(max_entries=2)
+    cache.put("search-workflow", "a", "A")
+    cache.put("search-workflow", "b", "B")
+    assert cache.get("search-workflow", "a") == "A"
+    cache.put("search-workflow", "c", "C")
+    assert [cache.get("search-workflow", query) for query in "abc"] == ["A", None, "C"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_cap(clock):
+    entry = len("search-workflow") + 1 + 100
+    cache = ResultCache(max_bytes=entry * 2)
+    for query in "abc":
+        cache.put("search-workflow", query, "x" * 100)
+    assert cache.stats()["bytes"] == entry * 2
+    assert cache.get("search-workflow", "a") is None
+    # Replacing an entry does not count its old size twice
+    cache.put("search-workflow", "c", "y" * 100)
+    assert cache.stats()["bytes"] == entry * 2
+    # A value bigger than the whole cache is not stored and evicts nothing
+    cache.put("search-workflow", "d", "z" * entry * 2)
+    assert cache.get("search-workflow", "d") is None
+    assert cache.get("search-workflow", "b") is not None
+
+
+def test_invalidate_by_route_and_filter_keys(clock):
+    cache = ResultCache()
+    cache.put("debug-table", "t", "exact", filter="eq")
+    cache.put("debug-table", "t", "text")
+    cache.put("search-workflow", "q", "results")
+    assert cache.get("debug-table", "t", filter="eq") == "exact"
+    assert cache.get("debug-table", "t") == "text"
+    cache.invalidate("debug-table")
+    assert cache.get("debug-table", "t", filter="eq") is None
+    assert cache.get("search-workflow", "q") == "results"
+    cache.invalidate()
+    assert cache.stats()["entries"] == 0
+
+
+def test_disabled_cache_stores_nothing(clock):
+    cache = ResultCache(enabled=False)
+    cache.put("search-workflow", "q", "results")
+    assert cache.get("search-workflow", "q") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_normalize_query():
+    assert normalize_query("  Daily   LOAD\tOrders ") == "daily load orders"
+
+
+def test_expired_entries_are_served_stale_within_max_stale(clock):
+    cache = ResultCache(default_ttl=60, max_entries=2)
+    cache.put("search-workflow", "q", "results")
+    clock.now += 90
+    assert cache.get("search-workflow", "q") is None
+    # Expired 30 seconds ago
+    assert cache.get_stale("search-workflow", "q", max_stale=60) == "results"
+    assert cache.get_stale("search-workflow", "q", max_stale=20) is None
+    assert cache.get_stale("search-workflow", "q") == "results"
+    assert cache.stats()["stale_hits"] == 2
+    # An evicted entry is gone for good
+    cache.put("search-workflow", "a", "A")
+    cache.put("search-workflow", "b", "B")
+    assert cache.get_stale("search-workflow", "q") is None
@@ -0,0 +1,24 @@
+from helpers import export_xml
+from ingestion import run_ingestion_pipeline
+from local_index import merge_local_index
+from search_paging import PageRequest, table_filter, TABLE_SELECT
+
+
+def test_exact_table_lookup_returns_the_table_fields(exports, search_client, pipeline_config):
+    exports.write("a.xml", export_xml(("wf_a", ["SRC_A"], ["SALES"]), ("wf_b", ["SRC_B"], ["OTHER"])))
+    stats = run_ingestion_pipeline(exports.container, ["a.xml"], search_client, pipeline_config)
+    local_index = merge_local_index(None, {name: table.index_entries() for name, table in stats["workflows_by_blob"].items()})
+
+    search_filter = table_filter("SALES")
+    page = PageRequest.from_body({}, "SALES", search_filter, TABLE_SELECT)
+    for backend in (search_client, local_index):
+        documents = list(backend.search(search_text="*", filter=search_filter, **page.search_kwargs()))
+        assert [doc["name"] for doc in documents] == ["wf_a"]
+        assert documents[0]["source_tables"] == ["SRC_A"]
+        assert documents[0]["target_tables"] == ["SALES"]
+        assert "full_content" not in documents[0]
+
+
+def test_explicit_select_overrides_the_table_fields():
+    page = PageRequest.from_body({"select": "id,name"}, "SALES", table_filter("SALES"), TABLE_SELECT)
+    assert page.select == ["id", "name"]
@@ -0,0 +1,199 @@
+"""
+Compact columnar representation of the workflows extracted from one export.
+
+Parsing yields one short-lived bucket dict per workflow. Instead of keeping
+those (or the search documents built from them) for the whole run, each
+bucket is appended to a ``WorkflowTable``: names become integer references
+into a per-export ``StringPool`` of UTF-8 bytes and the per-workflow lists
+(sources, targets, transformations, sessions, mappings) become
+offset/reference ``array`` columns, so a workflow costs a few hundred bytes
+in a handful of buffers instead of dozens of Python objects. Table names that
+recur across thousands of workflows are stored once. Search documents,
+lineage records and local index entries are generated from the table on
+demand, a chunk at a time.
+
+``to_bytes``/``from_bytes`` give tables a compact, pickle-free serialized
+form for checkpoints and catalog snapshots kept in blob storage.
+"""
+
+import sys
+import json
+import zlib
+import struct
+from array import array
+
+from xml_extractor import build_workflow_doc
+
+LIST_FIELDS = ("source_tables", "target_tables", "transformations", "sessions", "mappings")
+FORMAT_MAGIC = b"WFT1"
+
+
+class StringPool:
+    """Distinct strings stored back to back as UTF-8 in one buffer, addressed by integer reference.
+
+    A ``str`` object costs about 50 bytes of overhead on top of its text; here a
+    string costs its encoded length plus a 4-byte offset.
+    """
+
+    __slots__ = ("data", "offsets", "_index")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("I", [0])
+        self._index = {}
+
+    def intern(self, value):
+        ref = self._index.get(value)
+        if ref is None:
+            ref = self._index[value] = len(self.offsets) - 1
+            self.data += value.encode("utf-8")
+            self.offsets.append(len(self.data))
+        return ref
+
+    def freeze(self):
+        """Drop the lookup dict and spare buffer capacity once no more strings will be added."""
+        self._index = None
+        self.data = bytes(self.data)
+
+    def __getitem__(self, ref):
+        return self.data[self.offsets[ref]:self.offsets[ref + 1]].decode("utf-8")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getstate__(self):
+        return self.data, self.offsets
+
+    def __setstate__(self, state):
+        self.data, self.offsets = state
+        self._index = None
+
+
+class WorkflowTable:
+    """Columnar, string-pooled workflows of one XML export."""
+
+    __slots__ = ("xml_file", "pool", "names", "offsets", "refs")
+
+    def __init__(self, xml_file):
+        self.xml_file = xml_file
+        self.pool = StringPool()
+        # Workflow, mapping and session name references, three per workflow
+        self.names = array("I")
+        self.offsets = {field: array("I", [0]) for field in LIST_FIELDS}
+        self.refs = {field: array("I") for field in LIST_FIELDS}
+
+    def __len__(self):
+        return len(self.names) // 3
+
+    def __getstate__(self):
+        return self.xml_file, self.pool, self.names, self.offsets, self.refs
+
+    def __setstate__(self, state):
+        self.xml_file, self.pool, self.names, self.offsets, self.refs = state
+
+    def append(self, bucket):
+        """Add a workflow bucket produced by the extractor."""
+        intern = self.pool.intern
+        self.names.extend((
+            intern(bucket["workflow_name"]),
+            intern(bucket["mapping_name"]),
+            intern(bucket["session_name"])
+        ))
+        for field in LIST_FIELDS:
+            refs = self.refs[field]
+            refs.extend(intern(value) for value in bucket[field])
+            self.offsets[field].append(len(refs))
+
+    def freeze(self):
+        self.pool.freeze()
+        return self
+
+    def values(self, number, field):
+        """The ``field`` list of workflow ``number`` as strings."""
+        offsets = self.offsets[field]
+        pool = self.pool
+        return [pool[ref] for ref in self.refs[field][offsets[number]:offsets[number + 1]]]
+
+    def bucket(self, number):
+        """Rebuild the extractor's bucket dict for workflow ``number``."""
+        pool = self.pool
+        workflow_ref, mapping_ref, session_ref = self.names[3 * number:3 * number + 3]
+        bucket = {
+            "workflow_name": pool[workflow_ref],
+            "mapping_name": pool[mapping_ref],
+            "session_name": pool[session_ref]
+        }
+        for field in LIST_FIELDS:
+            bucket[field] = self.values(number, field)
+        return bucket
+
+    def documents(self, start=0, stop=None):
+        """Search documents for workflows ``start`` to ``stop``, built on the fly."""
+        for number in range(start, len(self) if stop is None else stop):
+            yield build_workflow_doc(self.bucket(number), self.xml_file)
+
+    def ids(self):
+        return [document["id"] for document in self.documents()]
+
+    def lineage_records(self):
+        """(document id, workflow name, unique sources, unique targets) per workflow."""
+        for number, document in enumerate(self.documents()):
+            yield (
+                document["id"],
+                self.pool[self.names[3 * number]],
+                tuple(dict.fromkeys(self.values(number, "source_tables"))),
+                tuple(dict.fromkeys(self.values(number, "target_tables")))
+            )
+
+    def index_entries(self):
+        """(document, table names) pairs for the local search index."""
+        for number, document in enumerate(self.documents()):
+            tables = dict.fromkeys(self.values(number, "source_tables") + self.values(number, "target_tables"))
+            yield document, list(tables)
+
+    def to_bytes(self, level=1):
+        columns = [self.pool.offsets, self.names]
+        for field in LIST_FIELDS:
+            columns += [self.offsets[field], self.refs[field]]
+        header = json.dumps({
+            "xml_file": self.xml_file,
+            "pool_bytes": len(self.pool.data),
+            "columns": [len(column) for column in columns]
+        }, separators=(",", ":")).encode("utf-8")
+        payload = b"".join(
+            [struct.pack("<I", len(header)), header, bytes(self.pool.data)] + [_le_bytes(column) for column in columns]
+        )
+        return FORMAT_MAGIC + zlib.compress(payload, level)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:4] != FORMAT_MAGIC:
+            raise ValueError("Not a workflow table")
+        payload = memoryview(zlib.decompress(data[4:]))
+        header_size = struct.unpack_from("<I", payload)[0]
+        header = json.loads(bytes(payload[4:4 + header_size]))
+        position = 4 + header_size
+        table = cls(header["xml_file"])
+        table.pool.data = bytes(payload[position:position + header["pool_bytes"]])
+        table.pool._index = None
+        position += header["pool_bytes"]
+        columns = []
+        for count in header["columns"]:
+            column = array("I")
+            size = count * column.itemsize
+            column.frombytes(payload[position:position + size])
+            if sys.byteorder == "big":
+                column.byteswap()
+            columns.append(column)
+            position += size
+        table.pool.offsets, table.names = columns[:2]
+        for number, field in enumerate(LIST_FIELDS):
+            table.offsets[field], table.refs[field] = columns[2 + 2 * number:4 + 2 * number]
+        return table
+
+
+def _le_bytes(column):
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
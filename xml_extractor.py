@@ -0,0 +1,292 @@
+"""
+Workflow extraction from Informatica PowerCenter XML exports.
+
+The extractor is a push parser fed with chunks of the export, so a multi-GB
+repository export never has to be held in memory as raw bytes, decoded text
+and a full element tree at the same time. No element tree is built at all:
+each start tag is visited exactly once, and while a WORKFLOW is open its
+sources, targets, transformations, sessions and mappings are collected into a
+per-workflow bucket in the same pass.
+
+Two parser backends drive the same handlers. ``expat`` (standard library)
+calls back into Python for every element. ``lxml``, when installed, filters
+events by tag in C, so the bulk of an export (ports, connectors, attributes)
+never reaches Python; elements are cleared as soon as they close, so at most
+about one fed slice of tree exists at a time. That pays
+off on exports dominated by skipped elements and costs more on dense ones
+(see ``benchmarks.py extract --fields``). ``XML_PARSER_BACKEND`` picks one:
+``expat`` (default), ``lxml``, or ``auto`` for lxml whenever it is installed.
+
+Documents carry the structured fields of the search index schema, so table
+lookups can be exact collection filters instead of full-text searches over
+the description.
+"""
+
+import os
+import json
+import logging
+import importlib.util
+from functools import lru_cache
+from xml.parsers import expat
+
+PARSER_BACKENDS = ("auto", "expat", "lxml")
+
+# Elements the handlers look at; everything else is skipped
+_COLLECTED_TAGS = ("WORKFLOW", "SOURCE", "TARGET", "TRANSFORMATION", "SESSION", "TASKINSTANCE", "MAPPING")
+_LXML_FEED_SIZE = 1024 * 1024
+
+
+def iter_workflows_from_chunks(chunks, xml_filename, backend=None):
+    """Incrementally parse XML chunks and yield workflow documents one at a time."""
+    for bucket in iter_workflow_buckets_from_chunks(chunks, xml_filename, backend):
+        yield build_workflow_doc(bucket, xml_filename)
+
+
+def get_parser_backend(backend=None):
+    """The backend to parse with: ``backend``, else XML_PARSER_BACKEND, with ``auto`` resolved."""
+    return _resolve_backend((backend or os.getenv("XML_PARSER_BACKEND", "expat")).lower())
+
+
+@lru_cache(maxsize=None)
+def _resolve_backend(backend):
+    # Cached so a misconfiguration is logged once per process, not per export
+    if backend not in PARSER_BACKENDS:
+        logging.warning(f"Unknown XML parser backend '{backend}', using expat")
+        return "expat"
+    lxml_installed = importlib.util.find_spec("lxml") is not None
+    if backend == "lxml" and not lxml_installed:
+        logging.warning("XML_PARSER_BACKEND=lxml but lxml is not installed, using expat")
+    if backend in ("auto", "lxml"):
+        return "lxml" if lxml_installed else "expat"
+    return backend
+
+
+def iter_workflow_buckets_from_chunks(chunks, xml_filename, backend=None):
+    """Incrementally parse XML chunks and yield one bucket per closed WORKFLOW.
+
+    ``chunks`` is any iterable of ``bytes`` (or ``str``) pieces of a single XML
+    document, e.g. ``StorageStreamDownloader.chunks()``. Only the buckets of
+    currently open workflows are kept, so peak memory is bounded by the chunk
+    size and nesting depth rather than by the size of the export.
+
+    Raises ``xml.parsers.expat.ExpatError`` on a truncated or malformed
+    export, after yielding the workflows that closed before the error, so
+    callers can count the export as failed rather than as fully indexed.
+    """
+    parser = WorkflowPushParser(xml_filename, backend)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+class WorkflowPushParser:
+    """Push-style extractor for callers that receive chunks asynchronously.
+
+    ``feed`` and ``close`` return the workflow buckets completed by that chunk
+    and raise ``xml.parsers.expat.ExpatError`` on malformed input, whichever
+    backend parses.
+    """
+
+    def __init__(self, xml_filename, backend=None):
+        self.xml_filename = xml_filename
+        self.backend = get_parser_backend(backend)
+        self._completed = []
+        start_element, end_element = _create_handlers(self._completed)
+        if self.backend == "lxml":
+            self._parser = _LxmlFeeder(start_element, end_element)
+        else:
+            self._parser = _ExpatFeeder(start_element, end_element)
+
+    def feed(self, chunk):
+        self._parser.feed(chunk)
+        return self._take()
+
+    def close(self):
+        self._parser.close()
+        return self._take()
+
+    def _take(self):
+        completed = self._completed[:]
+        self._completed.clear()
+        return completed
+
+
+def iter_workflows_from_blob(blob_client, xml_filename):
+    """Stream a blob's download chunks through the incremental extractor."""
+    downloader = blob_client.download_blob()
+    return iter_workflows_from_chunks(downloader.chunks(), xml_filename)
+
+
+def extract_workflows_from_xml(xml_content, xml_filename, backend=None):
+    """Extract workflow information from XML content."""
+    try:
+        return list(iter_workflows_from_chunks([xml_content], xml_filename, backend))
+    except Exception as e:
+        logging.error(f"Error processing {xml_filename}: {str(e)}")
+        return []
+
+
+class _ExpatFeeder:
+    def __init__(self, start_element, end_element):
+        self._parser = expat.ParserCreate()
+        self._parser.StartElementHandler = start_element
+        self._parser.EndElementHandler = end_element
+
+    def feed(self, chunk):
+        self._parser.Parse(chunk, False)
+
+    def close(self):
+        self._parser.Parse(b"", True)
+
+
+class _LxmlFeeder:
+    """lxml pull parser that only reports the collected tags and frees elements once they close."""
+
+    def __init__(self, start_element, end_element):
+        from lxml import etree
+        self._syntax_error = etree.XMLSyntaxError
+        self._parser = etree.XMLPullParser(
+            events=("start", "end"), tag=_COLLECTED_TAGS, huge_tree=True, resolve_entities=False, no_network=True
+        )
+        self._start_element = start_element
+        self._end_element = end_element
+
+    def feed(self, chunk):
+        # Feed in slices so closed elements are freed as parsing goes, not after
+        # a whole export's tree is built. lxml only takes bytes or str, so
+        # mapped buffers are copied a slice at a time.
+        for start in range(0, len(chunk), _LXML_FEED_SIZE):
+            piece = chunk[start:start + _LXML_FEED_SIZE]
+            self._feed(bytes(piece) if isinstance(piece, memoryview) else piece)
+
+    def close(self):
+        try:
+            self._parser.close()
+        except self._syntax_error as e:
+            raise expat.ExpatError(str(e)) from e
+        self._drain()
+
+    def _feed(self, data):
+        try:
+            self._parser.feed(data)
+        except self._syntax_error as e:
+            raise expat.ExpatError(str(e)) from e
+        self._drain()
+
+    def _drain(self):
+        start_element = self._start_element
+        end_element = self._end_element
+        for event, element in self._parser.read_events():
+            if event == "start":
+                start_element(element.tag, element.attrib)
+                continue
+            end_element(element.tag)
+            # Attributes were read at the start event; drop the subtree and the
+            # already closed siblings before it
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+
+def _create_handlers(completed):
+    """Start/end element handlers that append finished workflow buckets to ``completed``."""
+    open_workflows = []
+
+    def start_workflow(attrs):
+        open_workflows.append({
+            "workflow_name": attrs.get("NAME", "Unknown"),
+            "mapping_name": attrs.get("MAPPINGNAME", "Unknown"),
+            "session_name": attrs.get("SESSIONNAME", "Unknown"),
+            "source_tables": [],
+            "target_tables": [],
+            "transformations": [],
+            "sessions": [],
+            "mappings": []
+        })
+
+    def collector(key, name_attr):
+        def collect(attrs):
+            name = attrs.get(name_attr)
+            if name:
+                for bucket in open_workflows:
+                    bucket[key].append(name)
+        return collect
+
+    def collect_transformation(attrs):
+        transform_name = attrs.get("NAME")
+        transform_type = attrs.get("TYPE")
+        if transform_name and transform_type:
+            for bucket in open_workflows:
+                bucket["transformations"].append(f"{transform_name} ({transform_type})")
+
+    def collect_session(attrs, name_attr="NAME"):
+        session_name = attrs.get(name_attr)
+        mapping_name = attrs.get("MAPPINGNAME")
+        for bucket in open_workflows:
+            if session_name:
+                bucket["sessions"].append(session_name)
+            if mapping_name:
+                bucket["mappings"].append(mapping_name)
+
+    def collect_task_instance(attrs):
+        if attrs.get("TASKTYPE") == "Session":
+            collect_session(attrs, "TASKNAME")
+
+    # Dispatch on tag so the many uninteresting elements (fields, connectors,
+    # attributes) cost a single dict lookup
+    dispatch = {
+        "SOURCE": collector("source_tables", "NAME"),
+        "TARGET": collector("target_tables", "NAME"),
+        "TRANSFORMATION": collect_transformation,
+        "SESSION": collect_session,
+        "TASKINSTANCE": collect_task_instance,
+        "MAPPING": collector("mappings", "NAME")
+    }
+    get_handler = dispatch.get
+
+    def start_element(tag, attrs):
+        if tag == "WORKFLOW":
+            start_workflow(attrs)
+        elif open_workflows:
+            handler = get_handler(tag)
+            if handler is not None:
+                handler(attrs)
+
+    def end_element(tag):
+        if tag == "WORKFLOW":
+            completed.append(open_workflows.pop())
+
+    return start_element, end_element
+
+
+def build_workflow_doc(bucket, xml_filename):
+    """Search document for a workflow bucket.
+
+    ``name``, ``type`` and ``description`` keep the original summary shape; the
+    remaining fields are the structured ones of the ``create-index`` schema,
+    with table and transformation lists de-duplicated in document order.
+    """
+    workflow_name = bucket["workflow_name"]
+    mapping_name = bucket["mapping_name"]
+    session_name = bucket["session_name"]
+    source_tables = list(dict.fromkeys(bucket["source_tables"]))
+    target_tables = list(dict.fromkeys(bucket["target_tables"]))
+    transformations = list(dict.fromkeys(bucket["transformations"]))
+    return {
+        "id": f"{xml_filename}_{workflow_name}_{mapping_name}".replace(" ", "_").replace(".", "_")[:100],
+        "name": workflow_name[:100] if workflow_name else "Unknown",
+        "type": "workflow",
+        "description": f"Mapping: {mapping_name}, Session: {session_name}, XML: {xml_filename}, Sources: {len(bucket['source_tables'])}, Targets: {len(bucket['target_tables'])}, Transformations: {len(bucket['transformations'])}",
+        "workflow_name": workflow_name,
+        "mapping_name": mapping_name,
+        "session_name": session_name,
+        "source_tables": source_tables,
+        "target_tables": target_tables,
+        "transformations": transformations,
+        "xml_file": xml_filename,
+        "full_content": " ".join([workflow_name, mapping_name, session_name] + source_tables + target_tables + transformations),
+        "metadata": json.dumps({
+            "sessions": list(dict.fromkeys(bucket["sessions"])),
+            "mappings": list(dict.fromkeys(bucket["mappings"]))
+        }, separators=(",", ":"))
+    }